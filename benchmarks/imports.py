@@ -0,0 +1,157 @@
+"""
+Import time of clavis, each case in a fresh interpreter.
+
+    python -m benchmarks.imports --output results.json
+
+"import" is a bare `import clavis`, which must not load SQLAlchemy
+or dynaconf; "transaction" also resolves `clavis.Transaction`
+and "configure" also calls `clavis.configure()`.
+Times are reported without the interpreter startup.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import typing as ty
+
+HEAVY_MODULES = ("sqlalchemy", "dynaconf")
+
+CASES = {
+    "import": "import clavis",
+    "transaction": "import clavis; clavis.Transaction",
+    "configure": "import clavis; clavis.configure('sqlite://')",
+}
+
+_REPORT = (
+    "import sys, json; print(json.dumps(sorted({_m.split('.')[0] for _m in sys.modules}"
+    " & set(%r))))"
+)
+
+
+def measure(code: str, repeat: int) -> float:
+    best = float("inf")
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        best = min(best, time.perf_counter() - started)
+
+    return best
+
+
+def loaded_modules(code: str) -> ty.List[str]:
+    report = _REPORT % (HEAVY_MODULES,)
+    output = subprocess.run(
+        [sys.executable, "-c", f"{code}; {report}"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(
+    repeat: int = 5, only: ty.Optional[ty.Sequence[str]] = None
+) -> ty.Dict[str, ty.Any]:
+    startup = measure("pass", repeat)
+    results = []
+
+    for name, code in CASES.items():
+        if only and name not in only:
+            continue
+
+        seconds = max(measure(code, repeat) - startup, 0.0)
+        results.append(
+            {
+                "name": name,
+                "seconds": seconds,
+                "heavy_modules": loaded_modules(code),
+            }
+        )
+
+    return {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "startup_seconds": startup,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def report(data: ty.Dict[str, ty.Any], stream=sys.stderr):
+    print(f"{'case':<20}{'ms':>10}  heavy modules", file=stream)
+
+    for r in data["results"]:
+        print(
+            f"{r['name']:<20}{r['seconds'] * 1000:>10.1f}"
+            f"  {', '.join(r['heavy_modules']) or '-'}",
+            file=stream,
+        )
+
+
+def compare(
+    data: ty.Dict[str, ty.Any], previous: ty.Dict[str, ty.Any], stream=sys.stderr
+):
+    before = {_r["name"]: _r for _r in previous["results"]}
+
+    print(f"{'case':<20}{'ms was':>10}{'ms now':>10}{'change':>10}", file=stream)
+
+    for r in data["results"]:
+        old = before.get(r["name"])
+        if old is None or not old["seconds"]:
+            continue
+
+        change = r["seconds"] / old["seconds"] - 1
+        print(
+            f"{r['name']:<20}{old['seconds'] * 1000:>10.1f}"
+            f"{r['seconds'] * 1000:>10.1f}{change:>+10.1%}",
+            file=stream,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--case", action="append", dest="only", metavar="NAME")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="exit with an error when a bare import takes longer than this",
+    )
+    args = parser.parse_args(argv)
+
+    data = run(args.repeat, args.only)
+    report(data)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(data, json.load(f))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    else:
+        json.dump(data, sys.stdout, indent=2)
+        print()
+
+    bare = next((_r for _r in data["results"] if _r["name"] == "import"), None)
+    if bare is not None:
+        if bare["heavy_modules"]:
+            parser.exit(1, f"import clavis loads {bare['heavy_modules']}\n")
+
+        if args.max_ms is not None and bare["seconds"] * 1000 > args.max_ms:
+            parser.exit(1, f"import clavis takes more than {args.max_ms} ms\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Overhead of clavis transactions compared to plain SQLAlchemy, on local SQLite.
+
+    python -m benchmarks.transactions --output results.json
+
+"single_insert" uses a factory and the implicit commit on context exit,
+"explicit_commit" and "in_place" differ from it in one aspect each.
+"orm_expire_*" load rows, change one, flush and read all of them again
+with each of the session expire policies.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import typing as ty
+from pathlib import Path
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+from sqlalchemy.pool import QueuePool
+
+import clavis
+from clavis import session as clavis_session
+
+metadata = sa.MetaData()
+
+bench_table = sa.Table(
+    "bench_table",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+    sa.Column("value", sa.Text),
+)
+
+
+class BenchRow:
+    pass
+
+
+orm.registry().map_imperatively(BenchRow, bench_table)
+
+ORM_ROWS = 50
+
+
+class Case(ty.NamedTuple):
+    name: str
+    clavis: ty.Callable[[], None]
+    baseline: ty.Callable[[], None]
+
+
+def insert(value="x"):
+    return sa.insert(bench_table).values(value=value)
+
+
+def build_cases(url: str, engine, postponed: ty.Sequence[int]) -> ty.List[Case]:
+    factory = clavis.TransactionFactory(url)
+
+    def baseline_empty():
+        with engine.connect() as conn:
+            with conn.begin():
+                pass
+
+    def clavis_empty():
+        with factory.transaction():
+            pass
+
+    def baseline_insert():
+        with engine.connect() as conn:
+            with conn.begin():
+                conn.execute(insert())
+
+    def clavis_insert():
+        with factory.transaction() as t:
+            t.session.execute(insert())
+
+    def clavis_explicit_commit():
+        with factory.transaction() as t:
+            t.session.execute(insert())
+            t.commit()
+
+    def clavis_in_place():
+        with clavis.Transaction(url) as t:
+            t.session.execute(insert())
+
+    def make_postponed(n):
+        def baseline():
+            with engine.connect() as conn:
+                with conn.begin():
+                    conn.execute(insert())
+                with conn.begin():
+                    for _ in range(n):
+                        conn.execute(insert("postponed"))
+
+        def with_clavis():
+            with factory.transaction() as t:
+                t.session.execute(insert())
+                for _ in range(n):
+                    t.postpone(insert("postponed"))
+
+        return Case(f"postponed_{n}", with_clavis, baseline)
+
+    def orm_work(session):
+        rows = session.query(BenchRow).order_by(BenchRow.id).limit(ORM_ROWS).all()
+        rows[0].value = "changed"
+        session.flush()
+        for row in rows:
+            row.value
+
+    def baseline_orm():
+        with engine.connect() as conn:
+            with conn.begin():
+                orm_work(orm.Session(bind=conn))
+
+    def make_orm(expire):
+        tf = clavis.TransactionFactory(url, expire=expire)
+
+        def with_clavis():
+            with tf.transaction() as t:
+                orm_work(t.session)
+
+        return Case(f"orm_expire_{expire}", with_clavis, baseline_orm)
+
+    cases = [
+        Case("empty", clavis_empty, baseline_empty),
+        Case("single_insert", clavis_insert, baseline_insert),
+        Case("explicit_commit", clavis_explicit_commit, baseline_insert),
+        Case("in_place", clavis_in_place, baseline_insert),
+    ]
+    cases.extend(make_postponed(_n) for _n in postponed)
+    cases.extend(make_orm(_e) for _e in clavis_session.EXPIRE_POLICIES)
+
+    return cases
+
+
+def measure(fn: ty.Callable[[], None], iterations: int, repeat: int) -> float:
+    best = float("inf")
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        best = min(best, time.perf_counter() - started)
+
+    return best
+
+
+def run(
+    iterations: int = 1000,
+    repeat: int = 3,
+    postponed: ty.Sequence[int] = (10, 100),
+    only: ty.Optional[ty.Sequence[str]] = None,
+) -> ty.Dict[str, ty.Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'bench.sqlite'}"
+        engine = sa.create_engine(
+            url, poolclass=QueuePool, connect_args={"check_same_thread": False}
+        )
+        metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(insert(), [{"value": str(_i)} for _i in range(ORM_ROWS)])
+
+        results = []
+
+        try:
+            for case in build_cases(url, engine, postponed):
+                if only and case.name not in only:
+                    continue
+
+                baseline = measure(case.baseline, iterations, repeat)
+                with_clavis = measure(case.clavis, iterations, repeat)
+
+                results.append(
+                    {
+                        "name": case.name,
+                        "iterations": iterations,
+                        "baseline_seconds": baseline,
+                        "clavis_seconds": with_clavis,
+                        "baseline_per_second": iterations / baseline,
+                        "clavis_per_second": iterations / with_clavis,
+                        "overhead_ratio": with_clavis / baseline,
+                    }
+                )
+        finally:
+            clavis.dispose_all()
+            engine.dispose()
+
+    return {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "sqlalchemy": sa.__version__,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def report(data: ty.Dict[str, ty.Any], stream=sys.stderr):
+    print(
+        f"{'case':<20}{'baseline/s':>14}{'clavis/s':>14}{'overhead':>10}",
+        file=stream,
+    )
+
+    for r in data["results"]:
+        print(
+            f"{r['name']:<20}{r['baseline_per_second']:>14.1f}"
+            f"{r['clavis_per_second']:>14.1f}{r['overhead_ratio']:>10.2f}",
+            file=stream,
+        )
+
+
+def compare(
+    data: ty.Dict[str, ty.Any], previous: ty.Dict[str, ty.Any], stream=sys.stderr
+):
+    before = {_r["name"]: _r for _r in previous["results"]}
+
+    print(
+        f"{'case':<20}{'clavis/s was':>14}{'clavis/s now':>14}{'change':>10}",
+        file=stream,
+    )
+
+    for r in data["results"]:
+        old = before.get(r["name"])
+        if old is None:
+            continue
+
+        change = r["clavis_per_second"] / old["clavis_per_second"] - 1
+        print(
+            f"{r['name']:<20}{old['clavis_per_second']:>14.1f}"
+            f"{r['clavis_per_second']:>14.1f}{change:>+10.1%}",
+            file=stream,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--postponed", type=int, nargs="*", default=[10, 100], metavar="N"
+    )
+    parser.add_argument("--case", action="append", dest="only", metavar="NAME")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    args = parser.parse_args(argv)
+
+    data = run(args.iterations, args.repeat, args.postponed, args.only)
+    report(data)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(data, json.load(f))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    else:
+        json.dump(data, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
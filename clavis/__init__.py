@@ -1,24 +1,97 @@
+import importlib
 import typing as ty
 
-from .factory import TransactionFactory
-from .transaction import Transaction
+if ty.TYPE_CHECKING:
+    from .aio import AsyncTransaction
+    from .aio import AsyncTransactionFactory
+    from .engines import dispose_all
+    from .engines import dispose_all_async
+    from .executor import PostponedExecutor
+    from .factory import TransactionFactory
+    from .sharding import ShardedTransactionFactory
+    from .transaction import Transaction
 
 name = "clavis"
 
+# SQLAlchemy and dynaconf are imported on first use of these names
+_LAZY = {
+    "AsyncTransaction": ".aio",
+    "AsyncTransactionFactory": ".aio",
+    "PostponedExecutor": ".executor",
+    "ShardedTransactionFactory": ".sharding",
+    "Transaction": ".transaction",
+    "TransactionFactory": ".factory",
+    "dispose_all": ".engines",
+    "dispose_all_async": ".engines",
+}
 
-def configure(database_url: str, echo: ty.Optional[bool] = None):
+
+def __getattr__(attr):
+    module = _LAZY.get(attr)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {attr!r}")
+
+    value = getattr(importlib.import_module(module, __name__), attr)
+    globals()[attr] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+def configure(
+    database_url: str,
+    echo: ty.Optional[bool] = None,
+    pool_size: ty.Optional[int] = None,
+    max_overflow: ty.Optional[int] = None,
+    pool_recycle: ty.Optional[int] = None,
+    pool_pre_ping: ty.Optional[bool] = None,
+    slow_query_ms: ty.Optional[float] = None,
+    slow_query_sample_rate: ty.Optional[float] = None,
+    replica_urls: ty.Optional[ty.Sequence[str]] = None,
+):
     if not database_url:
         from clavis.errors import BadDatabaseError
 
         raise BadDatabaseError("bad database url: cannot be empty")
 
-    from .conf import settings
+    from . import conf
     from .conf import global_vars as gv
 
+    settings = conf.get_settings()
+
     settings.set(gv.VAR_DATABASE_URL, database_url)
 
     if echo is not None:
         settings.set(gv.VAR_DATABASE_ECHO, bool(echo))
 
+    if replica_urls is not None:
+        settings.set(gv.VAR_DATABASE_REPLICA_URLS, list(replica_urls))
+
+    for var, value in (
+        (gv.VAR_DATABASE_POOL_SIZE, pool_size),
+        (gv.VAR_DATABASE_MAX_OVERFLOW, max_overflow),
+        (gv.VAR_DATABASE_POOL_RECYCLE, pool_recycle),
+        (gv.VAR_DATABASE_POOL_PRE_PING, pool_pre_ping),
+        (gv.VAR_DATABASE_SLOW_QUERY_MS, slow_query_ms),
+        (gv.VAR_DATABASE_SLOW_QUERY_SAMPLE_RATE, slow_query_sample_rate),
+    ):
+        if value is not None:
+            settings.set(var, value)
+
+    conf.invalidate()
+
 
-__all__ = ("Transaction", "TransactionFactory")
+__all__ = (
+    "AsyncTransaction",
+    "AsyncTransactionFactory",
+    "PostponedExecutor",
+    "ShardedTransactionFactory",
+    "Transaction",
+    "TransactionFactory",
+    "configure",
+    "dispose_all",
+    "dispose_all_async",
+)
@@ -0,0 +1,269 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+import typing as ty
+
+from . import errors
+from . import instrumentation
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+DEFAULT_PRIORITIES = {INTERACTIVE: 0, BATCH: 1}
+
+Priority = ty.Union[str, int, None]
+
+
+class AdmissionStats:
+    def __init__(self):
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_time = 0.0
+        self.max_queue_depth = 0
+
+    def as_dict(self) -> ty.Dict[str, ty.Union[int, float]]:
+        return dict(vars(self))
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "event", "loop", "future", "admitted", "gone")
+
+    def __init__(self, priority: int, seq: int, loop=None):
+        self.priority = priority
+        self.seq = seq
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        self.admitted = False
+        self.gone = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+class AdmissionPolicy:
+    """
+    Limits concurrent transactions. Callers above `max_concurrent` wait
+    in a queue of `max_queue` places ordered by priority, then by arrival;
+    when the queue is full they are rejected at once. Thread and asyncio
+    callers share the limit.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queue: int = 0,
+        timeout: ty.Optional[float] = None,
+        priorities: ty.Mapping[str, int] = DEFAULT_PRIORITIES,
+        default_priority: Priority = INTERACTIVE,
+        registry: ty.Optional[instrumentation.MetricsRegistry] = None,
+        prefix: str = "clavis",
+    ):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be positive")
+
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.priorities = dict(priorities)
+        self._labels = {_rank: _name for _name, _rank in self.priorities.items()}
+        self.default_priority = self._rank(default_priority)
+        self.stats = AdmissionStats()
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters: ty.List[_Waiter] = []
+        self._seq = itertools.count()
+        self._metrics = _Metrics(registry, prefix) if registry is not None else None
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def acquire(self, priority: Priority = None, timeout: ty.Optional[float] = None):
+        started = time.monotonic()
+        waiter = self.__enqueue(priority)
+        if waiter is None:
+            return
+
+        timeout = self.timeout if timeout is None else timeout
+        if not waiter.event.wait(timeout) and not self.__give_up(waiter):
+            raise errors.AdmissionTimeoutError(
+                f"not admitted within {timeout}s: {self.queue_depth} queued"
+            )
+
+        self.__admitted(waiter.priority, time.monotonic() - started)
+
+    async def acquire_async(
+        self, priority: Priority = None, timeout: ty.Optional[float] = None
+    ):
+        started = time.monotonic()
+        waiter = self.__enqueue(priority, asyncio.get_running_loop())
+        if waiter is None:
+            return
+
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if not self.__give_up(waiter):
+                raise errors.AdmissionTimeoutError(
+                    f"not admitted within {timeout}s: {self.queue_depth} queued"
+                ) from None
+        except asyncio.CancelledError:
+            if self.__give_up(waiter):
+                self.release()
+            raise
+
+        self.__admitted(waiter.priority, time.monotonic() - started)
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = heapq.heappop(self._waiters)
+                if waiter.gone:
+                    continue
+
+                # the slot is handed over, so `active` does not change
+                waiter.admitted = True
+                waiter.wake()
+                self.__update_gauges()
+                return
+
+            self._active -= 1
+            self.__update_gauges()
+
+    @contextlib.contextmanager
+    def admit(self, priority: Priority = None, timeout: ty.Optional[float] = None):
+        self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextlib.asynccontextmanager
+    async def admit_async(
+        self, priority: Priority = None, timeout: ty.Optional[float] = None
+    ):
+        await self.acquire_async(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _rank(self, priority: Priority) -> int:
+        if priority is None:
+            return self.default_priority
+
+        if isinstance(priority, int):
+            return priority
+
+        try:
+            return self.priorities[priority]
+        except KeyError:
+            raise ValueError(f"unknown priority: {priority!r}") from None
+
+    def __enqueue(self, priority: Priority, loop=None) -> ty.Optional[_Waiter]:
+        rank = self._rank(priority)
+
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                self.__update_gauges()
+                waiter = None
+
+            elif len(self._waiters) >= self.max_queue:
+                self.stats.rejected += 1
+                self.__count_rejection("full", rank)
+                raise errors.AdmissionRejectedError(
+                    f"admission queue is full: {len(self._waiters)} queued"
+                )
+
+            else:
+                waiter = _Waiter(rank, next(self._seq), loop)
+                heapq.heappush(self._waiters, waiter)
+                self.stats.queued += 1
+                self.stats.max_queue_depth = max(
+                    self.stats.max_queue_depth, len(self._waiters)
+                )
+                self.__update_gauges()
+
+        if waiter is None:
+            self.__admitted(rank, 0.0)
+
+        return waiter
+
+    def __give_up(self, waiter: _Waiter) -> bool:
+        """
+        Returns True if the waiter has been admitted in the meantime.
+        """
+        with self._lock:
+            if waiter.admitted:
+                return True
+
+            waiter.gone = True
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+            self.stats.timed_out += 1
+            self.__count_rejection("timeout", waiter.priority)
+            self.__update_gauges()
+
+        return False
+
+    def __admitted(self, rank: int, waited: float):
+        with self._lock:
+            self.stats.admitted += 1
+            self.stats.wait_time += waited
+
+        if self._metrics is not None:
+            self._metrics.wait.observe(waited, priority=self.__label(rank))
+
+    def __count_rejection(self, reason: str, rank: int):
+        if self._metrics is not None:
+            self._metrics.rejections.inc(reason=reason, priority=self.__label(rank))
+
+    def __label(self, rank: int) -> str:
+        return self._labels.get(rank, str(rank))
+
+    def __update_gauges(self):
+        if self._metrics is not None:
+            self._metrics.active.set(self._active)
+            self._metrics.queue_depth.set(len(self._waiters))
+
+
+class _Metrics:
+    def __init__(self, registry: instrumentation.MetricsRegistry, prefix: str):
+        self.active = registry.gauge(
+            f"{prefix}_admission_active", "Admitted transactions in progress"
+        )
+        self.queue_depth = registry.gauge(
+            f"{prefix}_admission_queue_depth", "Transactions waiting for admission"
+        )
+        self.wait = registry.histogram(
+            f"{prefix}_admission_wait_seconds", "Time waited for admission"
+        )
+        self.rejections = registry.counter(
+            f"{prefix}_admission_rejections_total", "Transactions not admitted"
+        )
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,385 @@
+import typing as ty
+from collections import OrderedDict
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import admission as _admission
+from . import conf
+from . import engines
+from . import errors
+from . import postponed
+from . import propagation as _propagation
+from . import session
+from . import states
+
+
+class AsyncTransaction(postponed.Postponing):
+    def __init__(
+        self,
+        database_url: ty.Optional[str] = None,
+        echo: ty.Optional[bool] = None,
+        engine: ty.Optional[AsyncEngine] = None,
+        pool: ty.Optional[engines.PoolOptions] = None,
+        postponed_connection: str = postponed.SAME_CONNECTION,
+        expire: str = session.EXPIRE_ALL,
+        admission: ty.Optional[_admission.AdmissionPolicy] = None,
+        priority: _admission.Priority = None,
+        postponed_coalesce: bool = False,
+    ):
+        if expire not in session.EXPIRE_POLICIES:
+            raise ValueError(f"unsupported expire policy: {expire!r}")
+
+        if postponed_connection not in postponed.CONNECTION_MODES:
+            raise ValueError(
+                f"unsupported postponed connection mode: {postponed_connection!r}"
+            )
+
+        config = conf.config()
+        self._database_url = (
+            database_url if database_url is not None else config.database_url
+        )
+        self._echo = echo if echo is not None else config.echo
+        self._pool = pool if pool is not None else config.pool
+
+        self._engine = None
+        self._external_engine = engine
+        self._conn = None
+        self._txn = None
+        self._session = None
+        self._postponed = OrderedDict()
+        self._postponed_stats = None
+        self._postponed_connection = postponed_connection
+        self._postponed_coalesce = postponed_coalesce
+        self._postponed_coalesced = 0
+        self._expire = expire
+        self._admission = admission
+        self._priority = priority
+        self._admitted = False
+        self._token = None
+        self._rollback_only = False
+
+    @staticmethod
+    def current() -> (
+        ty.Optional[ty.Union["AsyncTransaction", "AsyncJoinedTransaction"]]
+    ):
+        return _propagation.current_async()
+
+    @property
+    def engine(self) -> AsyncEngine:
+        return self._engine
+
+    @property
+    def session(self) -> AsyncSession:
+        return self._session
+
+    @property
+    def postponed_stats(self) -> ty.Optional[postponed.PostponedStats]:
+        return self._postponed_stats
+
+    @property
+    def postponed_coalesced(self) -> int:
+        return self._postponed_coalesced
+
+    @property
+    def rollback_only(self) -> bool:
+        return self._rollback_only
+
+    def mark_rollback_only(self):
+        self._rollback_only = True
+
+    async def commit(self) -> ty.NoReturn:
+        if not self._session:
+            raise states.Committed()
+
+        await self.session.commit()
+
+    async def rollback(self) -> ty.NoReturn:
+        if not self._session:
+            raise states.RolledBack()
+
+        await self.session.rollback()
+
+    async def __aenter__(self):
+        self.__verify_reentrance()
+        await self.__admit()
+
+        try:
+            await self.__connect_and_begin()
+        except BaseException:
+            self.__release_admission()
+            raise
+
+        self._token = _propagation.activate_async(self)
+
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        _propagation.deactivate_async(self._token)
+        self._token = None
+
+        unexpected_rollback = False
+
+        try:
+            try:
+                if exc_type in (None, states.Committed) and self._rollback_only:
+                    await self.__rollback()
+                    unexpected_rollback = True
+
+                elif not exc_type:
+                    await self.__commit()
+                    finalized = None
+
+                elif exc_type is states.Committed:
+                    await self.__commit()
+                    finalized = True
+
+                elif exc_type is states.RolledBack:
+                    await self.__rollback()
+                    finalized = True
+
+                else:
+                    await self.__rollback()
+                    finalized = False
+
+                if self._postponed_connection == postponed.SAME_CONNECTION:
+                    await self.__execute_postponed(self._conn)
+
+            finally:
+                await self.__cleanup()
+
+            if self._postponed_connection == postponed.SEPARATE_CONNECTION:
+                await self.__execute_postponed_separately()
+
+        finally:
+            self.__release_admission()
+
+        if unexpected_rollback:
+            raise errors.RollbackOnlyError(
+                "transaction was marked rollback-only and has been rolled back"
+            )
+
+        return finalized
+
+    def __verify_reentrance(self):
+        if any((self._engine, self._conn, self._txn, self._session)):
+            raise errors.AlreadyEnteredError()
+
+    async def __admit(self):
+        if self._admission is not None:
+            await self._admission.acquire_async(self._priority)
+            self._admitted = True
+
+    def __release_admission(self):
+        if self._admitted:
+            self._admitted = False
+            self._admission.release()
+
+    async def __connect_and_begin(self):
+        self.__init_engine()
+
+        self._conn = await self._engine.connect()
+        slow_query_log = conf.slow_query_log()
+        if slow_query_log:
+            slow_query_log.attach(self._conn.sync_connection, self)
+
+        self._txn = await self._conn.begin()
+        self._session = AsyncSession(
+            bind=self._conn,
+            sync_session_class=session.Session,
+            origin=self,
+            expire=self._expire,
+        )
+
+    def __init_engine(self):
+        if self._external_engine:
+            self._engine = self._external_engine
+        else:
+            self.__verify_db()
+
+            self._engine = engines.get_async_engine(
+                self._database_url, self._echo, self._pool
+            )
+
+    def __verify_db(self):
+        if not self._database_url:
+            raise errors.BadDatabaseError("database is not configured")
+
+    async def __commit(self):
+        await self._session.flush()
+        await self._txn.commit()
+
+    async def __rollback(self):
+        await self._session.run_sync(lambda _s: _s.rollback(internal=True))
+        await self._txn.rollback()
+
+    async def __cleanup(self):
+        await self._conn.close()
+
+        self._conn = None
+        self._txn = None
+        self._session = None
+
+    async def __execute_postponed(self, conn):
+        if not self._postponed:
+            return
+
+        queries = list(self._postponed.values())
+        if self._postponed_coalesce:
+            coalesced = postponed.coalesce(queries, conn.dialect)
+            self._postponed_coalesced = len(queries) - len(coalesced)
+            queries = coalesced
+
+        async with conn.begin():
+            self._postponed_stats = await postponed.execute_async(
+                conn, queries, conn.dialect
+            )
+
+    async def __execute_postponed_separately(self):
+        if not self._postponed:
+            return
+
+        async with self._engine.connect() as conn:
+            await self.__execute_postponed(conn)
+
+
+class AsyncJoinedTransaction(postponed.Postponing):
+    """
+    Runs in the async transaction which is current when it is entered.
+    `rollback()` and unhandled exceptions mark the outer one
+    to be rolled back.
+    """
+
+    def __init__(self, outer: ty.Union[AsyncTransaction, "AsyncJoinedTransaction"]):
+        self._outer = outer
+        self._postponed = outer._postponed
+        self._token = None
+
+    @property
+    def outer(self) -> ty.Union[AsyncTransaction, "AsyncJoinedTransaction"]:
+        return self._outer
+
+    @property
+    def engine(self) -> AsyncEngine:
+        return self._outer.engine
+
+    @property
+    def session(self) -> AsyncSession:
+        return self._outer.session
+
+    @property
+    def rollback_only(self) -> bool:
+        return self._outer.rollback_only
+
+    def mark_rollback_only(self):
+        self._outer.mark_rollback_only()
+
+    async def commit(self) -> ty.NoReturn:
+        raise states.Committed(self)
+
+    async def rollback(self) -> ty.NoReturn:
+        raise states.RolledBack(self)
+
+    async def __aenter__(self):
+        if self._token is not None:
+            raise errors.AlreadyEnteredError()
+
+        if self.session is None:
+            raise errors.ClavisError("outer transaction is not entered")
+
+        # session states raised in the block belong to this one
+        self.session.sync_session.enter_scope(self, savepoint=False)
+        self._token = _propagation.activate_async(self)
+
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        _propagation.deactivate_async(self._token)
+        self._token = None
+        self.session.sync_session.exit_scope(self)
+
+        if not exc_type:
+            return None
+
+        if isinstance(exc_val, states.StepState):
+            if exc_val.origin is not self:
+                return None
+
+            if exc_type is states.RolledBack:
+                self.mark_rollback_only()
+            elif self.session is not None:
+                await self.session.flush()
+
+            return True
+
+        self.mark_rollback_only()
+
+        return None
+
+
+class AsyncTransactionFactory:
+    def __init__(
+        self,
+        database_url: ty.Optional[str] = None,
+        echo: ty.Optional[bool] = None,
+        engine: ty.Optional[AsyncEngine] = None,
+        pool_size: ty.Optional[int] = None,
+        max_overflow: ty.Optional[int] = None,
+        pool_recycle: ty.Optional[int] = None,
+        pool_pre_ping: ty.Optional[bool] = None,
+        postponed_connection: str = postponed.SAME_CONNECTION,
+        expire: str = session.EXPIRE_ALL,
+        admission: ty.Optional[_admission.AdmissionPolicy] = None,
+        postponed_coalesce: bool = False,
+        propagation: str = _propagation.REQUIRES_NEW,
+    ):
+        _verify_propagation(propagation)
+
+        config = conf.config()
+        self.database_url = (
+            database_url if database_url is not None else config.database_url
+        )
+        self.echo = echo if echo is not None else config.echo
+        self.engine = engine
+        self.pool = config.pool._replace(
+            **engines.PoolOptions.build(
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_recycle=pool_recycle,
+                pool_pre_ping=pool_pre_ping,
+            ).as_kwargs()
+        )
+        self.postponed_connection = postponed_connection
+        self.postponed_coalesce = postponed_coalesce
+        self.expire = expire
+        self.admission = admission
+        self.propagation = propagation
+
+    def transaction(
+        self,
+        priority: _admission.Priority = None,
+        propagation: ty.Optional[str] = None,
+    ):
+        propagation = self.propagation if propagation is None else propagation
+        _verify_propagation(propagation)
+
+        outer = _propagation.current_async()
+        if outer is not None and propagation == _propagation.REQUIRED:
+            return AsyncJoinedTransaction(outer)
+
+        return AsyncTransaction(
+            database_url=self.database_url,
+            echo=self.echo,
+            engine=self.engine,
+            pool=self.pool,
+            postponed_connection=self.postponed_connection,
+            postponed_coalesce=self.postponed_coalesce,
+            expire=self.expire,
+            admission=self.admission,
+            priority=priority,
+        )
+
+
+def _verify_propagation(propagation: str):
+    if propagation not in (_propagation.REQUIRED, _propagation.REQUIRES_NEW):
+        raise ValueError(f"unsupported propagation: {propagation!r}")
@@ -0,0 +1,82 @@
+import sys
+import typing as ty
+
+
+class BatchStats:
+    def __init__(self):
+        self.objects = 0
+        self.flushes = 0
+        self.peak_identity_map = 0
+
+    def as_dict(self) -> ty.Dict[str, int]:
+        return dict(vars(self))
+
+
+class Batcher:
+    """
+    Flushes the session and empties its identity map after `max_objects`
+    added objects or about `max_bytes` of their attributes, whichever
+    comes first. The database transaction stays the same.
+    """
+
+    def __init__(
+        self, max_objects: ty.Optional[int] = None, max_bytes: ty.Optional[int] = None
+    ):
+        if max_objects is None and max_bytes is None:
+            raise ValueError("max_objects or max_bytes is required")
+
+        if (max_objects is not None and max_objects < 1) or (
+            max_bytes is not None and max_bytes < 1
+        ):
+            raise ValueError("batch limits must be positive")
+
+        self.max_objects = max_objects
+        self.max_bytes = max_bytes
+        self.stats = BatchStats()
+        self._objects = 0
+        self._bytes = 0
+
+    def added(self, session, instance):
+        self._objects += 1
+        self.stats.objects += 1
+
+        if self.max_bytes is not None:
+            self._bytes += size_of(instance)
+
+        self.stats.peak_identity_map = max(
+            self.stats.peak_identity_map, len(session.identity_map) + self._objects
+        )
+
+        if self.__full:
+            self.checkpoint(session)
+
+    def checkpoint(self, session):
+        session.flush()
+        session.expunge_all()
+
+        # cached ORM results refer to the expunged instances
+        if session.cache is not None:
+            session.cache.clear()
+
+        self.stats.flushes += 1
+
+        self._objects = 0
+        self._bytes = 0
+
+    @property
+    def __full(self) -> bool:
+        if self.max_objects is not None and self._objects >= self.max_objects:
+            return True
+
+        return self.max_bytes is not None and self._bytes >= self.max_bytes
+
+
+def size_of(instance) -> int:
+    """
+    Estimates the memory held by the attributes of a mapped instance.
+    """
+    attributes = vars(instance)
+
+    return sys.getsizeof(attributes) + sum(
+        sys.getsizeof(_v) for _k, _v in attributes.items() if not _k.startswith("_sa_")
+    )
@@ -0,0 +1,131 @@
+import datetime
+import io
+import itertools
+import json
+import time
+import typing as ty
+
+import sqlalchemy as sa
+from sqlalchemy.engine.base import Connection
+
+EXECUTEMANY = "executemany"
+VALUES = "values"
+COPY = "copy"
+METHODS = (EXECUTEMANY, VALUES, COPY)
+
+Row = ty.Mapping[str, ty.Any]
+
+
+class BulkStats(ty.NamedTuple):
+    rows: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    method: ty.Optional[str] = None
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def insert(
+    conn: Connection,
+    table,
+    rows: ty.Iterable[Row],
+    chunk_size: int = 1000,
+    method: ty.Optional[str] = None,
+) -> BulkStats:
+    """
+    Inserts rows from an iterable, holding at most `chunk_size` of them
+    in memory at a time. COPY sends the values as they are: column types
+    and Python-side defaults of the table are not applied.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+
+    table = as_table(table)
+    method = method or EXECUTEMANY
+    if method not in METHODS:
+        raise ValueError(f"unsupported bulk insert method: {method!r}")
+
+    if method == COPY and not supports_copy(conn):
+        raise ValueError(f"COPY is not supported by {conn.dialect.driver!r}")
+
+    write = {EXECUTEMANY: _executemany, VALUES: _values, COPY: _copy}[method]
+    started = time.perf_counter()
+    total = chunks = 0
+    iterator = iter(rows)
+
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            break
+
+        write(conn, table, chunk)
+        total += len(chunk)
+        chunks += 1
+
+    return BulkStats(total, chunks, time.perf_counter() - started, method)
+
+
+def supports_copy(conn: Connection) -> bool:
+    return conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2"
+
+
+def as_table(table) -> sa.Table:
+    if isinstance(table, sa.Table):
+        return table
+
+    mapped = getattr(table, "__table__", None)
+    if isinstance(mapped, sa.Table):
+        return mapped
+
+    raise TypeError(f"not a table: {table!r}")
+
+
+def _executemany(conn, table, chunk):
+    conn.execute(table.insert(), chunk)
+
+
+def _values(conn, table, chunk):
+    conn.execute(table.insert().values(chunk))
+
+
+def _copy(conn, table, chunk):
+    columns = list(chunk[0])
+    buffer = io.StringIO()
+
+    for row in chunk:
+        buffer.write("\t".join(_copy_text(row.get(_c)) for _c in columns))
+        buffer.write("\n")
+
+    buffer.seek(0)
+
+    preparer = conn.dialect.identifier_preparer
+    sql = "COPY {} ({}) FROM STDIN".format(
+        preparer.format_table(table),
+        ", ".join(preparer.quote(_c) for _c in columns),
+    )
+
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_text(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\\\x" + bytes(value).hex()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+
+    return str(value).translate(_COPY_ESCAPES)
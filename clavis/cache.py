@@ -0,0 +1,162 @@
+import typing as ty
+from collections import OrderedDict
+
+import sqlalchemy as sa
+from sqlalchemy.sql import visitors
+
+_UNCACHED_OPTIONS = ("stream_results", "yield_per")
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def as_dict(self) -> ty.Dict[str, int]:
+        return dict(vars(self))
+
+
+class _Entry(ty.NamedTuple):
+    tables: ty.FrozenSet[str]
+    result: sa.engine.FrozenResult
+
+
+class ReadCache:
+    """
+    Keeps results of SELECTs of one transaction, at most `max_size`
+    of them, the least recently used ones are evicted first.
+    Writes to a table drop the results read from it.
+    """
+
+    def __init__(self, max_size: int = 128):
+        if max_size < 1:
+            raise ValueError("max_size must be positive")
+
+        self.max_size = max_size
+        self.stats = CacheStats()
+        self._entries: ty.MutableMapping[ty.Hashable, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def execute(self, statement, params, execution_options, execute):
+        """
+        Returns the cached result of `statement` or calls `execute()`
+        and caches what it returns.
+        """
+        key = self.key(statement, params, execution_options)
+        if key is None:
+            return execute()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry.result()
+
+        self.stats.misses += 1
+        frozen = execute().freeze()
+        self._entries[key] = _Entry(tables_of(statement), frozen)
+
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+        return frozen()
+
+    def invalidate(self, tables: ty.Iterable[str]):
+        tables = set(tables)
+        stale = [_k for _k, _e in self._entries.items() if _e.tables & tables]
+
+        for key in stale:
+            del self._entries[key]
+
+        self.stats.invalidations += len(stale)
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """
+        Drops the results read from a table written by any statement
+        on the connection: executed directly, flushed or cascaded.
+        Textual statements drop everything.
+        """
+        if not len(self._entries):
+            return
+
+        compiled = getattr(context, "compiled", None)
+
+        if context.isinsert or context.isupdate or context.isdelete:
+            table = getattr(compiled.statement, "table", None) if compiled else None
+            if table is not None:
+                self.invalidate((table_name(table),))
+                return
+
+        elif compiled is not None and not isinstance(
+            compiled.statement, sa.sql.expression.TextClause
+        ):
+            return
+
+        self.clear()
+
+    def clear(self):
+        self.stats.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def discard(self):
+        self._entries.clear()
+
+    @staticmethod
+    def key(statement, params, execution_options) -> ty.Optional[ty.Hashable]:
+        if (
+            not isinstance(statement, sa.sql.Select)
+            or statement._for_update_arg is not None
+        ):
+            return None
+
+        options = {**statement.get_execution_options(), **(execution_options or {})}
+        if any(options.get(_o) for _o in _UNCACHED_OPTIONS):
+            return None
+
+        cache_key = statement._generate_cache_key()
+        if cache_key is None:
+            return None
+
+        key = (
+            cache_key.key,
+            tuple(_freeze(_b.effective_value) for _b in cache_key.bindparams),
+            _freeze(params),
+            _freeze(options),
+        )
+
+        try:
+            hash(key)
+        except TypeError:
+            return None
+
+        return key
+
+
+def tables_of(statement) -> ty.FrozenSet[str]:
+    if isinstance(statement, sa.sql.expression.UpdateBase):
+        return frozenset((table_name(statement.table),))
+
+    return frozenset(
+        table_name(_t)
+        for _t in visitors.iterate(statement)
+        if isinstance(_t, sa.sql.expression.TableClause)
+    )
+
+
+def table_name(table) -> str:
+    return getattr(table, "fullname", table.name)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((_k, _freeze(_v)) for _k, _v in value.items()))
+
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(_freeze(_v) for _v in value)
+
+    return value
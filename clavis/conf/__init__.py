@@ -1,6 +1,132 @@
-from dynaconf import LazySettings
+import os
+import threading
+import typing as ty
 
-from .loader import load_from_global_envs
+from . import global_vars as _v
 
-settings = LazySettings()
-load_from_global_envs(settings)
+if ty.TYPE_CHECKING:
+    from dynaconf import LazySettings
+
+    from clavis.engines import PoolOptions
+    from clavis.slowlog import SlowQueryLog
+
+_lock = threading.RLock()
+_settings: ty.Optional["LazySettings"] = None
+_config: ty.Optional["Config"] = None
+
+
+class Config(ty.NamedTuple):
+    """
+    Resolved settings, rebuilt after `invalidate()`.
+    """
+
+    database_url: ty.Optional[str]
+    echo: ty.Optional[bool]
+    pool: "PoolOptions"
+    slow_query_log: ty.Optional["SlowQueryLog"]
+    replica_urls: ty.Tuple[str, ...]
+
+
+def __getattr__(name):
+    if name == "settings":
+        return get_settings()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_settings() -> "LazySettings":
+    settings = _settings
+    if settings is not None:
+        return settings
+
+    with _lock:
+        if _settings is None:
+            _init_settings()
+
+    return _settings
+
+
+def config() -> Config:
+    cfg = _config
+    if cfg is not None:
+        return cfg
+
+    with _lock:
+        if _config is None:
+            _resolve()
+
+        return _config
+
+
+def invalidate():
+    global _config
+
+    with _lock:
+        _config = None
+
+
+def pool_options() -> "PoolOptions":
+    return config().pool
+
+
+def slow_query_log() -> ty.Optional["SlowQueryLog"]:
+    return config().slow_query_log
+
+
+def replica_set(echo=None, pool=None):
+    from clavis.replicas import from_settings
+
+    return from_settings(
+        config().replica_urls,
+        echo,
+        pool if pool is not None else pool_options(),
+    )
+
+
+def _init_settings():
+    global _settings
+
+    from dynaconf import LazySettings
+
+    from .loader import load_from_global_envs
+
+    settings = LazySettings()
+    load_from_global_envs(settings)
+    _settings = settings
+
+
+def _resolve():
+    global _config
+
+    from clavis.engines import PoolOptions
+    from clavis.replicas import parse_urls
+    from clavis.slowlog import from_settings
+
+    settings = get_settings()
+
+    _config = Config(
+        database_url=settings.get(_v.VAR_DATABASE_URL),
+        echo=settings.get(_v.VAR_DATABASE_ECHO),
+        pool=PoolOptions.build(
+            pool_size=settings.get(_v.VAR_DATABASE_POOL_SIZE),
+            max_overflow=settings.get(_v.VAR_DATABASE_MAX_OVERFLOW),
+            pool_recycle=settings.get(_v.VAR_DATABASE_POOL_RECYCLE),
+            pool_pre_ping=settings.get(_v.VAR_DATABASE_POOL_PRE_PING),
+        ),
+        slow_query_log=from_settings(
+            settings.get(_v.VAR_DATABASE_SLOW_QUERY_MS),
+            settings.get(_v.VAR_DATABASE_SLOW_QUERY_SAMPLE_RATE),
+        ),
+        replica_urls=parse_urls(settings.get(_v.VAR_DATABASE_REPLICA_URLS)),
+    )
+
+
+def _after_fork_in_child():
+    global _lock, _config
+
+    _lock = threading.RLock()
+    _config = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -1,2 +1,9 @@
 VAR_DATABASE_ECHO = "DATABASE_ECHO"
+VAR_DATABASE_MAX_OVERFLOW = "DATABASE_MAX_OVERFLOW"
+VAR_DATABASE_POOL_PRE_PING = "DATABASE_POOL_PRE_PING"
+VAR_DATABASE_POOL_RECYCLE = "DATABASE_POOL_RECYCLE"
+VAR_DATABASE_POOL_SIZE = "DATABASE_POOL_SIZE"
+VAR_DATABASE_REPLICA_URLS = "DATABASE_REPLICA_URLS"
+VAR_DATABASE_SLOW_QUERY_MS = "DATABASE_SLOW_QUERY_MS"
+VAR_DATABASE_SLOW_QUERY_SAMPLE_RATE = "DATABASE_SLOW_QUERY_SAMPLE_RATE"
 VAR_DATABASE_URL = "DATABASE_URL"
@@ -6,7 +6,21 @@ from . import global_vars as _v
 def load_from_global_envs(settings):
     global_vars = {
         _var: os.getenv(_var)
-        for _var in (_v.VAR_DATABASE_URL, _v.VAR_DATABASE_ECHO)
+        for _var in (
+            _v.VAR_DATABASE_URL,
+            _v.VAR_DATABASE_ECHO,
+            _v.VAR_DATABASE_POOL_SIZE,
+            _v.VAR_DATABASE_MAX_OVERFLOW,
+            _v.VAR_DATABASE_POOL_RECYCLE,
+            _v.VAR_DATABASE_POOL_PRE_PING,
+            _v.VAR_DATABASE_REPLICA_URLS,
+            _v.VAR_DATABASE_SLOW_QUERY_MS,
+            _v.VAR_DATABASE_SLOW_QUERY_SAMPLE_RATE,
+        )
         if os.getenv(_var) is not None
     }
     settings.update(global_vars)
+
+    from . import invalidate
+
+    invalidate()
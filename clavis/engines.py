@@ -0,0 +1,175 @@
+import os
+import threading
+import typing as ty
+
+import sqlalchemy as sa
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+from . import errors
+
+if ty.TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+_lock = threading.Lock()
+_engines: ty.Dict[tuple, Engine] = {}
+_async_engines: ty.Dict[tuple, "AsyncEngine"] = {}
+
+
+class PoolOptions(ty.NamedTuple):
+    pool_size: ty.Optional[int] = None
+    max_overflow: ty.Optional[int] = None
+    pool_recycle: ty.Optional[int] = None
+    pool_pre_ping: ty.Optional[bool] = None
+
+    @classmethod
+    def build(
+        cls,
+        pool_size=None,
+        max_overflow=None,
+        pool_recycle=None,
+        pool_pre_ping=None,
+    ) -> "PoolOptions":
+        return cls(
+            pool_size=_as_int(pool_size),
+            max_overflow=_as_int(max_overflow),
+            pool_recycle=_as_int(pool_recycle),
+            pool_pre_ping=_as_bool(pool_pre_ping),
+        )
+
+    def as_kwargs(self) -> ty.Dict[str, ty.Any]:
+        return {_k: _v for _k, _v in self._asdict().items() if _v is not None}
+
+
+def get_engine(
+    database_url: str, echo: ty.Optional[bool] = None, pool: PoolOptions = PoolOptions()
+) -> Engine:
+    if not database_url:
+        raise errors.BadDatabaseError("database is not configured")
+
+    echo = bool(_as_bool(echo))
+    key = (str(database_url), echo, pool)
+
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
+
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _create_engine(database_url, echo, pool)
+            _engines[key] = engine
+
+    return engine
+
+
+def get_async_engine(
+    database_url: str, echo: ty.Optional[bool] = None, pool: PoolOptions = PoolOptions()
+) -> "AsyncEngine":
+    if not database_url:
+        raise errors.BadDatabaseError("database is not configured")
+
+    echo = bool(_as_bool(echo))
+    key = (str(database_url), echo, pool)
+
+    engine = _async_engines.get(key)
+    if engine is not None:
+        return engine
+
+    with _lock:
+        engine = _async_engines.get(key)
+        if engine is None:
+            engine = _create_async_engine(database_url, echo, pool)
+            _async_engines[key] = engine
+
+    return engine
+
+
+def dispose_all() -> int:
+    with _lock:
+        engines = list(_engines.values())
+        _engines.clear()
+
+    for engine in engines:
+        engine.dispose()
+
+    return len(engines)
+
+
+async def dispose_all_async() -> int:
+    with _lock:
+        engines = list(_async_engines.values())
+        _async_engines.clear()
+
+    for engine in engines:
+        await engine.dispose()
+
+    return len(engines) + dispose_all()
+
+
+def _after_fork_in_child():
+    """
+    Pools inherited from the parent process share its sockets, they are
+    replaced without closing these connections.
+    """
+    global _lock
+
+    _lock = threading.Lock()
+
+    for engine in _engines.values():
+        engine.dispose(close=False)
+
+    for engine in _async_engines.values():
+        engine.sync_engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _create_engine(database_url: str, echo: bool, pool: PoolOptions) -> Engine:
+    kwargs = {}
+    url = make_url(database_url)
+
+    if not _is_memory_sqlite(url):
+        kwargs.update(poolclass=QueuePool, **pool.as_kwargs())
+
+        if url.get_backend_name() == "sqlite":
+            kwargs.update(connect_args={"check_same_thread": False})
+
+    return sa.create_engine(database_url, encoding="utf-8", echo=echo, **kwargs)
+
+
+def _create_async_engine(database_url: str, echo: bool, pool: PoolOptions):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    kwargs = {}
+    url = make_url(database_url)
+
+    if not _is_memory_sqlite(url):
+        kwargs.update(poolclass=AsyncAdaptedQueuePool, **pool.as_kwargs())
+
+    return create_async_engine(database_url, echo=echo, **kwargs)
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _as_int(value) -> ty.Optional[int]:
+    if value is None or value == "":
+        return None
+
+    return int(value)
+
+
+def _as_bool(value) -> ty.Optional[bool]:
+    if value is None or isinstance(value, bool):
+        return value
+
+    if isinstance(value, str):
+        return value.strip().lower() in {"1", "true", "yes", "on"}
+
+    return bool(value)
@@ -8,3 +8,27 @@ class BadDatabaseError(ClavisError):
 
 class AlreadyEnteredError(ClavisError):
     pass
+
+
+class ExecutorFullError(ClavisError):
+    pass
+
+
+class ReadOnlyError(ClavisError):
+    pass
+
+
+class RollbackOnlyError(ClavisError):
+    pass
+
+
+class AdmissionError(ClavisError):
+    pass
+
+
+class AdmissionRejectedError(AdmissionError):
+    pass
+
+
+class AdmissionTimeoutError(AdmissionError):
+    pass
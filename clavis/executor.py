@@ -0,0 +1,118 @@
+import logging
+import threading
+import typing as ty
+from concurrent import futures
+
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.sql.expression import Executable
+
+from . import errors
+from . import postponed
+
+logger = logging.getLogger(__name__)
+
+ErrorCallback = ty.Callable[[BaseException, ty.List[Executable]], None]
+
+
+class PostponedExecutor:
+    def __init__(
+        self,
+        max_workers: int = 1,
+        max_pending: int = 1000,
+        block: bool = True,
+        timeout: ty.Optional[float] = None,
+        on_error: ty.Optional[ErrorCallback] = None,
+    ):
+        if max_pending < 1:
+            raise ValueError("max_pending must be positive")
+
+        self._pool = futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="clavis-postponed"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._block = block
+        self._timeout = timeout
+        self._on_error = on_error or _log_error
+        self._lock = threading.Lock()
+        self._pending: ty.Set[futures.Future] = set()
+        self._failed = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def failed(self) -> int:
+        return self._failed
+
+    def submit(
+        self, engine: Engine, queries: ty.Iterable[Executable]
+    ) -> futures.Future:
+        queries = list(queries)
+
+        acquired = (
+            self._slots.acquire(timeout=self._timeout)
+            if self._block
+            else self._slots.acquire(blocking=False)
+        )
+        if not acquired:
+            raise errors.ExecutorFullError(
+                f"postponed executor is full: {self.pending} pending"
+            )
+
+        try:
+            future = self._pool.submit(self._run, engine, queries)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._pending.add(future)
+
+        future.add_done_callback(self._done)
+
+        return future
+
+    def drain(self, timeout: ty.Optional[float] = None) -> bool:
+        with self._lock:
+            pending = set(self._pending)
+
+        _done, not_done = futures.wait(pending, timeout=timeout)
+
+        return not not_done
+
+    def flush(self) -> None:
+        self.drain()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+    def _run(
+        self, engine: Engine, queries: ty.List[Executable]
+    ) -> postponed.PostponedStats:
+        try:
+            with engine.connect() as conn:
+                with conn.begin():
+                    return postponed.execute(conn, queries, conn.dialect)
+
+        except Exception as exc:
+            with self._lock:
+                self._failed += 1
+            self._report(exc, queries)
+            raise
+
+    def _report(self, exc: BaseException, queries: ty.List[Executable]):
+        try:
+            self._on_error(exc, queries)
+        except Exception:
+            logger.exception("postponed executor error callback failed")
+
+    def _done(self, future: futures.Future):
+        with self._lock:
+            self._pending.discard(future)
+
+        self._slots.release()
+
+
+def _log_error(exc: BaseException, queries: ty.List[Executable]):
+    logger.error("failed to execute %d postponed queries", len(queries), exc_info=exc)
@@ -1,8 +1,24 @@
+import functools
 import typing as ty
 
 from sqlalchemy.engine.base import Engine
 
-from .conf import settings
+from . import admission as _admission
+from . import conf
+from . import engines
+from . import instrumentation
+from . import outbox as _outbox
+from . import parallel
+from . import postponed
+from . import propagation as _propagation
+from . import replicas
+from . import retry
+from . import session
+from .executor import PostponedExecutor
+from .group import GroupCommitter
+from .group import GroupTransaction
+from .engines import PoolOptions
+from .transaction import JoinedTransaction
 from .transaction import Transaction
 
 
@@ -12,14 +28,217 @@ class TransactionFactory:
         database_url: ty.Optional[str] = None,
         echo: ty.Optional[bool] = None,
         engine: ty.Optional[Engine] = None,
+        pool_size: ty.Optional[int] = None,
+        max_overflow: ty.Optional[int] = None,
+        pool_recycle: ty.Optional[int] = None,
+        pool_pre_ping: ty.Optional[bool] = None,
+        postponed_connection: str = postponed.SAME_CONNECTION,
+        postponed_executor: ty.Optional[PostponedExecutor] = None,
+        sinks: ty.Sequence[instrumentation.Sink] = (),
+        expire: str = session.EXPIRE_ALL,
+        lazy: bool = False,
+        read_only: bool = False,
+        replica_urls: ty.Optional[ty.Sequence[str]] = None,
+        balancing: str = replicas.ROUND_ROBIN,
+        outbox: ty.Optional[_outbox.Outbox] = None,
+        propagation: str = _propagation.REQUIRES_NEW,
+        group_commit: ty.Optional[GroupCommitter] = None,
+        admission: ty.Optional[_admission.AdmissionPolicy] = None,
+        cache_size: ty.Optional[int] = None,
+        postponed_coalesce: bool = False,
+        batch_objects: ty.Optional[int] = None,
+        batch_bytes: ty.Optional[int] = None,
     ):
+        if propagation not in _propagation.PROPAGATIONS:
+            raise ValueError(f"unsupported propagation: {propagation!r}")
+
+        config = conf.config()
         self.database_url = (
-            database_url if database_url is not None else settings.get("DATABASE_URL")
+            database_url if database_url is not None else config.database_url
         )
-        self.echo = echo if echo is not None else settings.get("DATABASE_ECHO")
+        self.echo = echo if echo is not None else config.echo
         self.engine = engine
+        self.pool = config.pool._replace(
+            **PoolOptions.build(
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_recycle=pool_recycle,
+                pool_pre_ping=pool_pre_ping,
+            ).as_kwargs()
+        )
+        self.postponed_connection = postponed_connection
+        self.postponed_executor = postponed_executor
+        self.postponed_coalesce = postponed_coalesce
+        self.retry_stats = retry.RetryStats()
+        self.sinks = tuple(sinks)
+        self.expire = expire
+        self.lazy = lazy
+        self.read_only = read_only
+        self.outbox = outbox
+        self.propagation = propagation
+        self.group_commit = group_commit
+        self.admission = admission
+        self.cache_size = cache_size
+        self.batch_objects = batch_objects
+        self.batch_bytes = batch_bytes
+
+        if replica_urls is None and database_url is None and engine is None:
+            replica_urls = config.replica_urls
+
+        replica_urls = replicas.parse_urls(replica_urls)
+        self.replicas = (
+            replicas.ReplicaSet(
+                replica_urls, echo=self.echo, pool=self.pool, balancing=balancing
+            )
+            if replica_urls
+            else None
+        )
+
+    def transaction(
+        self,
+        read_only: ty.Optional[bool] = None,
+        lazy: ty.Optional[bool] = None,
+        propagation: ty.Optional[str] = None,
+        priority: _admission.Priority = None,
+        cache_size: ty.Optional[int] = None,
+        batch_objects: ty.Optional[int] = None,
+        batch_bytes: ty.Optional[int] = None,
+    ):
+        propagation = self.propagation if propagation is None else propagation
+        if propagation not in _propagation.PROPAGATIONS:
+            raise ValueError(f"unsupported propagation: {propagation!r}")
+
+        outer = _propagation.current()
+        if outer is not None and propagation == _propagation.REQUIRED:
+            return JoinedTransaction(outer)
+
+        if outer is not None and propagation == _propagation.NESTED:
+            return outer.nested()
+
+        read_only = self.read_only if read_only is None else read_only
+        if self.group_commit is not None and not read_only:
+            engine = self.engine or engines.get_engine(
+                self.database_url, self.echo, self.pool
+            )
+            return GroupTransaction(
+                self.group_commit, engine, postponed_coalesce=self.postponed_coalesce
+            )
 
-    def transaction(self):
         return Transaction(
-            database_url=self.database_url, echo=self.echo, engine=self.engine
+            database_url=self.database_url,
+            echo=self.echo,
+            engine=self.engine,
+            pool=self.pool,
+            postponed_connection=self.postponed_connection,
+            postponed_executor=self.postponed_executor,
+            postponed_coalesce=self.postponed_coalesce,
+            sinks=self.sinks,
+            expire=self.expire,
+            lazy=self.lazy if lazy is None else lazy,
+            read_only=read_only,
+            replicas=self.replicas,
+            outbox=self.outbox,
+            admission=self.admission,
+            priority=priority,
+            cache_size=self.cache_size if cache_size is None else cache_size,
+            batch_objects=(
+                self.batch_objects if batch_objects is None else batch_objects
+            ),
+            batch_bytes=self.batch_bytes if batch_bytes is None else batch_bytes,
+        )
+
+    def map(
+        self,
+        fn: ty.Callable[[Transaction, ty.Any], ty.Any],
+        partitions: ty.Iterable[ty.Any],
+        processes: ty.Optional[int] = None,
+        retries: int = 0,
+        mp_context=None,
+    ) -> ty.List[parallel.PartitionResult]:
+        return parallel.run(
+            self,
+            fn,
+            partitions,
+            processes=processes,
+            retries=retries,
+            mp_context=mp_context,
         )
+
+    def __getstate__(self) -> ty.Dict[str, ty.Any]:
+        """
+        Only the configuration is pickled: an engine by its URL,
+        executors, sinks, group committer and admission policy are left out.
+        """
+        database_url = self.database_url
+        if self.engine is not None:
+            database_url = self.engine.url.render_as_string(hide_password=False)
+
+        return {
+            "database_url": database_url,
+            "echo": self.echo,
+            **self.pool._asdict(),
+            "postponed_connection": self.postponed_connection,
+            "expire": self.expire,
+            "lazy": self.lazy,
+            "read_only": self.read_only,
+            "replica_urls": tuple(
+                _r.database_url
+                for _r in (self.replicas.replicas if self.replicas else ())
+            ),
+            "balancing": (
+                self.replicas.balancing if self.replicas else replicas.ROUND_ROBIN
+            ),
+            "outbox": self.outbox.table.name if self.outbox is not None else None,
+            "propagation": self.propagation,
+            "cache_size": self.cache_size,
+            "postponed_coalesce": self.postponed_coalesce,
+            "batch_objects": self.batch_objects,
+            "batch_bytes": self.batch_bytes,
+        }
+
+    def __setstate__(self, state: ty.Dict[str, ty.Any]):
+        state = dict(state)
+        if state["outbox"] is not None:
+            state["outbox"] = _outbox.Outbox(state["outbox"])
+
+        self.__init__(**state)
+
+    def run(
+        self,
+        fn: ty.Callable[[Transaction], ty.Any],
+        retries: int = 3,
+        backoff: float = 0.05,
+        max_backoff: float = 2.0,
+        jitter: bool = True,
+    ):
+        return retry.run(
+            self.transaction,
+            fn,
+            retries=retries,
+            backoff=backoff,
+            max_backoff=max_backoff,
+            jitter=jitter,
+            stats=self.retry_stats,
+        )
+
+    def retrying(
+        self,
+        retries: int = 3,
+        backoff: float = 0.05,
+        max_backoff: float = 2.0,
+        jitter: bool = True,
+    ):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                return self.run(
+                    lambda _txn: fn(_txn, *args, **kwargs),
+                    retries=retries,
+                    backoff=backoff,
+                    max_backoff=max_backoff,
+                    jitter=jitter,
+                )
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,351 @@
+import logging
+import queue
+import threading
+import time
+import typing as ty
+from collections import OrderedDict
+from concurrent import futures
+
+from sqlalchemy import sql
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.sql.expression import Executable
+
+from . import errors
+from . import postponed
+from . import propagation
+from . import states
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class GroupCommitStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.transactions = 0
+        self.commits = 0
+        self.splits = 0
+        self.failed = 0
+
+    def record(self, transactions: int, commits: int, split: bool, failed: int):
+        with self._lock:
+            self.batches += 1
+            self.transactions += transactions
+            self.commits += commits
+            self.splits += int(split)
+            self.failed += failed
+
+    def as_dict(self) -> ty.Dict[str, int]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "transactions": self.transactions,
+                "commits": self.commits,
+                "splits": self.splits,
+                "failed": self.failed,
+            }
+
+
+Params = ty.Optional[ty.Union[ty.Dict[str, ty.Any], ty.List[ty.Dict[str, ty.Any]]]]
+Statement = ty.Union[Executable, ty.Tuple[Executable, Params]]
+
+
+class _Item(ty.NamedTuple):
+    engine: Engine
+    statements: ty.List[ty.Tuple[Executable, Params]]
+    future: futures.Future
+
+
+class GroupCommitter:
+    """
+    Executes statements of concurrent transactions in one database
+    transaction: a batch is closed after `max_batch` transactions or
+    `max_wait` seconds since its first one. If the batch fails,
+    each transaction of it is committed on its own.
+    """
+
+    def __init__(self, max_batch: int = 100, max_wait: float = 0.005):
+        if max_batch < 1:
+            raise ValueError("max_batch must be positive")
+
+        if max_wait < 0:
+            raise ValueError("max_wait must not be negative")
+
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.stats = GroupCommitStats()
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: ty.Optional[threading.Thread] = None
+        self._stopped = False
+
+    def submit(
+        self, engine: Engine, statements: ty.Iterable[Statement]
+    ) -> futures.Future:
+        """
+        Queues statements, alone or as `(statement, params)` pairs,
+        to be executed in one of the next batches.
+        """
+        future = futures.Future()
+        item = _Item(
+            engine,
+            [_s if isinstance(_s, tuple) else (_s, None) for _s in statements],
+            future,
+        )
+
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("group committer is shut down")
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="clavis-group-commit", daemon=True
+                )
+                self._thread.start()
+
+            self._queue.put(item)
+
+        return future
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+            self._queue.put(_STOP)
+
+        if wait and thread is not None:
+            thread.join()
+
+    def _loop(self):
+        stopping = False
+
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+
+                if item is _STOP:
+                    stopping = True
+                    break
+
+                batch.append(item)
+
+            for engine in {_i.engine for _i in batch}:
+                self._commit([_i for _i in batch if _i.engine is engine])
+
+    def _commit(self, batch: ty.List[_Item]):
+        try:
+            self._execute(batch)
+        except Exception as exc:
+            if len(batch) == 1:
+                batch[0].future.set_exception(exc)
+                self.stats.record(1, 1, False, 1)
+                return
+
+            logger.info(
+                "group commit of %d transactions failed, committing one by one",
+                len(batch),
+                exc_info=True,
+            )
+        else:
+            for item in batch:
+                item.future.set_result(None)
+            self.stats.record(len(batch), 1, False, 0)
+            return
+
+        failed = 0
+        for item in batch:
+            try:
+                self._execute([item])
+            except Exception as exc:
+                item.future.set_exception(exc)
+                failed += 1
+            else:
+                item.future.set_result(None)
+
+        self.stats.record(len(batch), len(batch) + 1, True, failed)
+
+    @staticmethod
+    def _execute(batch: ty.List[_Item]):
+        with batch[0].engine.connect() as conn:
+            with conn.begin():
+                plain = []
+
+                for statement, params in (_s for _i in batch for _s in _i.statements):
+                    if params is None:
+                        plain.append(statement)
+                        continue
+
+                    # statements with params keep their executemany as is
+                    postponed.execute(conn, plain, conn.dialect)
+                    plain = []
+                    conn.execute(statement, params)
+
+                postponed.execute(conn, plain, conn.dialect)
+
+
+class GroupSession:
+    """
+    Collects write statements of a group transaction,
+    they are executed when it is committed.
+    """
+
+    def __init__(self, origin=None):
+        self.statements: ty.List[ty.Tuple[Executable, Params]] = []
+        self.__origins = [origin]
+
+    @property
+    def txn(self):
+        return self.__origins[-1]
+
+    def enter_scope(self, origin, savepoint: bool = True):
+        if savepoint:
+            raise errors.ClavisError("group transactions do not support SAVEPOINTs")
+
+        self.__origins.append(origin)
+
+    def exit_scope(self, origin):
+        if self.__origins[-1] is not origin:
+            raise RuntimeError("nested scopes must be exited in reverse order")
+
+        self.__origins.pop()
+
+    def execute(self, statement, params=None):
+        if not isinstance(statement, (sql.Insert, sql.Update, sql.Delete)):
+            raise ValueError(
+                f"group transactions take INSERT, UPDATE and DELETE only,"
+                f" not {type(statement).__name__}"
+            )
+
+        self.statements.append((statement, params))
+
+    def flush(self):
+        """
+        Does nothing: the statements are executed when committed.
+        """
+
+    def commit(self) -> ty.NoReturn:
+        raise states.Committed(self.txn)
+
+    def rollback(self) -> ty.NoReturn:
+        raise states.RolledBack(self.txn)
+
+
+class GroupTransaction(postponed.Postponing):
+    def __init__(
+        self,
+        committer: GroupCommitter,
+        engine: Engine,
+        postponed_coalesce: bool = False,
+    ):
+        self._committer = committer
+        self._engine = engine
+        self._session = None
+        self._postponed = OrderedDict()
+        self._postponed_stats = None
+        self._postponed_coalesce = postponed_coalesce
+        self._postponed_coalesced = 0
+        self._token = None
+        self._rollback_only = False
+
+    @staticmethod
+    def current():
+        return propagation.current()
+
+    @property
+    def engine(self) -> Engine:
+        return self._engine
+
+    @property
+    def session(self) -> ty.Optional[GroupSession]:
+        return self._session
+
+    @property
+    def postponed_stats(self) -> ty.Optional[postponed.PostponedStats]:
+        return self._postponed_stats
+
+    @property
+    def postponed_coalesced(self) -> int:
+        return self._postponed_coalesced
+
+    @property
+    def rollback_only(self) -> bool:
+        return self._rollback_only
+
+    def mark_rollback_only(self):
+        self._rollback_only = True
+
+    def execute(self, statement, params=None):
+        self._session.execute(statement, params)
+
+    def commit(self) -> ty.NoReturn:
+        raise states.Committed(self)
+
+    def rollback(self) -> ty.NoReturn:
+        raise states.RolledBack(self)
+
+    def nested(self) -> ty.NoReturn:
+        raise errors.ClavisError("group transactions do not support SAVEPOINTs")
+
+    def __enter__(self):
+        if self._session is not None:
+            raise errors.AlreadyEnteredError()
+
+        self._session = GroupSession(origin=self)
+        self._token = propagation.activate(self)
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        own = isinstance(exc_val, states.StepState) and exc_val.origin is self
+        statements, self._session = self._session.statements, None
+
+        propagation.deactivate(self._token)
+        self._token = None
+
+        committed = not exc_type or (exc_type is states.Committed and own)
+
+        try:
+            if committed and statements and not self._rollback_only:
+                self._committer.submit(self._engine, statements).result()
+
+        finally:
+            self.__execute_postponed()
+
+        if committed and self._rollback_only:
+            raise errors.RollbackOnlyError(
+                "transaction was marked rollback-only and has been rolled back"
+            )
+
+        return True if own else None
+
+    def __execute_postponed(self):
+        """
+        Runs the postponed queries as a group transaction of their own
+        after this one is finished, whatever its outcome.
+        """
+        if not self._postponed:
+            return
+
+        queries = list(self._postponed.values())
+        if self._postponed_coalesce:
+            coalesced = postponed.coalesce(queries, self._engine.dialect)
+            self._postponed_coalesced = len(queries) - len(coalesced)
+            queries = coalesced
+
+        self._committer.submit(self._engine, queries).result()
+        self._postponed_stats = postponed.PostponedStats(
+            statements=len(queries),
+            round_trips=len(postponed.batch(queries, self._engine.dialect)),
+        )
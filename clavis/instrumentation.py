@@ -0,0 +1,325 @@
+import bisect
+import contextlib
+import logging
+import threading
+import time
+import typing as ty
+
+logger = logging.getLogger(__name__)
+
+COMMITTED = "committed"
+ROLLED_BACK = "rolled_back"
+ERROR = "error"
+
+PHASES = ("connect", "body", "flush", "finish", "postponed")
+
+Sink = ty.Callable[["TransactionRecord"], None]
+
+
+class TransactionRecord:
+    __slots__ = (
+        "database",
+        "connect_time",
+        "body_time",
+        "flush_time",
+        "finish_time",
+        "postponed_time",
+        "total_time",
+        "statements",
+        "rows",
+        "outcome",
+    )
+
+    def __init__(self, database: ty.Optional[str] = None):
+        self.database = database
+        self.connect_time = 0.0
+        self.body_time = 0.0
+        self.flush_time = 0.0
+        self.finish_time = 0.0
+        self.postponed_time = 0.0
+        self.total_time = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.outcome = None
+
+    def as_dict(self) -> ty.Dict[str, ty.Any]:
+        return {_k: getattr(self, _k) for _k in self.__slots__}
+
+    def __repr__(self):
+        fields = ", ".join(f"{_k}={_v!r}" for _k, _v in self.as_dict().items())
+        return f"{type(self).__name__}({fields})"
+
+
+class Recorder:
+    def __init__(self, sinks: ty.Sequence[Sink]):
+        self.sinks = sinks
+        self.record = TransactionRecord()
+        self._started = time.perf_counter()
+        self._body_started = None
+
+    @contextlib.contextmanager
+    def measure(self, phase: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            attr = f"{phase}_time"
+            elapsed = time.perf_counter() - started
+            setattr(self.record, attr, getattr(self.record, attr) + elapsed)
+
+    def body_started(self):
+        self._body_started = time.perf_counter()
+
+    def body_finished(self):
+        if self._body_started is not None:
+            self.record.body_time = time.perf_counter() - self._body_started
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.record.statements += 1
+
+        # SELECTs report the rows returned on some drivers, not affected ones
+        writes = context is not None and (
+            context.isinsert or context.isupdate or context.isdelete
+        )
+        if writes and cursor is not None and cursor.rowcount > 0:
+            self.record.rows += cursor.rowcount
+
+    def emit(self, outcome: str):
+        self.record.outcome = outcome
+        self.record.total_time = time.perf_counter() - self._started
+
+        for sink in self.sinks:
+            try:
+                sink(self.record)
+            except Exception:
+                logger.exception("transaction sink %r failed", sink)
+
+
+class CallbackSink:
+    def __init__(self, callback: Sink):
+        self.callback = callback
+
+    def __call__(self, record: TransactionRecord):
+        self.callback(record)
+
+
+class LoggingSink:
+    def __init__(
+        self, logger: ty.Optional[logging.Logger] = None, level: int = logging.INFO
+    ):
+        self.logger = logger or logging.getLogger("clavis.transactions")
+        self.level = level
+
+    def __call__(self, record: TransactionRecord):
+        if not self.logger.isEnabledFor(self.level):
+            return
+
+        self.logger.log(
+            self.level,
+            "transaction %s: total=%.6fs connect=%.6fs body=%.6fs flush=%.6fs"
+            " finish=%.6fs postponed=%.6fs statements=%d rows=%d",
+            record.outcome,
+            record.total_time,
+            record.connect_time,
+            record.body_time,
+            record.flush_time,
+            record.finish_time,
+            record.postponed_time,
+            record.statements,
+            record.rows,
+            extra={"clavis_transaction": record.as_dict()},
+        )
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values: ty.Dict[tuple, float] = {}
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self) -> ty.Iterator[ty.Tuple[str, tuple, float]]:
+        with self._lock:
+            items = list(self._values.items())
+
+        for key, value in items:
+            yield self.name, key, value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values: ty.Dict[tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def dec(self, value: float = 1, **labels):
+        self.inc(-value, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self) -> ty.Iterator[ty.Tuple[str, tuple, float]]:
+        with self._lock:
+            items = list(self._values.items())
+
+        for key, value in items:
+            yield self.name, key, value
+
+
+class Histogram:
+    kind = "histogram"
+
+    DEFAULT_BUCKETS = (
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+    )
+
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        buckets: ty.Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values: ty.Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        idx = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            entry[0][idx] += 1
+            entry[1] += value
+
+    def count(self, **labels) -> int:
+        counts, _total = self._values.get(tuple(sorted(labels.items())), ([], 0.0))
+        return sum(counts)
+
+    def sum(self, **labels) -> float:
+        _counts, total = self._values.get(tuple(sorted(labels.items())), ([], 0.0))
+        return total
+
+    def samples(self) -> ty.Iterator[ty.Tuple[str, tuple, float]]:
+        with self._lock:
+            items = [(_k, list(_c), _s) for _k, (_c, _s) in self._values.items()]
+
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket", key + (("le", le),), cumulative
+            yield f"{self.name}_count", key, cumulative
+            yield f"{self.name}_sum", key, total
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: ty.Dict[str, ty.Union[Counter, Gauge, Histogram]] = {}
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(
+        self,
+        name: str,
+        description: str = "",
+        buckets: ty.Sequence[float] = Histogram.DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, description, buckets=buckets)
+
+    def render(self) -> str:
+        lines = []
+
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+
+            for name, labels, value in metric.samples():
+                rendered = ",".join(f'{_k}="{_v}"' for _k, _v in labels)
+                lines.append(
+                    f"{name}{{{rendered}}} {value}" if rendered else f"{name} {value}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def _get_or_create(self, cls, name, description, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+
+            if metric is None:
+                metric = cls(name, description, **kwargs)
+                self._metrics[name] = metric
+
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name!r} is already registered")
+
+        return metric
+
+
+class MetricsSink:
+    def __init__(self, registry: MetricsRegistry, prefix: str = "clavis"):
+        self.registry = registry
+        self.transactions = registry.counter(
+            f"{prefix}_transactions_total", "Finished transactions"
+        )
+        self.statements = registry.counter(
+            f"{prefix}_statements_total", "Statements executed in transactions"
+        )
+        self.rows = registry.counter(
+            f"{prefix}_rows_total", "Rows affected in transactions"
+        )
+        self.durations = registry.histogram(
+            f"{prefix}_transaction_duration_seconds", "Transaction phase durations"
+        )
+
+    def __call__(self, record: TransactionRecord):
+        self.transactions.inc(outcome=record.outcome)
+        self.statements.inc(record.statements, outcome=record.outcome)
+        self.rows.inc(record.rows, outcome=record.outcome)
+
+        self.durations.observe(record.total_time, phase="total")
+        for phase in PHASES:
+            self.durations.observe(getattr(record, f"{phase}_time"), phase=phase)
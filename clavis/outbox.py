@@ -0,0 +1,458 @@
+import base64
+import datetime
+import decimal
+import json
+import logging
+import threading
+import time
+import typing as ty
+import uuid
+
+import sqlalchemy as sa
+from sqlalchemy.engine.base import Connection
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.engine.interfaces import Dialect
+from sqlalchemy.sql.expression import Executable
+
+from . import conf
+from . import engines
+from . import postponed
+from . import retry
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY = "idempotency_key"
+SKIP_LOCKED_DIALECTS = frozenset({"postgresql", "mysql", "oracle"})
+RETRY_BACKOFF = 0.01
+
+
+class Outbox:
+    def __init__(self, table_name: str = "clavis_outbox", metadata=None):
+        self.table = sa.Table(
+            table_name,
+            metadata if metadata is not None else sa.MetaData(),
+            sa.Column(
+                "id",
+                sa.BigInteger().with_variant(sa.Integer, "sqlite"),
+                primary_key=True,
+                autoincrement=True,
+            ),
+            sa.Column("idempotency_key", sa.String(255), nullable=False, unique=True),
+            sa.Column("statement", sa.Text, nullable=False),
+            sa.Column("created_at", sa.Float, nullable=False),
+            sa.Column("attempts", sa.Integer, nullable=False, default=0),
+            sa.Column("last_error", sa.Text),
+            sa.Column("applied_at", sa.Float),
+            sa.Index(f"ix_{table_name}_pending", "applied_at", "id"),
+        )
+
+    def create(self, bind: ty.Union[Engine, Connection]):
+        self.table.create(bind, checkfirst=True)
+
+    def enqueue(
+        self, conn: Connection, queries: ty.Iterable[Executable]
+    ) -> postponed.PostponedStats:
+        now = time.time()
+        rows = [
+            {
+                "idempotency_key": _idempotency_key(_q),
+                "statement": serialize(_q, conn.dialect),
+                "created_at": now,
+                "attempts": 0,
+            }
+            for _q in queries
+        ]
+
+        if not rows:
+            return postponed.PostponedStats()
+
+        conn.execute(self.__insert_ignoring_duplicates(conn, rows), rows)
+
+        return postponed.PostponedStats(statements=len(rows), round_trips=1)
+
+    def pending(self, conn: Connection, max_attempts: ty.Optional[int] = None) -> int:
+        query = sa.select([sa.func.count()]).where(self.table.c.applied_at.is_(None))
+        if max_attempts is not None:
+            query = query.where(self.table.c.attempts < max_attempts)
+
+        return conn.execute(query).scalar()
+
+    def purge(self, conn: Connection, older_than: float) -> int:
+        """
+        Deletes entries applied more than `older_than` seconds ago.
+        Their idempotency keys can be enqueued again afterwards.
+        """
+        query = self.table.delete().where(
+            self.table.c.applied_at < time.time() - older_than
+        )
+
+        return conn.execute(query).rowcount
+
+    def __insert_ignoring_duplicates(self, conn, rows):
+        name = conn.dialect.name
+
+        if name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+
+            return insert(self.table).on_conflict_do_nothing(
+                index_elements=[self.table.c.idempotency_key]
+            )
+
+        if name == "sqlite":
+            return self.table.insert().prefix_with("OR IGNORE")
+
+        if name == "mysql":
+            return self.table.insert().prefix_with("IGNORE")
+
+        keys = [_r["idempotency_key"] for _r in rows]
+        existing = {
+            _k
+            for _k, in conn.execute(
+                sa.select([self.table.c.idempotency_key]).where(
+                    self.table.c.idempotency_key.in_(keys)
+                )
+            )
+        }
+        rows[:] = [_r for _r in rows if _r["idempotency_key"] not in existing]
+
+        return self.table.insert()
+
+
+class DrainStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.applied = 0
+        self.failed = 0
+        self.round_trips = 0
+
+    def record(self, applied: int, failed: int, round_trips: int):
+        with self._lock:
+            self.batches += 1
+            self.applied += applied
+            self.failed += failed
+            self.round_trips += round_trips
+
+    def as_dict(self) -> ty.Dict[str, int]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "applied": self.applied,
+                "failed": self.failed,
+                "round_trips": self.round_trips,
+            }
+
+
+class Drainer:
+    """
+    Applies outbox entries in batches: at least once, in id order within
+    a batch. A batch is applied in one transaction; if it fails, its
+    entries are retried one by one and the failing ones are left for
+    later until `max_attempts`.
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        database_url: ty.Optional[str] = None,
+        engine: ty.Optional[Engine] = None,
+        batch_size: int = 100,
+        workers: int = 1,
+        max_attempts: int = 10,
+        poll_interval: float = 1.0,
+        skip_locked: ty.Optional[bool] = None,
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+
+        if workers < 1:
+            raise ValueError("workers must be positive")
+
+        if engine is None:
+            config = conf.config()
+            engine = engines.get_engine(
+                database_url if database_url is not None else config.database_url,
+                config.echo,
+                config.pool,
+            )
+
+        self.outbox = outbox
+        self.engine = engine
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.skip_locked = (
+            skip_locked
+            if skip_locked is not None
+            else engine.dialect.name in SKIP_LOCKED_DIALECTS
+        )
+        self.stats = DrainStats()
+        self._stopping = threading.Event()
+        self._threads: ty.List[threading.Thread] = []
+
+    def drain_once(self) -> int:
+        """
+        Applies one batch, returns the number of entries taken.
+        """
+        with self.engine.connect() as conn:
+            with conn.begin():
+                entries = self.__claim(conn)
+                if not entries:
+                    return 0
+
+                try:
+                    with conn.begin_nested():
+                        round_trips = self.__apply(conn, entries)
+                except Exception:
+                    logger.warning(
+                        "outbox batch of %d failed, applying one by one",
+                        len(entries),
+                        exc_info=True,
+                    )
+                else:
+                    self.__mark_applied(conn, [_e.id for _e in entries])
+                    self.stats.record(len(entries), 0, round_trips + 1)
+                    return len(entries)
+
+                applied = failed = 0
+                for entry in entries:
+                    try:
+                        with conn.begin_nested():
+                            self.__apply(conn, [entry])
+                    except Exception as exc:
+                        self.__mark_failed(conn, entry, exc)
+                        failed += 1
+                    else:
+                        self.__mark_applied(conn, [entry.id])
+                        applied += 1
+
+                self.stats.record(applied, failed, len(entries) * 2)
+
+        return len(entries)
+
+    def drain(self) -> DrainStats:
+        """
+        Applies entries until the outbox has nothing left to apply,
+        using `workers` threads.
+        """
+        if self.workers == 1:
+            while self.drain_once():
+                pass
+        else:
+            threads = [
+                threading.Thread(target=self.__drain_until_empty, daemon=True)
+                for _ in range(self.workers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        return self.stats
+
+    def start(self):
+        if self._threads:
+            raise RuntimeError("drainer is already started")
+
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(
+                target=self.__poll, name=f"clavis-outbox-{_i}", daemon=True
+            )
+            for _i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, wait: bool = True):
+        self._stopping.set()
+
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+        self._threads = []
+
+    def __drain_until_empty(self):
+        attempt = 0
+
+        while True:
+            try:
+                if not self.drain_once():
+                    return
+            except Exception as exc:
+                if not retry.is_retryable(exc, self.engine.dialect.name):
+                    logger.exception("outbox drainer failed")
+                    return
+
+                # back off instead of spinning on a contended table
+                time.sleep(retry.delay(attempt, RETRY_BACKOFF, self.poll_interval))
+                attempt += 1
+            else:
+                attempt = 0
+
+    def __poll(self):
+        while not self._stopping.is_set():
+            try:
+                taken = self.drain_once()
+            except Exception:
+                logger.exception("outbox drainer failed")
+                taken = 0
+
+            if not taken:
+                self._stopping.wait(self.poll_interval)
+
+    def __claim(self, conn):
+        table = self.outbox.table
+        query = (
+            sa.select([table.c.id, table.c.statement, table.c.attempts])
+            .where(table.c.applied_at.is_(None))
+            .where(table.c.attempts < self.max_attempts)
+            .order_by(table.c.id)
+            .limit(self.batch_size)
+        )
+
+        if self.skip_locked:
+            return conn.execute(query.with_for_update(skip_locked=True)).fetchall()
+
+        # without row locks another worker may have read the same entries:
+        # an entry belongs to whoever manages to bump its attempts first
+        entries = conn.execute(query).fetchall()
+        claim = (
+            table.update()
+            .where(table.c.id == sa.bindparam("_id"))
+            .where(table.c.attempts == sa.bindparam("_attempts"))
+            .where(table.c.applied_at.is_(None))
+            .values(attempts=table.c.attempts + 1)
+        )
+
+        return [
+            _e
+            for _e in entries
+            if conn.execute(claim, {"_id": _e.id, "_attempts": _e.attempts}).rowcount
+        ]
+
+    def __apply(self, conn, entries) -> int:
+        round_trips = 0
+        last_sql, params = None, []
+
+        for entry in entries:
+            sql, entry_params = deserialize(entry.statement)
+
+            if sql != last_sql and params:
+                conn.exec_driver_sql(last_sql, params)
+                round_trips += 1
+                params = []
+
+            last_sql = sql
+            params.append(entry_params)
+
+        if params:
+            conn.exec_driver_sql(last_sql, params if len(params) > 1 else params[0])
+            round_trips += 1
+
+        return round_trips
+
+    def __mark_applied(self, conn, ids):
+        table = self.outbox.table
+        values = {"applied_at": time.time(), "last_error": None}
+        if self.skip_locked:
+            values["attempts"] = table.c.attempts + 1
+
+        conn.execute(table.update().where(table.c.id.in_(ids)).values(**values))
+
+    def __mark_failed(self, conn, entry, exc):
+        table = self.outbox.table
+        values = {"last_error": repr(exc)[:2000]}
+        if self.skip_locked:
+            values["attempts"] = table.c.attempts + 1
+
+        conn.execute(table.update().where(table.c.id == entry.id).values(**values))
+
+
+def serialize(query: Executable, dialect: Dialect) -> str:
+    compiled = query.compile(
+        dialect=dialect, compile_kwargs={"render_postcompile": True}
+    )
+    params = compiled.construct_params()
+
+    for column in getattr(compiled, "insert_prefetch", ()) + getattr(
+        compiled, "update_prefetch", ()
+    ):
+        _fill_default(params, column, compiled.isupdate)
+
+    for key, value in params.items():
+        bind = compiled.binds.get(key)
+        processor = (
+            bind.type.dialect_impl(dialect).bind_processor(dialect)
+            if bind is not None
+            else None
+        )
+        if processor is not None:
+            params[key] = processor(value)
+
+    if compiled.positional:
+        params = [params[_k] for _k in compiled.positiontup]
+
+    return json.dumps({"sql": str(compiled), "params": params}, default=_encode)
+
+
+def deserialize(statement: str) -> ty.Tuple[str, ty.Any]:
+    data = json.loads(statement, object_hook=_decode)
+    params = data["params"]
+
+    return data["sql"], tuple(params) if isinstance(params, list) else params
+
+
+def _idempotency_key(query: Executable) -> str:
+    key = query.get_execution_options().get(IDEMPOTENCY_KEY)
+    return str(key) if key is not None else uuid.uuid4().hex
+
+
+def _fill_default(params, column, is_update):
+    if params.get(column.key) is not None:
+        return
+
+    default = column.onupdate if is_update else column.default
+    if default is None or default.is_sequence or default.is_clause_element:
+        return
+
+    params[column.key] = default.arg(None) if default.is_callable else default.arg
+
+
+_TAGS = {
+    "$bytes": lambda _v: base64.b64decode(_v),
+    "$datetime": datetime.datetime.fromisoformat,
+    "$date": datetime.date.fromisoformat,
+    "$time": datetime.time.fromisoformat,
+    "$decimal": decimal.Decimal,
+    "$uuid": uuid.UUID,
+}
+
+
+def _encode(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$bytes": base64.b64encode(bytes(value)).decode("ascii")}
+    if isinstance(value, datetime.datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {"$time": value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {"$decimal": str(value)}
+    if isinstance(value, uuid.UUID):
+        return {"$uuid": str(value)}
+
+    raise TypeError(f"cannot store {type(value).__name__} in outbox")
+
+
+def _decode(obj):
+    if len(obj) == 1:
+        ((tag, value),) = obj.items()
+        decode = _TAGS.get(tag)
+        if decode is not None:
+            return decode(value)
+
+    return obj
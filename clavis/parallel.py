@@ -0,0 +1,72 @@
+import os
+import time
+import traceback
+import typing as ty
+from concurrent import futures
+
+from . import instrumentation
+
+
+class PartitionResult(ty.NamedTuple):
+    index: int
+    outcome: str
+    result: ty.Any = None
+    error: ty.Optional[str] = None
+    seconds: float = 0.0
+    pid: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome == instrumentation.COMMITTED
+
+
+def run(
+    factory,
+    fn: ty.Callable[[ty.Any, ty.Any], ty.Any],
+    partitions: ty.Iterable[ty.Any],
+    processes: ty.Optional[int] = None,
+    retries: int = 0,
+    mp_context=None,
+) -> ty.List[PartitionResult]:
+    """
+    Runs `fn(transaction, partition)` for every partition in a pool
+    of processes, one transaction per partition. The factory is passed
+    to the workers by its configuration, see `TransactionFactory.__getstate__`.
+    """
+    with futures.ProcessPoolExecutor(
+        max_workers=processes, mp_context=mp_context
+    ) as pool:
+        jobs = [
+            pool.submit(_run_partition, factory, fn, _i, _p, retries)
+            for _i, _p in enumerate(partitions)
+        ]
+
+        return [_j.result() for _j in jobs]
+
+
+def _run_partition(factory, fn, index: int, partition, retries: int):
+    started = time.perf_counter()
+    transactions = []
+
+    def attempt(txn):
+        transactions.append(txn)
+        return fn(txn, partition)
+
+    try:
+        result = factory.run(attempt, retries=retries)
+    except Exception as exc:
+        return PartitionResult(
+            index=index,
+            outcome=instrumentation.ERROR,
+            error="".join(traceback.format_exception_only(type(exc), exc)).strip(),
+            seconds=time.perf_counter() - started,
+            pid=os.getpid(),
+        )
+
+    return PartitionResult(
+        index=index,
+        outcome=transactions[-1].outcome,
+        result=result,
+        seconds=time.perf_counter() - started,
+        pid=os.getpid(),
+    )
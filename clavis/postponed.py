@@ -0,0 +1,344 @@
+import typing as ty
+
+from sqlalchemy import sql
+from sqlalchemy.engine.interfaces import Dialect
+from sqlalchemy.sql import operators
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.expression import Executable
+
+from . import cache
+
+SAME_CONNECTION = "same_connection"
+SEPARATE_CONNECTION = "separate_connection"
+CONNECTION_MODES = (SAME_CONNECTION, SEPARATE_CONNECTION)
+BACKGROUND = "background"
+OUTBOX = "outbox"
+
+
+class PostponedStats(ty.NamedTuple):
+    statements: int = 0
+    round_trips: int = 0
+
+    @property
+    def saved(self) -> int:
+        return self.statements - self.round_trips
+
+
+class Postponing:
+    _postponed: ty.Dict[int, Executable]
+
+    def postpone(self, *queries) -> ty.Union[ty.Tuple[int], int]:
+        if not queries:
+            raise ValueError(
+                f"{type(self).__name__}.postpone() requires at least one query to postpone"
+            )
+
+        result = []
+
+        for idx, query in enumerate(queries, 1):
+            if not isinstance(query, (sql.Insert, sql.Update, sql.Delete)):
+                raise ValueError(f"query {idx}: unsupported type {type(query)}")
+
+            h = hash(query)
+            self._postponed[h] = query
+
+            result.append(h)
+
+        return tuple(result) if len(result) > 1 else result[0]
+
+    def remove_postponed(self, query_id: int) -> ty.NoReturn:
+        if query_id in self._postponed:
+            del self._postponed[query_id]
+
+    def discard_postponed(self) -> ty.NoReturn:
+        self._postponed.clear()
+
+
+class Batch(ty.NamedTuple):
+    statement: Executable
+    params: ty.List[ty.Dict[str, ty.Any]]
+
+
+def batch(queries: ty.Iterable[Executable], dialect: Dialect) -> ty.List[Batch]:
+    batches = []
+    last_key = None
+
+    for query in queries:
+        compiled = query.compile(dialect=dialect)
+        key = _batch_key(compiled)
+        params = _params(compiled)
+
+        if key is not None and key == last_key:
+            batches[-1].params.append(params)
+        else:
+            batches.append(Batch(query, [params]))
+
+        last_key = key
+
+    return batches
+
+
+class _Write:
+    def __init__(self, query: Executable, dialect: Dialect):
+        self.query = query
+        self.table = cache.table_name(query.table)
+        self.tables = _tables(query) | {self.table}
+        self.key = _compiled_key(query, dialect)
+        whereclause = getattr(query, "whereclause", None)
+        self.where = (
+            _compiled_key(whereclause, dialect) if whereclause is not None else None
+        )
+        self.where_columns = _columns(whereclause, self.table)
+        self.row = _row(whereclause, self.table)
+        self.values = dict(getattr(query, "_values", None) or {})
+        self.set_columns = {_column_name(_k) for _k in self.values}
+        self.read_columns = set().union(
+            *(_columns(_v, self.table) for _v in self.values.values())
+        )
+
+    @property
+    def is_update(self) -> bool:
+        return isinstance(self.query, sql.Update)
+
+    @property
+    def is_delete(self) -> bool:
+        return isinstance(self.query, sql.Delete)
+
+    @property
+    def idempotent(self) -> bool:
+        if self.is_delete:
+            return True
+
+        return (
+            self.is_update
+            and self.mergeable
+            and not self.read_columns
+            and all(
+                isinstance(_v, sql.elements.BindParameter)
+                for _v in self.values.values()
+            )
+        )
+
+    @property
+    def mergeable(self) -> bool:
+        query = self.query
+
+        return (
+            self.is_update
+            and bool(self.values)
+            and not query._returning
+            and not query._ordered_values
+            and not self.set_columns & self.where_columns
+        )
+
+    def interferes(self, other: "_Write") -> bool:
+        if self.row and other.row and self.__other_row(other):
+            return False
+
+        return self.table in other.tables or other.table in self.tables
+
+    def __other_row(self, other: "_Write") -> bool:
+        key = self.row[0]
+
+        return (
+            key == other.row[0]
+            and self.row != other.row
+            and self.tables == other.tables == {self.table}
+            and key not in self.set_columns | other.set_columns
+        )
+
+
+def coalesce(queries: ty.Iterable[Executable], dialect: Dialect) -> ty.List[Executable]:
+    """
+    Removes postponed writes which do not change the outcome:
+    repeated idempotent UPDATEs and DELETEs, UPDATEs followed by a DELETE
+    of the same rows. Successive UPDATEs of the same rows are merged
+    into one. Statements are compared with the nearest preceding one
+    that touches the same tables, so the order of dependent writes holds.
+    """
+    kept: ty.List[_Write] = []
+
+    for query in queries:
+        write = _Write(query, dialect)
+
+        if write.is_delete:
+            _drop_superseded(kept, write)
+
+        previous = next((_w for _w in reversed(kept) if _w.interferes(write)), None)
+
+        if previous is not None:
+            if write.key is not None and previous.key == write.key and write.idempotent:
+                continue
+
+            if _can_merge(previous, write):
+                kept[kept.index(previous)] = _Write(
+                    _merge(previous.query, write.values), dialect
+                )
+                continue
+
+        kept.append(write)
+
+    return [_w.query for _w in kept]
+
+
+def _drop_superseded(kept: ty.List[_Write], delete: _Write):
+    for idx in range(len(kept) - 1, -1, -1):
+        write = kept[idx]
+        if not write.interferes(delete):
+            continue
+
+        superseded = (
+            write.mergeable
+            and write.tables == {delete.table}
+            and (delete.where is None or write.where == delete.where)
+            and not write.set_columns & delete.where_columns
+        )
+        if not superseded:
+            return
+
+        del kept[idx]
+
+
+def _can_merge(previous: _Write, write: _Write) -> bool:
+    return (
+        previous.mergeable
+        and write.mergeable
+        and previous.table == write.table
+        and previous.tables == write.tables
+        and previous.where is not None
+        and previous.where == write.where
+        and not write.read_columns & previous.set_columns
+    )
+
+
+def _merge(query: sql.Update, values: ty.Dict) -> sql.Update:
+    keys = {_column_name(_k): _k for _k in query._values}
+
+    return query.values(
+        {keys.get(_column_name(_k), _k): _v for _k, _v in values.items()}
+    )
+
+
+def _compiled_key(clause, dialect: Dialect) -> ty.Optional[ty.Hashable]:
+    compiled = clause.compile(
+        dialect=dialect, compile_kwargs={"render_postcompile": True}
+    )
+    key = (str(compiled), tuple(sorted(compiled.params.items())))
+
+    try:
+        hash(key)
+    except TypeError:
+        return None
+
+    return key
+
+
+def _tables(clause) -> ty.Set[str]:
+    return {
+        cache.table_name(_t)
+        for _t in visitors.iterate(clause)
+        if isinstance(_t, sql.expression.TableClause)
+    }
+
+
+def _columns(clause, table: str) -> ty.Set[str]:
+    if not isinstance(clause, sql.ClauseElement):
+        return set()
+
+    return {
+        _c.name
+        for _c in visitors.iterate(clause)
+        if isinstance(_c, sql.expression.ColumnClause)
+        and _c.table is not None
+        and cache.table_name(_c.table) == table
+    }
+
+
+def _row(whereclause, table: str) -> ty.Optional[ty.Tuple[str, ty.Any]]:
+    """
+    Returns the primary key column and value if the clause
+    is a comparison of them.
+    """
+    if not isinstance(whereclause, sql.elements.BinaryExpression):
+        return None
+
+    column, value = whereclause.left, whereclause.right
+    if (
+        whereclause.operator is not operators.eq
+        or not isinstance(column, sql.expression.ColumnClause)
+        or not getattr(column, "primary_key", False)
+        or column.table is None
+        or cache.table_name(column.table) != table
+        or not isinstance(value, sql.elements.BindParameter)
+    ):
+        return None
+
+    return column.name, value.effective_value
+
+
+def _column_name(key) -> str:
+    return getattr(key, "name", key)
+
+
+def execute(
+    executor, queries: ty.Iterable[Executable], dialect: Dialect
+) -> PostponedStats:
+    statements = 0
+    round_trips = 0
+
+    for b in batch(queries, dialect):
+        if len(b.params) > 1:
+            executor.execute(b.statement, b.params)
+        else:
+            executor.execute(b.statement)
+
+        statements += len(b.params)
+        round_trips += 1
+
+    return PostponedStats(statements=statements, round_trips=round_trips)
+
+
+async def execute_async(
+    conn, queries: ty.Iterable[Executable], dialect: Dialect
+) -> PostponedStats:
+    statements = 0
+    round_trips = 0
+
+    for b in batch(queries, dialect):
+        if len(b.params) > 1:
+            await conn.execute(b.statement, b.params)
+        else:
+            await conn.execute(b.statement)
+
+        statements += len(b.params)
+        round_trips += 1
+
+    return PostponedStats(statements=statements, round_trips=round_trips)
+
+
+def _batch_key(compiled) -> ty.Optional[ty.Hashable]:
+    if compiled.returning or any(_b.expanding for _b in compiled.binds.values()):
+        return None
+
+    prefetch = _prefetch(compiled)
+    if not prefetch <= compiled.params.keys():
+        return None
+
+    # a column set explicitly renders the same SQL as a defaulted one
+    return str(compiled), frozenset(prefetch)
+
+
+def _params(compiled) -> ty.Dict[str, ty.Any]:
+    """
+    Returns the bound values without the placeholders of Python-side
+    defaults and onupdates, so they are generated for every row.
+    """
+    prefetch = _prefetch(compiled)
+
+    return {_k: _v for _k, _v in compiled.params.items() if _k not in prefetch}
+
+
+def _prefetch(compiled) -> ty.Set[str]:
+    columns = (compiled.insert_prefetch or []) + (compiled.update_prefetch or [])
+
+    return {_c.key for _c in columns}
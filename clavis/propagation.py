@@ -0,0 +1,40 @@
+import contextvars
+import typing as ty
+
+REQUIRED = "required"
+REQUIRES_NEW = "requires_new"
+NESTED = "nested"
+PROPAGATIONS = (REQUIRED, REQUIRES_NEW, NESTED)
+
+_current: contextvars.ContextVar = contextvars.ContextVar(
+    "clavis_transaction", default=None
+)
+_current_async: contextvars.ContextVar = contextvars.ContextVar(
+    "clavis_async_transaction", default=None
+)
+
+
+def current():
+    return _current.get()
+
+
+def activate(txn) -> contextvars.Token:
+    return _current.set(txn)
+
+
+def deactivate(token: ty.Optional[contextvars.Token]):
+    if token is not None:
+        _current.reset(token)
+
+
+def current_async():
+    return _current_async.get()
+
+
+def activate_async(txn) -> contextvars.Token:
+    return _current_async.set(txn)
+
+
+def deactivate_async(token: ty.Optional[contextvars.Token]):
+    if token is not None:
+        _current_async.reset(token)
@@ -0,0 +1,52 @@
+import re
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection
+
+from . import errors
+
+_WRITE_STATEMENT = re.compile(
+    r"^\s*(alter|create|delete|drop|grant|insert|merge|replace|revoke|truncate"
+    r"|update|upsert)\b",
+    re.IGNORECASE,
+)
+
+
+def prepare(conn: Connection) -> Connection:
+    dialect = conn.dialect.name
+
+    if dialect == "postgresql":
+        conn = conn.execution_options(
+            postgresql_readonly=True, postgresql_deferrable=True
+        )
+
+    elif dialect == "mysql":
+        conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+
+    elif dialect == "sqlite":
+        conn.exec_driver_sql("PRAGMA query_only = ON")
+
+    sa.event.listen(conn, "before_cursor_execute", _reject_writes)
+
+    return conn
+
+
+def release(conn: Connection):
+    sa.event.remove(conn, "before_cursor_execute", _reject_writes)
+
+    if conn.dialect.name == "sqlite" and not conn.invalidated:
+        conn.exec_driver_sql("PRAGMA query_only = OFF")
+
+
+def is_write(statement: str, context=None) -> bool:
+    if context is not None and (
+        context.isinsert or context.isupdate or context.isdelete
+    ):
+        return True
+
+    return bool(_WRITE_STATEMENT.match(statement))
+
+
+def _reject_writes(conn, cursor, statement, parameters, context, executemany):
+    if is_write(statement, context):
+        raise errors.ReadOnlyError(f"write in read-only transaction: {statement}")
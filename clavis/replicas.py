@@ -0,0 +1,215 @@
+import itertools
+import logging
+import threading
+import time
+import typing as ty
+
+import sqlalchemy as sa
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine.base import Engine
+
+from . import engines
+
+logger = logging.getLogger(__name__)
+
+ROUND_ROBIN = "round-robin"
+LEAST_OUTSTANDING = "least-outstanding"
+BALANCING = (ROUND_ROBIN, LEAST_OUTSTANDING)
+
+
+class Replica:
+    def __init__(
+        self,
+        database_url: str,
+        echo: ty.Optional[bool] = None,
+        pool: engines.PoolOptions = engines.PoolOptions(),
+    ):
+        self.database_url = database_url
+        self.echo = echo
+        self.pool = pool
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = None
+        self.transactions = 0
+        self.ejections = 0
+
+    @property
+    def engine(self) -> Engine:
+        return engines.get_engine(self.database_url, self.echo, self.pool)
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until is not None
+
+    def ping(self) -> bool:
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(sa.text("SELECT 1"))
+        except sa_exc.DBAPIError:
+            return False
+
+        return True
+
+    def __repr__(self):
+        state = "ejected" if self.ejected else "healthy"
+        return f"<{type(self).__name__} {self.database_url!r} {state}>"
+
+
+class ReplicaSet:
+    def __init__(
+        self,
+        database_urls: ty.Sequence[str],
+        echo: ty.Optional[bool] = None,
+        pool: engines.PoolOptions = engines.PoolOptions(),
+        balancing: str = ROUND_ROBIN,
+        max_failures: int = 1,
+        eject_for: float = 30.0,
+        clock: ty.Callable[[], float] = time.monotonic,
+    ):
+        if balancing not in BALANCING:
+            raise ValueError(f"unsupported balancing: {balancing!r}")
+
+        if max_failures < 1:
+            raise ValueError("max_failures must be positive")
+
+        self.replicas = tuple(Replica(_url, echo, pool) for _url in database_urls)
+        self.balancing = balancing
+        self.max_failures = max_failures
+        self.eject_for = eject_for
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+
+    @property
+    def healthy(self) -> ty.Tuple[Replica, ...]:
+        return tuple(_r for _r in self.replicas if not _r.ejected)
+
+    def acquire(self, exclude: ty.Collection[Replica] = ()) -> ty.Optional[Replica]:
+        """
+        Picks a replica for a read-only transaction.
+        Returns None when no replica is available.
+        Ejected replicas whose time is up are pinged in the background,
+        they are not picked until they respond.
+        """
+        self.__probe_ejected()
+
+        with self._lock:
+            candidates = [
+                _r for _r in self.replicas if not _r.ejected and _r not in exclude
+            ]
+            if not candidates:
+                return None
+
+            if self.balancing == LEAST_OUTSTANDING:
+                replica = min(candidates, key=lambda _r: _r.outstanding)
+            else:
+                replica = candidates[next(self._next) % len(candidates)]
+
+            replica.outstanding += 1
+            replica.transactions += 1
+
+        return replica
+
+    def release(self, replica: Replica, error: ty.Optional[BaseException] = None):
+        with self._lock:
+            replica.outstanding -= 1
+
+        if error is not None and is_connection_error(error):
+            self.failed(replica)
+
+    def failed(self, replica: Replica):
+        with self._lock:
+            replica.failures += 1
+
+            if replica.failures < self.max_failures or replica.ejected:
+                return
+
+            replica.ejected_until = self._clock() + self.eject_for
+            replica.ejections += 1
+
+        logger.warning("replica %r is ejected for %.1fs", replica, self.eject_for)
+
+    def succeeded(self, replica: Replica):
+        if replica.failures:
+            with self._lock:
+                replica.failures = 0
+
+    def check(self) -> ty.Tuple[Replica, ...]:
+        """
+        Pings every replica: ejects unreachable ones and reinstates
+        the ejected ones which respond again. Returns healthy replicas.
+        """
+        for replica in self.replicas:
+            if replica.ping():
+                self.__reinstate(replica)
+            else:
+                self.failed(replica)
+
+        return self.healthy
+
+    def __probe_ejected(self):
+        now = self._clock()
+
+        for replica in self.replicas:
+            if replica.ejected and replica.ejected_until <= now:
+                with self._lock:
+                    if replica.ejected_until is None or replica.ejected_until > now:
+                        continue
+
+                    # one probe at a time: others keep skipping the replica
+                    replica.ejected_until = now + self.eject_for
+
+                threading.Thread(
+                    target=self.__probe,
+                    args=(replica,),
+                    name="clavis-replica-probe",
+                    daemon=True,
+                ).start()
+
+    def __probe(self, replica: Replica):
+        if replica.ping():
+            self.__reinstate(replica)
+
+    def __reinstate(self, replica: Replica):
+        with self._lock:
+            was_ejected = replica.ejected
+            replica.failures = 0
+            replica.ejected_until = None
+
+        if was_ejected:
+            logger.info("replica %r is reinstated", replica)
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    return isinstance(exc, sa_exc.DBAPIError) and exc.connection_invalidated
+
+
+def parse_urls(value) -> ty.Tuple[str, ...]:
+    if not value:
+        return ()
+
+    if isinstance(value, str):
+        value = value.split(",")
+
+    return tuple(_u.strip() for _u in value if _u and _u.strip())
+
+
+_cached: ty.Dict[tuple, ReplicaSet] = {}
+_cached_lock = threading.Lock()
+
+
+def from_settings(
+    database_urls, echo=None, pool: engines.PoolOptions = engines.PoolOptions()
+) -> ty.Optional[ReplicaSet]:
+    urls = parse_urls(database_urls)
+    if not urls:
+        return None
+
+    key = (urls, echo, pool)
+    replicas = _cached.get(key)
+
+    if replicas is None:
+        with _cached_lock:
+            replicas = _cached.setdefault(key, ReplicaSet(urls, echo, pool))
+
+    return replicas
@@ -0,0 +1,150 @@
+import random
+import threading
+import time
+import typing as ty
+
+from sqlalchemy import exc as sa_exc
+
+RETRYABLE_SQLSTATES = frozenset({"40001", "40P01"})
+RETRYABLE_MYSQL_ERRORS = frozenset({1205, 1213})
+RETRYABLE_SQLITE_MESSAGES = ("database is locked", "database table is locked")
+
+
+class RetryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.exhausted = 0
+        self.retry_time = 0.0
+
+    def record(self, attempts: int, retry_time: float, exhausted: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.attempts += attempts
+            self.retries += attempts - 1
+            self.exhausted += int(exhausted)
+            self.retry_time += retry_time
+
+    def as_dict(self) -> ty.Dict[str, ty.Union[int, float]]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "attempts": self.attempts,
+                "retries": self.retries,
+                "exhausted": self.exhausted,
+                "retry_time": self.retry_time,
+            }
+
+
+def is_retryable(exc: BaseException, dialect_name: ty.Optional[str] = None) -> bool:
+    if not isinstance(exc, sa_exc.DBAPIError) or exc.connection_invalidated:
+        return False
+
+    checks = _CHECKS.get(dialect_name)
+    if checks is None:
+        checks = tuple(_CHECKS.values())
+    else:
+        checks = (checks,)
+
+    return any(_check(exc.orig) for _check in checks)
+
+
+def delay(
+    attempt: int, backoff: float, max_backoff: float, jitter: bool = True
+) -> float:
+    value = min(max_backoff, backoff * 2**attempt)
+
+    if jitter:
+        value = random.uniform(value / 2, value)
+
+    return value
+
+
+def run(
+    transaction: ty.Callable[[], ty.Any],
+    fn: ty.Callable[[ty.Any], ty.Any],
+    retries: int = 3,
+    backoff: float = 0.05,
+    max_backoff: float = 2.0,
+    jitter: bool = True,
+    stats: ty.Optional[RetryStats] = None,
+    sleep: ty.Callable[[float], None] = time.sleep,
+):
+    started = time.monotonic()
+    attempt = 0
+
+    while True:
+        attempt_started = time.monotonic()
+        txn = transaction()
+        result = None
+
+        try:
+            with txn:
+                try:
+                    result = fn(txn)
+                except Exception as exc:
+                    if (
+                        attempt < retries
+                        and not _is_inner(txn)
+                        and is_retryable(exc, _dialect_name(txn))
+                    ):
+                        txn.discard_postponed()
+                    raise
+
+        except Exception as exc:
+            if (
+                attempt >= retries
+                or _is_inner(txn)
+                or not is_retryable(exc, _dialect_name(txn))
+            ):
+                if stats is not None:
+                    stats.record(
+                        attempt + 1,
+                        attempt_started - started,
+                        exhausted=attempt >= retries,
+                    )
+                raise
+
+            sleep(delay(attempt, backoff, max_backoff, jitter))
+            attempt += 1
+            continue
+
+        if stats is not None:
+            stats.record(attempt + 1, attempt_started - started)
+
+        return result
+
+
+def _is_inner(txn) -> bool:
+    # a failure inside a joined or nested scope breaks the outer transaction,
+    # so it's the outer one that has to be retried
+    return any(getattr(txn, _a, None) is not None for _a in ("parent", "outer"))
+
+
+def _dialect_name(txn) -> ty.Optional[str]:
+    engine = txn.engine
+    return engine.dialect.name if engine is not None else None
+
+
+def _is_retryable_postgresql(orig) -> bool:
+    code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    return code in RETRYABLE_SQLSTATES
+
+
+def _is_retryable_mysql(orig) -> bool:
+    args = getattr(orig, "args", ())
+    return bool(args) and args[0] in RETRYABLE_MYSQL_ERRORS
+
+
+def _is_retryable_sqlite(orig) -> bool:
+    message = str(orig).lower()
+    return any(_m in message for _m in RETRYABLE_SQLITE_MESSAGES)
+
+
+_CHECKS = {
+    "postgresql": _is_retryable_postgresql,
+    "mysql": _is_retryable_mysql,
+    "sqlite": _is_retryable_sqlite,
+}
@@ -1,34 +1,161 @@
+import typing as ty
+
+import sqlalchemy as sa
 from sqlalchemy.orm import Session as _SqlAlchemySession
 
+from . import batching
+from . import cache as _cache
+from . import errors
 from . import states
 
+EXPIRE_ALL = "all"
+EXPIRE_NONE = "none"
+EXPIRE_DIRTY_ONLY = "dirty-only"
+EXPIRE_EXPLICIT = "explicit"
+EXPIRE_POLICIES = (EXPIRE_ALL, EXPIRE_NONE, EXPIRE_DIRTY_ONLY, EXPIRE_EXPLICIT)
+
 
 class Session(_SqlAlchemySession):
     def __init__(self, *args, **kwargs):
-        self.__origin = kwargs.pop("origin", None)
+        self.__origins = [kwargs.pop("origin", None)]
+        self.__savepoints = [False]
+        self.__expire = kwargs.pop("expire", EXPIRE_ALL)
+        self.__read_only = kwargs.pop("read_only", False)
+        self.__cache = kwargs.pop("cache", None)
+        self.__batcher = kwargs.pop("batcher", None)
+        self.__marked = []
+
+        if self.__expire not in EXPIRE_POLICIES:
+            raise ValueError(f"unsupported expire policy: {self.__expire!r}")
 
         super().__init__(*args, **kwargs)
 
+    @property
+    def expire_policy(self) -> str:
+        return self.__expire
+
+    @property
+    def cache(self) -> ty.Optional[_cache.ReadCache]:
+        return self.__cache
+
+    @property
+    def batcher(self) -> ty.Optional[batching.Batcher]:
+        return self.__batcher
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.new or self.dirty or self.deleted)
+
+    def add(self, instance, *args, **kwargs):
+        self.__verify_writable("add")
+        super().add(instance, *args, **kwargs)
+
+        if self.__batcher is not None:
+            self.__batcher.added(self, instance)
+
+    def add_all(self, instances):
+        self.__verify_writable("add_all")
+
+        if self.__batcher is None:
+            return super().add_all(instances)
+
+        for instance in instances:
+            self.add(instance)
+
+    def delete(self, instance):
+        self.__verify_writable("delete")
+        super().delete(instance)
+
+    def __verify_writable(self, method: str):
+        if self.__read_only:
+            raise errors.ReadOnlyError(f"{method}() in read-only transaction")
+
+    def execute(self, statement, params=None, *args, **kwargs):
+        # writes invalidate the cache from the connection, see ReadCache.on_execute
+        if (
+            self.__cache is None
+            or not isinstance(statement, sa.sql.Select)
+            or self.has_changes
+        ):
+            return super().execute(statement, params, *args, **kwargs)
+
+        return self.__cache.execute(
+            statement,
+            params,
+            kwargs.get("execution_options"),
+            lambda: super(Session, self).execute(statement, params, *args, **kwargs),
+        )
+
     def flush(self, *args, **kwargs):
+        if self.__read_only and self.has_changes:
+            raise errors.ReadOnlyError("flush in read-only transaction")
+
+        if self.__expire == EXPIRE_DIRTY_ONLY:
+            self.__marked.extend(self.dirty)
+            self.__marked.extend(self.new)
+
         super().flush(*args, **kwargs)
-        self.expire_all()
+
+        if self.__expire == EXPIRE_ALL:
+            self.expire_all()
+
+        elif self.__marked and self.__expire != EXPIRE_NONE:
+            marked, self.__marked = self.__marked, []
+            for instance in marked:
+                if instance in self:
+                    self.expire(instance)
+
+    def mark_expired(self, *instances):
+        self.__marked.extend(instances)
 
     def commit(self):
         self.flush()
 
-        raise states.Committed(self.__origin)
+        raise states.Committed(self.txn)
 
     def rollback(self, internal: bool = False):
-        rollback_result = super().rollback()
+        if self.__cache is not None:
+            self.__cache.clear()
 
         if internal:
-            return rollback_result
-        else:
-            raise states.RolledBack(self.__origin)
+            return super().rollback()
+
+        if not self.in_scope:
+            super().rollback()
+
+        raise states.RolledBack(self.txn)
 
     def begin_nested(self):
-        raise NotImplementedError()
+        nested = getattr(self.txn, "nested", None)
+        if nested is None:
+            raise NotImplementedError()
+
+        return nested()
 
     @property
     def txn(self):
-        return self.__origin
+        return self.__origins[-1]
+
+    @property
+    def in_scope(self) -> bool:
+        return len(self.__origins) > 1
+
+    def enter_scope(self, origin, savepoint: bool = True):
+        """
+        Makes `origin` the owner of the states raised by the session,
+        in a SAVEPOINT unless `savepoint` is False.
+        """
+        nested = super().begin_nested() if savepoint else None
+        self.__origins.append(origin)
+        self.__savepoints.append(savepoint)
+
+        return nested
+
+    def exit_scope(self, origin):
+        if self.__origins[-1] is not origin:
+            raise RuntimeError("nested scopes must be exited in reverse order")
+
+        if self.__savepoints.pop() and self.__cache is not None:
+            self.__cache.clear()
+
+        self.__origins.pop()
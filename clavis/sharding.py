@@ -0,0 +1,161 @@
+import bisect
+import hashlib
+import itertools
+import typing as ty
+from concurrent import futures
+
+from . import engines
+from . import errors
+from . import propagation as _propagation
+from .factory import TransactionFactory
+
+Lookup = ty.Callable[[ty.Any], str]
+
+
+class HashRing:
+    """
+    Consistent hashing: every shard takes `points` places on a ring,
+    a key belongs to the shard at the first place after its hash.
+    Adding or removing a shard moves only the keys of its places.
+    """
+
+    def __init__(self, shards: ty.Iterable[str], points: int = 64):
+        if points < 1:
+            raise ValueError("points must be positive")
+
+        ring = sorted(
+            (_hash(f"{_shard}:{_i}"), _shard)
+            for _shard in shards
+            for _i in range(points)
+        )
+        if not ring:
+            raise ValueError("no shards")
+
+        self._hashes = [_h for _h, _s in ring]
+        self._shards = [_s for _h, _s in ring]
+
+    def __call__(self, key) -> str:
+        idx = bisect.bisect_right(self._hashes, _hash(str(key)))
+
+        return self._shards[idx % len(self._shards)]
+
+
+class RangeLookup:
+    """
+    Maps keys to shards by ranges: `[(0, "a"), (1000, "b")]` puts keys
+    from 0 up to 1000 to "a", and from 1000 on to "b".
+    """
+
+    def __init__(self, ranges: ty.Iterable[ty.Tuple[ty.Any, str]]):
+        ranges = sorted(ranges, key=lambda _r: _r[0])
+        if not ranges:
+            raise ValueError("no shards")
+
+        self._bounds = [_b for _b, _s in ranges]
+        self._shards = [_s for _b, _s in ranges]
+
+    def __call__(self, key) -> str:
+        idx = bisect.bisect_right(self._bounds, key) - 1
+        if idx < 0:
+            raise KeyError(f"no shard for key {key!r}")
+
+        return self._shards[idx]
+
+
+class ShardedTransactionFactory:
+    """
+    Routes transactions to shards by key. `shards` maps shard names
+    to database URLs or factories, `options` are passed to the factories
+    created for URLs. Factories of the same URL share the pooled engine.
+    """
+
+    def __init__(
+        self,
+        shards: ty.Mapping[str, ty.Union[str, TransactionFactory]],
+        key: ty.Optional[ty.Callable[[ty.Any], ty.Any]] = None,
+        lookup: ty.Optional[Lookup] = None,
+        **options,
+    ):
+        if not shards:
+            raise ValueError("no shards")
+
+        self.factories: ty.Dict[str, TransactionFactory] = {
+            _name: (
+                _shard
+                if isinstance(_shard, TransactionFactory)
+                else TransactionFactory(_shard, **options)
+            )
+            for _name, _shard in shards.items()
+        }
+        self.key = key
+        self.lookup = lookup if lookup is not None else HashRing(self.factories)
+
+    def shard_for(self, shard_key) -> str:
+        shard = self.lookup(self.key(shard_key) if self.key else shard_key)
+        if shard not in self.factories:
+            raise errors.ClavisError(f"unknown shard {shard!r}")
+
+        return shard
+
+    def factory(self, shard_key) -> TransactionFactory:
+        return self.factories[self.shard_for(shard_key)]
+
+    def transaction(self, shard_key, **kwargs):
+        factory = self.factory(shard_key)
+
+        propagation = kwargs.get("propagation") or factory.propagation
+        outer = _propagation.current()
+        if outer is not None and propagation != _propagation.REQUIRES_NEW:
+            if outer.engine is not _engine(factory):
+                raise errors.ClavisError(
+                    f"cannot {propagation!r} a transaction of another shard"
+                )
+
+        return factory.transaction(**kwargs)
+
+    def gather(
+        self,
+        fn: ty.Callable[[ty.Any], ty.Any],
+        merge: ty.Optional[ty.Callable[[ty.Iterable[ty.Any]], ty.Any]] = None,
+        shards: ty.Optional[ty.Iterable[str]] = None,
+        read_only: bool = True,
+        max_workers: ty.Optional[int] = None,
+    ):
+        """
+        Runs `fn(transaction)` on every shard concurrently, returns
+        the results by shard or, with `merge`, merged in shard order.
+        """
+        names = list(shards if shards is not None else self.factories)
+        if not names:
+            return merge([]) if merge is not None else {}
+
+        with futures.ThreadPoolExecutor(
+            max_workers=max_workers or len(names), thread_name_prefix="clavis-shard"
+        ) as pool:
+            jobs = {
+                _name: pool.submit(self.__run, _name, fn, read_only) for _name in names
+            }
+            results = {_name: _job.result() for _name, _job in jobs.items()}
+
+        return merge(results.values()) if merge is not None else results
+
+    def __run(self, shard: str, fn, read_only: bool):
+        with self.factories[shard].transaction(read_only=read_only) as txn:
+            return fn(txn)
+
+
+def concat(results: ty.Iterable[ty.Iterable[ty.Any]]) -> ty.List[ty.Any]:
+    return list(itertools.chain.from_iterable(results))
+
+
+def _engine(factory: TransactionFactory):
+    if factory.engine is not None:
+        return factory.engine
+
+    return engines.get_engine(factory.database_url, factory.echo, factory.pool)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(), "big"
+    )
@@ -0,0 +1,117 @@
+import logging
+import os
+import random
+import sys
+import time
+import typing as ty
+import weakref
+
+import sqlalchemy as sa
+
+logger = logging.getLogger("clavis.slow")
+
+_SKIPPED_PATHS = tuple(
+    os.path.dirname(os.path.abspath(_f)) + os.sep for _f in (sa.__file__, __file__)
+)
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        threshold_ms: float,
+        sample_rate: float = 0.0,
+        max_params_length: int = 200,
+        logger: logging.Logger = logger,
+    ):
+        if threshold_ms < 0:
+            raise ValueError("threshold_ms must not be negative")
+
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.max_params_length = max_params_length
+        self.logger = logger
+
+    def attach(self, conn, owner=None):
+        ref = weakref.ref(owner) if owner is not None else None
+
+        def before(conn, cursor, statement, parameters, context, executemany):
+            context._clavis_started = time.perf_counter()
+
+        def after(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, "_clavis_started", None)
+            if started is None:
+                return
+
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.report(
+                statement, parameters, duration_ms, ref() if ref is not None else None
+            )
+
+        sa.event.listen(conn, "before_cursor_execute", before)
+        sa.event.listen(conn, "after_cursor_execute", after)
+
+    def report(self, statement, parameters, duration_ms: float, owner=None):
+        if duration_ms >= self.threshold_ms:
+            level = logging.WARNING
+        elif self.sample_rate and random.random() < self.sample_rate:
+            level = logging.INFO
+        else:
+            return
+
+        if not self.logger.isEnabledFor(level):
+            return
+
+        self.logger.log(
+            level,
+            "%s statement (%.3f ms) in %r at %s: %s; parameters: %s",
+            "slow" if level == logging.WARNING else "sampled",
+            duration_ms,
+            owner,
+            call_site(),
+            statement,
+            self.truncate(parameters),
+            extra={
+                "clavis_statement": statement,
+                "clavis_duration_ms": duration_ms,
+                "clavis_transaction": owner,
+            },
+        )
+
+    def truncate(self, parameters) -> str:
+        text = repr(parameters)
+        if len(text) > self.max_params_length:
+            text = text[: self.max_params_length] + "..."
+
+        return text
+
+
+def call_site() -> str:
+    frame = sys._getframe(1)
+
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_SKIPPED_PATHS):
+            return f"{filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+        frame = frame.f_back
+
+    return "<unknown>"
+
+
+_cached: ty.Dict[tuple, SlowQueryLog] = {}
+
+
+def from_settings(threshold_ms, sample_rate) -> ty.Optional[SlowQueryLog]:
+    if threshold_ms is None or threshold_ms == "":
+        return None
+
+    key = (float(threshold_ms), float(sample_rate or 0))
+    log = _cached.get(key)
+
+    if log is None:
+        log = _cached.setdefault(key, SlowQueryLog(*key))
+
+    return log
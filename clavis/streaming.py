@@ -0,0 +1,77 @@
+import typing as ty
+
+ROWS = "rows"
+COLUMNS = "columns"
+NUMPY = "numpy"
+OUTPUTS = (ROWS, COLUMNS, NUMPY)
+
+
+class Stream:
+    """
+    Iterates a result fetched through a server-side cursor where the
+    dialect has one: rows one by one, or batches of `chunk_size` rows
+    as column dicts or NumPy structured arrays.
+    """
+
+    def __init__(self, result, chunk_size: int, output: str = ROWS):
+        self._result = result
+        self._keys = list(result.keys())
+        self._output = output
+        self._rows = iter(result) if output == ROWS else None
+        self._batches = result.partitions(chunk_size) if output != ROWS else None
+
+    @property
+    def closed(self) -> bool:
+        return self._result is None
+
+    def keys(self) -> ty.List[str]:
+        return self._keys
+
+    def close(self):
+        result, self._result = self._result, None
+        if result is not None:
+            result.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._result is None:
+            raise StopIteration
+
+        try:
+            if self._rows is not None:
+                return next(self._rows)
+
+            return self.__convert(next(self._batches))
+
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __convert(self, rows):
+        if self._output == COLUMNS:
+            return {_k: list(_c) for _k, _c in zip(self._keys, zip(*rows))}
+
+        numpy = require_numpy()
+
+        return numpy.rec.fromrecords([tuple(_r) for _r in rows], names=self._keys).view(
+            numpy.ndarray
+        )
+
+
+def require_numpy():
+    try:
+        import numpy
+    except ImportError as exc:
+        raise ImportError(
+            f"output={NUMPY!r} requires numpy: pip install clavis[numpy]"
+        ) from exc
+
+    return numpy
@@ -1,38 +1,112 @@
+import contextlib
 import typing as ty
+import weakref
 from collections import OrderedDict
+from concurrent.futures import Future
 
 import sqlalchemy as sa
-from sqlalchemy import sql
 from sqlalchemy.engine.base import Engine
 from sqlalchemy.orm import Session
-from sqlalchemy.pool import NullPool
+from sqlalchemy.sql.expression import Executable
 
+from . import admission as _admission
+from . import batching
+from . import bulk
+from . import cache
 from . import conf
+from . import engines
 from . import errors
+from . import executor
+from . import instrumentation
+from . import outbox as _outbox
+from . import postponed
+from . import propagation
+from . import readonly
+from . import replicas as _replicas
 from . import session
 from . import states
+from . import streaming
 
 
-class Transaction(object):
+class Transaction(postponed.Postponing):
     def __init__(
         self,
         database_url: ty.Optional[str] = None,
         echo: ty.Optional[bool] = None,
         engine: ty.Optional[Engine] = None,
+        pool: ty.Optional[engines.PoolOptions] = None,
+        postponed_connection: str = postponed.SAME_CONNECTION,
+        postponed_executor: ty.Optional[executor.PostponedExecutor] = None,
+        sinks: ty.Sequence[instrumentation.Sink] = (),
+        expire: str = session.EXPIRE_ALL,
+        lazy: bool = False,
+        read_only: bool = False,
+        replicas: ty.Optional[_replicas.ReplicaSet] = None,
+        outbox: ty.Optional[_outbox.Outbox] = None,
+        admission: ty.Optional[_admission.AdmissionPolicy] = None,
+        priority: _admission.Priority = None,
+        cache_size: ty.Optional[int] = None,
+        postponed_coalesce: bool = False,
+        batch_objects: ty.Optional[int] = None,
+        batch_bytes: ty.Optional[int] = None,
     ):
+        if expire not in session.EXPIRE_POLICIES:
+            raise ValueError(f"unsupported expire policy: {expire!r}")
+
+        if postponed_connection not in postponed.CONNECTION_MODES:
+            raise ValueError(
+                f"unsupported postponed connection mode: {postponed_connection!r}"
+            )
+
+        config = conf.config()
         self._database_url = (
-            database_url
-            if database_url is not None
-            else conf.settings.get("DATABASE_URL")
+            database_url if database_url is not None else config.database_url
         )
-        self._echo = echo if echo is not None else conf.settings.get("DATABASE_ECHO")
+        self._echo = echo if echo is not None else config.echo
+        self._pool = pool if pool is not None else config.pool
+
+        if replicas is None and read_only and database_url is None and engine is None:
+            replicas = conf.replica_set(self._echo, self._pool)
 
         self._engine = None
+        self._primary = None
+        self._replicas = replicas
+        self._replica = None
         self._external_engine = engine
         self._conn = None
         self._txn = None
         self._session = None
         self._postponed = OrderedDict()
+        self._postponed_stats = None
+        self._postponed_connection = postponed_connection
+        self._expire = expire
+        self._postponed_executor = postponed_executor
+        self._postponed_future = None
+        self._postponed_coalesce = postponed_coalesce
+        self._postponed_coalesced = 0
+        self._outbox = outbox
+        self._admission = admission
+        self._priority = priority
+        self._admitted = False
+        self._cache_size = cache_size
+        self._cache = None
+        self._batch_limits = (batch_objects, batch_bytes)
+        self._batcher = None
+        self._sinks = tuple(sinks)
+        self._recorder = None
+        self._lazy = lazy
+        self._read_only = read_only
+        self._entered = False
+        self._streams = weakref.WeakSet()
+        self._token = None
+        self._rollback_only = False
+        self._outcome = None
+
+    @staticmethod
+    def current() -> (
+        ty.Optional[ty.Union["Transaction", "NestedTransaction", "JoinedTransaction"]]
+    ):
+        return propagation.current()
 
     @property
     def engine(self) -> Engine:
@@ -40,118 +114,679 @@ class Transaction(object):
 
     @property
     def session(self) -> Session:
+        if self._session is None and self._entered:
+            with self.__measure("connect"):
+                self.__connect_and_begin()
+
         return self._session
 
-    def postpone(self, *queries) -> ty.Union[ty.Tuple[int], int]:
-        if not queries:
-            raise ValueError(
-                f"{Transaction.__name__}.postpone() requires at least one query to postpone"
-            )
+    @property
+    def replica(self) -> ty.Optional[_replicas.Replica]:
+        return self._replica
+
+    @property
+    def read_only(self) -> bool:
+        return self._read_only
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None
 
-        result = []
+    @property
+    def rollback_only(self) -> bool:
+        return self._rollback_only
+
+    def mark_rollback_only(self):
+        self._rollback_only = True
+
+    @property
+    def outcome(self) -> ty.Optional[str]:
+        return self._outcome
 
-        for idx, query in enumerate(queries, 1):
-            if not isinstance(query, (sql.Insert, sql.Update, sql.Delete)):
-                raise ValueError(f"query {idx}: unsupported type {type(query)}")
+    @property
+    def cache_stats(self) -> ty.Optional[cache.CacheStats]:
+        return self._cache.stats if self._cache is not None else None
+
+    @property
+    def batch_stats(self) -> ty.Optional[batching.BatchStats]:
+        return self._batcher.stats if self._batcher is not None else None
 
-            h = hash(query)
-            self._postponed[h] = query
+    @property
+    def postponed_stats(self) -> ty.Optional[postponed.PostponedStats]:
+        if self._postponed_future is not None and self._postponed_future.done():
+            if not self._postponed_future.exception():
+                return self._postponed_future.result()
 
-            result.append(h)
+        return self._postponed_stats
 
-        return tuple(result) if len(result) > 1 else result[0]
+    @property
+    def postponed_future(self) -> ty.Optional[Future]:
+        return self._postponed_future
 
-    def remove_postponed(self, query_id: int) -> ty.NoReturn:
-        if query_id in self._postponed:
-            del self._postponed[query_id]
+    @property
+    def postponed_coalesced(self) -> int:
+        return self._postponed_coalesced
 
     def commit(self) -> ty.NoReturn:
         if not self._session:
             raise states.Committed()
 
+        if self._session.txn is not self:
+            self._session.flush()
+            raise states.Committed(self)
+
         self.session.commit()
 
     def rollback(self) -> ty.NoReturn:
         if not self._session:
             raise states.RolledBack()
 
+        if self._session.txn is not self:
+            raise states.RolledBack(self)
+
         self.session.rollback()
 
+    def nested(self) -> "NestedTransaction":
+        return NestedTransaction(self)
+
+    def bulk_insert(
+        self,
+        table,
+        rows: ty.Iterable[bulk.Row],
+        chunk_size: int = 1000,
+        method: ty.Optional[str] = None,
+    ) -> bulk.BulkStats:
+        if self.session is None:
+            raise errors.ClavisError("transaction is not entered")
+
+        if self._read_only:
+            raise errors.ReadOnlyError("bulk insert in read-only transaction")
+
+        self._session.flush()
+        stats = bulk.insert(self._session.connection(), table, rows, chunk_size, method)
+
+        if self._cache is not None:
+            self._cache.invalidate((cache.table_name(bulk.as_table(table)),))
+
+        if self._recorder and stats.method == bulk.COPY:
+            self._recorder.record.statements += stats.chunks
+            self._recorder.record.rows += stats.rows
+
+        return stats
+
+    def stream(
+        self, query, chunk_size: int = 1000, output: str = streaming.ROWS
+    ) -> streaming.Stream:
+        if output not in streaming.OUTPUTS:
+            raise ValueError(f"unsupported stream output: {output!r}")
+
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+
+        if output == streaming.NUMPY:
+            streaming.require_numpy()
+
+        if self.session is None:
+            raise errors.ClavisError("transaction is not entered")
+
+        result = self._session.execute(
+            query,
+            execution_options={
+                "stream_results": True,
+                "max_row_buffer": chunk_size,
+                "yield_per": chunk_size,
+            },
+        )
+        stream = streaming.Stream(result, chunk_size, output)
+        self._streams.add(stream)
+
+        return stream
+
     def __enter__(self):
         self.__verify_reentrance()
-        self.__connect_and_begin()
+        self.__admit()
+
+        if self._sinks:
+            self._recorder = instrumentation.Recorder(self._sinks)
+
+        try:
+            with self.__measure("connect"):
+                self.__init_engine()
+
+                if not self._lazy:
+                    self.__connect_and_begin()
+        except Exception as exc:
+            self.__release_replica(exc)
+            self.__release_admission()
+            self._recorder = None
+            raise
+
+        if self._recorder:
+            self._recorder.record.database = repr(self._engine.url)
+            self._recorder.body_started()
+
+        self._entered = True
+        self._token = propagation.activate(self)
 
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if not exc_type:
-            self.__commit()
-            finalized = None
+        outcome = instrumentation.ERROR
+        postponed_mode = self.__postponed_mode
+        self._entered = False
 
-        elif exc_type is states.Committed:
-            self.__commit()
-            finalized = True
+        propagation.deactivate(self._token)
+        self._token = None
 
-        elif exc_type is states.RolledBack:
-            self.__rollback()
-            finalized = True
+        if self._recorder:
+            self._recorder.body_finished()
 
-        else:
-            self.__rollback()
-            finalized = False
+        unexpected_rollback = False
+
+        try:
+            try:
+                self.__close_streams()
+
+                if exc_type in (None, states.Committed) and self._rollback_only:
+                    self.__rollback()
+                    unexpected_rollback = True
+                    outcome = instrumentation.ROLLED_BACK
+
+                elif not exc_type:
+                    self.__commit()
+                    finalized = None
+                    outcome = instrumentation.COMMITTED
+
+                elif exc_type is states.Committed:
+                    self.__commit()
+                    finalized = True
+                    outcome = instrumentation.COMMITTED
 
-        self.__cleanup()
+                elif exc_type is states.RolledBack:
+                    self.__rollback()
+                    finalized = True
+                    outcome = instrumentation.ROLLED_BACK
 
-        self.__execute_postponed()
+                else:
+                    self.__rollback()
+                    finalized = False
+
+                if postponed_mode == postponed.SAME_CONNECTION:
+                    self.__execute_postponed(self._conn)
+
+                elif postponed_mode == postponed.OUTBOX and (
+                    outcome != instrumentation.COMMITTED or not self.__writable
+                ):
+                    self.__enqueue_postponed_separately()
+
+            finally:
+                self.__cleanup(exc_val)
+
+            if postponed_mode == postponed.SEPARATE_CONNECTION:
+                self.__execute_postponed_separately()
+
+            elif postponed_mode == postponed.BACKGROUND:
+                self.__submit_postponed()
+
+        except Exception:
+            outcome = instrumentation.ERROR
+            raise
+
+        finally:
+            self._outcome = outcome
+            self.__release_admission()
+
+            if self._recorder:
+                self._recorder.emit(outcome)
+                self._recorder = None
+
+        if unexpected_rollback:
+            raise errors.RollbackOnlyError(
+                "transaction was marked rollback-only and has been rolled back"
+            )
 
         return finalized
 
+    def __measure(self, phase: str) -> ty.ContextManager:
+        if self._recorder:
+            return self._recorder.measure(phase)
+
+        return contextlib.nullcontext()
+
+    @property
+    def __postponed_mode(self) -> str:
+        if self._outbox is not None:
+            return postponed.OUTBOX
+
+        if self._postponed_executor is not None:
+            return postponed.BACKGROUND
+
+        if self._read_only or self._conn is None:
+            return postponed.SEPARATE_CONNECTION
+
+        return self._postponed_connection
+
     def __verify_reentrance(self):
         if any((self._engine, self._conn, self._txn, self._session)):
             raise errors.AlreadyEnteredError()
 
+    def __admit(self):
+        if self._admission is not None:
+            self._admission.acquire(self._priority)
+            self._admitted = True
+
+    def __release_admission(self):
+        if self._admitted:
+            self._admitted = False
+            self._admission.release()
+
     def __connect_and_begin(self):
-        self.__init_engine()
+        self._conn = self.__connect()
+
+        if self._recorder:
+            sa.event.listen(
+                self._conn, "after_cursor_execute", self._recorder.on_execute
+            )
+
+        slow_query_log = conf.slow_query_log()
+        if slow_query_log:
+            slow_query_log.attach(self._conn, self)
+
+        if self._read_only:
+            self._conn = readonly.prepare(self._conn)
+
+        if self._cache_size:
+            self._cache = cache.ReadCache(self._cache_size)
+            sa.event.listen(self._conn, "after_cursor_execute", self._cache.on_execute)
+
+        if any(_l is not None for _l in self._batch_limits):
+            self._batcher = batching.Batcher(*self._batch_limits)
 
-        self._conn = self._engine.connect()
         self._txn = self._conn.begin()
-        self._session = session.Session(bind=self._conn, origin=self)
+        self._session = session.Session(
+            bind=self._conn,
+            origin=self,
+            expire=self._expire,
+            read_only=self._read_only,
+            cache=self._cache,
+            batcher=self._batcher,
+        )
+
+    def __connect(self):
+        tried = []
+
+        while self._replica is not None:
+            try:
+                conn = self._engine.connect()
+            except sa.exc.DBAPIError:
+                tried.append(self._replica)
+                self.__release_replica()
+                self._replicas.failed(tried[-1])
+                self.__route(self._replicas.acquire(exclude=tried))
+                continue
+
+            self._replicas.succeeded(self._replica)
+            return conn
+
+        return self._engine.connect()
 
     def __init_engine(self):
         if self._external_engine:
-            self._engine = self._external_engine
+            self._primary = self._external_engine
         else:
             self.__verify_db()
 
-            url = self._database_url
-
-            self._engine = sa.create_engine(
-                url, encoding="utf-8", poolclass=NullPool, echo=self._echo
+            self._primary = engines.get_engine(
+                self._database_url, self._echo, self._pool
             )
 
+        replica = None
+        if self._read_only and self._replicas is not None:
+            replica = self._replicas.acquire()
+
+        self.__route(replica)
+
+    def __route(self, replica: ty.Optional[_replicas.Replica]):
+        self._replica = replica
+        self._engine = replica.engine if replica is not None else self._primary
+
+    def __release_replica(self, error: ty.Optional[BaseException] = None):
+        if self._replica is not None:
+            self._replicas.release(self._replica, error)
+            self._replica = None
+
     def __verify_db(self):
         if not self._database_url:
             raise errors.BadDatabaseError("database is not configured")
 
     def __commit(self):
-        self._session.flush()
-        self._txn.commit()
+        if self._conn is None:
+            return
+
+        if self._read_only:
+            if self._session.has_changes:
+                raise errors.ReadOnlyError("changes in read-only transaction")
+
+            self.__rollback()
+            return
+
+        with self.__measure("flush"):
+            self._session.flush()
+
+        if self._outbox is not None:
+            self.__enqueue_postponed(self._conn)
+
+        with self.__measure("finish"):
+            self._txn.commit()
 
     def __rollback(self):
-        self._session.rollback(internal=True)
-        self._txn.rollback()
+        if self._conn is None:
+            return
+
+        with self.__measure("finish"):
+            self._session.rollback(internal=True)
+            self._txn.rollback()
+
+    def __close_streams(self):
+        streams = list(self._streams)
+        self._streams.clear()
+
+        for stream in streams:
+            stream.close()
+
+    def __cleanup(self, error: ty.Optional[BaseException] = None):
+        if self._conn is not None:
+            try:
+                if self._read_only:
+                    readonly.release(self._conn)
+            finally:
+                self._conn.close()
 
-    def __cleanup(self):
-        self._conn.close()
+        self.__release_replica(error)
+
+        if self._cache is not None:
+            self._cache.discard()
 
         self._conn = None
         self._txn = None
         self._session = None
 
-    def __execute_postponed(self):
+    def __postponed_queries(self) -> ty.List[Executable]:
+        queries = list(self._postponed.values())
+
+        if self._postponed_coalesce:
+            coalesced = postponed.coalesce(queries, self._primary.dialect)
+            self._postponed_coalesced = len(queries) - len(coalesced)
+            queries = coalesced
+
+        return queries
+
+    def __execute_postponed(self, conn):
+        if not self._postponed:
+            return
+
+        with self.__measure("postponed"):
+            self.__run_postponed(conn)
+
+    @property
+    def __writable(self) -> bool:
+        return self._conn is not None and not self._read_only
+
+    def __enqueue_postponed(self, conn):
+        if not self._postponed:
+            return
+
+        with self.__measure("postponed"):
+            self._postponed_stats = self._outbox.enqueue(
+                conn, self.__postponed_queries()
+            )
+
+    def __enqueue_postponed_separately(self):
+        """
+        Stores the postponed queries in the outbox in a transaction
+        of their own: on the transaction's connection after a rollback,
+        on a primary one if it has no connection or is read-only.
+        """
+        if not self._postponed:
+            return
+
+        if self.__writable:
+            with self._conn.begin():
+                self.__enqueue_postponed(self._conn)
+            return
+
+        with self._primary.connect() as conn:
+            with conn.begin():
+                self.__enqueue_postponed(conn)
+
+    def __execute_postponed_separately(self):
+        if not self._postponed:
+            return
+
+        with self.__measure("postponed"):
+            with self._primary.connect() as conn:
+                self.__run_postponed(conn)
+
+    def __run_postponed(self, conn):
+        with conn.begin():
+            self._postponed_stats = postponed.execute(
+                conn, self.__postponed_queries(), conn.dialect
+            )
+
+    def __submit_postponed(self):
         if not self._postponed:
             return
 
-        with Transaction(self._database_url, self._echo) as txn:
-            for q in self._postponed.values():
-                txn.session.execute(q)
+        with self.__measure("postponed"):
+            self._postponed_future = self._postponed_executor.submit(
+                self._primary, self.__postponed_queries()
+            )
+
+
+class NestedTransaction(postponed.Postponing):
+    def __init__(
+        self,
+        parent: ty.Union[Transaction, "NestedTransaction", "JoinedTransaction"],
+    ):
+        self._parent = parent
+        self._savepoint = None
+        self._postponed = OrderedDict()
+        self._token = None
+        self._rollback_only = False
+
+    @property
+    def parent(self) -> ty.Union[Transaction, "NestedTransaction", "JoinedTransaction"]:
+        return self._parent
+
+    @property
+    def rollback_only(self) -> bool:
+        return self._rollback_only
+
+    def mark_rollback_only(self):
+        self._rollback_only = True
+
+    @property
+    def engine(self) -> Engine:
+        return self._parent.engine
+
+    @property
+    def session(self) -> Session:
+        return self._parent.session
+
+    def commit(self) -> ty.NoReturn:
+        if self._savepoint is not None:
+            self.session.flush()
+
+        raise states.Committed(self)
+
+    def rollback(self) -> ty.NoReturn:
+        raise states.RolledBack(self)
+
+    def nested(self) -> "NestedTransaction":
+        return NestedTransaction(self)
+
+    def bulk_insert(
+        self,
+        table,
+        rows: ty.Iterable[bulk.Row],
+        chunk_size: int = 1000,
+        method: ty.Optional[str] = None,
+    ) -> bulk.BulkStats:
+        return self._parent.bulk_insert(table, rows, chunk_size, method)
+
+    def stream(
+        self, query, chunk_size: int = 1000, output: str = streaming.ROWS
+    ) -> streaming.Stream:
+        return self._parent.stream(query, chunk_size, output)
+
+    def __enter__(self):
+        if self._savepoint is not None:
+            raise errors.AlreadyEnteredError()
+
+        if self.session is None:
+            raise errors.ClavisError("parent transaction is not entered")
+
+        self._savepoint = self.session.enter_scope(self)
+        self._token = propagation.activate(self)
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        own = isinstance(exc_val, states.StepState) and exc_val.origin is self
+
+        propagation.deactivate(self._token)
+        self._token = None
+
+        try:
+            self.session.exit_scope(self)
+
+            if self._rollback_only:
+                self.__rollback()
+            elif not exc_type or exc_type is states.Committed:
+                self.__release()
+            else:
+                self.__rollback()
+
+        finally:
+            self._savepoint = None
+
+        if self._rollback_only and (
+            not exc_type or (own and exc_type is states.Committed)
+        ):
+            raise errors.RollbackOnlyError(
+                "savepoint was marked rollback-only and has been rolled back"
+            )
+
+        if not exc_type:
+            return None
+
+        return own
+
+    def __release(self):
+        try:
+            self._savepoint.commit()
+        except Exception:
+            self.__rollback()
+            raise
+
+        self._parent._postponed.update(self._postponed)
+        self._postponed.clear()
+
+    def __rollback(self):
+        if self._savepoint.is_active:
+            self._savepoint.rollback()
+
+        self._postponed.clear()
+
+
+class JoinedTransaction(postponed.Postponing):
+    """
+    Runs in the transaction or scope which is current when it is entered:
+    no connection, COMMIT or SAVEPOINT of its own. `rollback()` and
+    unhandled exceptions mark the outer one to be rolled back.
+    """
+
+    def __init__(
+        self, outer: ty.Union[Transaction, NestedTransaction, "JoinedTransaction"]
+    ):
+        self._outer = outer
+        self._postponed = outer._postponed
+        self._token = None
+
+    @property
+    def outer(self) -> ty.Union[Transaction, NestedTransaction, "JoinedTransaction"]:
+        return self._outer
+
+    @property
+    def engine(self) -> Engine:
+        return self._outer.engine
+
+    @property
+    def session(self) -> Session:
+        return self._outer.session
+
+    @property
+    def rollback_only(self) -> bool:
+        return self._outer.rollback_only
+
+    def mark_rollback_only(self):
+        self._outer.mark_rollback_only()
+
+    def commit(self) -> ty.NoReturn:
+        raise states.Committed(self)
+
+    def rollback(self) -> ty.NoReturn:
+        raise states.RolledBack(self)
+
+    def nested(self) -> NestedTransaction:
+        return NestedTransaction(self)
+
+    def bulk_insert(
+        self,
+        table,
+        rows: ty.Iterable[bulk.Row],
+        chunk_size: int = 1000,
+        method: ty.Optional[str] = None,
+    ) -> bulk.BulkStats:
+        return self._outer.bulk_insert(table, rows, chunk_size, method)
+
+    def stream(
+        self, query, chunk_size: int = 1000, output: str = streaming.ROWS
+    ) -> streaming.Stream:
+        return self._outer.stream(query, chunk_size, output)
+
+    def __enter__(self):
+        if self._token is not None:
+            raise errors.AlreadyEnteredError()
+
+        if self.session is None:
+            raise errors.ClavisError("outer transaction is not entered")
+
+        # session states raised in the block belong to this one
+        self.session.enter_scope(self, savepoint=False)
+        self._token = propagation.activate(self)
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        propagation.deactivate(self._token)
+        self._token = None
+        self.session.exit_scope(self)
+
+        if not exc_type:
+            return None
+
+        if isinstance(exc_val, states.StepState):
+            if exc_val.origin is not self:
+                return None
+
+            if exc_type is states.RolledBack:
+                self.mark_rollback_only()
+            elif self.session is not None:
+                self.session.flush()
+
+            return True
+
+        self.mark_rollback_only()
+
+        return None
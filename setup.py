@@ -23,7 +23,6 @@ setup(
         "License :: OSI Approved :: Apache Software License",
         "Operating System :: MacOS :: MacOS X",
         "Operating System :: POSIX :: Linux",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "Topic :: Database",
         "Topic :: Software Development :: Libraries :: Python Modules",
@@ -31,7 +30,13 @@ setup(
     keywords=" ".join(
         sorted({"contextlib", "db", "postgresql" "sqlalchemy", "sqlalchemy-core"})
     ),
-    packages=find_packages(exclude=("build", "contrib", "dist", "docs", "tests")),
-    install_requires=("SQLAlchemy>=1.1", "dynaconf>1"),
-    python_requires=">=3.6",
+    packages=find_packages(
+        exclude=("benchmarks", "build", "contrib", "dist", "docs", "tests")
+    ),
+    install_requires=("SQLAlchemy>=1.4.33", "dynaconf>1"),
+    extras_require={
+        "asyncio": ("SQLAlchemy[asyncio]>=1.4.33",),
+        "numpy": ("numpy",),
+    },
+    python_requires=">=3.7",
 )
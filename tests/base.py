@@ -58,7 +58,11 @@ class ClavisTestBase(TestCase):
         self._databases = {}
 
     def cleanup(self):
+        import clavis
+
+        clavis.dispose_all()
         for db in self._databases.values():
+            db.engine.dispose()
             os.remove(db.path)
         self.init()
 
@@ -0,0 +1,216 @@
+import asyncio
+import threading
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import admission
+from clavis import errors
+from clavis import instrumentation
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text, unique=True)
+
+
+class AdmissionTest(ClavisTestBase):
+    def test_concurrency_is_limited(self):
+        self.policy = admission.AdmissionPolicy(max_concurrent=2, max_queue=20)
+        self.dbf.admission = self.policy
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def work(value):
+            with self.dbf.transaction() as t:
+                with lock:
+                    running.append(value)
+                    peak.append(len(running))
+                time.sleep(0.01)
+                t.session.execute(self.query(value))
+                with lock:
+                    running.remove(value)
+
+        self.run_threads(work, [str(_i) for _i in range(10)])
+
+        self.assertEqual(10, len(self.values()))
+        self.assertEqual(2, max(peak))
+        self.assertEqual(0, self.policy.active)
+        self.assertEqual(10, self.policy.stats.admitted)
+
+    def test_full_queue_is_rejected(self):
+        self.policy.acquire()
+
+        with self.assertRaises(errors.AdmissionRejectedError):
+            with self.dbf.transaction() as t:
+                t.session.execute(self.query("x"))
+
+        self.policy.release()
+
+        self.assertEqual([], self.values())
+        self.assertEqual(1, self.policy.stats.rejected)
+        self.assertEqual(0, self.policy.active)
+
+    def test_timeout(self):
+        self.policy = admission.AdmissionPolicy(1, max_queue=1, timeout=0.05)
+        self.dbf.admission = self.policy
+        self.policy.acquire()
+
+        with self.assertRaises(errors.AdmissionTimeoutError):
+            with self.dbf.transaction():
+                pass
+
+        self.assertEqual(0, self.policy.queue_depth)
+        self.assertEqual(1, self.policy.stats.timed_out)
+
+        self.policy.release()
+        with self.dbf.transaction() as t:
+            t.session.execute(self.query("x"))
+
+        self.assertEqual(["x"], self.values())
+
+    def test_priorities(self):
+        self.policy = admission.AdmissionPolicy(1, max_queue=2)
+        self.dbf.admission = self.policy
+        self.policy.acquire()
+        order = []
+
+        def work(priority):
+            with self.dbf.transaction(priority=priority) as t:
+                t.session.execute(self.query(priority))
+                order.append(priority)
+
+        threads = []
+        for priority in (admission.BATCH, admission.INTERACTIVE):
+            threads.append(threading.Thread(target=work, args=(priority,)))
+            threads[-1].start()
+            self.wait_for(lambda: self.policy.queue_depth == len(threads))
+
+        self.policy.release()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([admission.INTERACTIVE, admission.BATCH], order)
+        self.assertEqual(2, self.policy.stats.max_queue_depth)
+
+    def test_released_when_enter_fails(self):
+        txn = clavis.Transaction(database_url="", admission=self.policy)
+
+        with self.assertRaises(errors.BadDatabaseError):
+            with txn:
+                pass
+
+        self.assertEqual(0, self.policy.active)
+
+    def test_threads_and_asyncio_share_policy(self):
+        registry = instrumentation.MetricsRegistry()
+        self.policy = admission.AdmissionPolicy(1, max_queue=1, registry=registry)
+        adbf = clavis.AsyncTransactionFactory(
+            database_url=self.db.url.replace("sqlite://", "sqlite+aiosqlite://", 1),
+            admission=self.policy,
+        )
+        self.policy.acquire()
+
+        async def run():
+            async with adbf.transaction() as t:
+                self.assertEqual(1, self.policy.active)
+                await t.session.execute(self.query("async"))
+
+        timer = threading.Timer(0.05, self.policy.release)
+        timer.start()
+        try:
+            asyncio.run(run())
+            asyncio.run(clavis.dispose_all_async())
+        finally:
+            timer.join()
+
+        self.assertEqual(["async"], self.values())
+        self.assertEqual(0, self.policy.active)
+        self.assertEqual(1, self.policy.stats.queued)
+
+        rendered = registry.render()
+        self.assertIn("# TYPE clavis_admission_active gauge", rendered)
+        self.assertIn("clavis_admission_queue_depth 0", rendered)
+        self.assertIn("clavis_admission_wait_seconds_count", rendered)
+
+    def test_released_when_async_commit_fails(self):
+        adbf = clavis.AsyncTransactionFactory(
+            database_url=self.db.url.replace("sqlite://", "sqlite+aiosqlite://", 1),
+            admission=self.policy,
+        )
+
+        async def run():
+            with self.assertRaises(sa.exc.IntegrityError):
+                async with adbf.transaction() as t:
+                    t.session.add_all([TestTable(value="x"), TestTable(value="x")])
+
+            self.assertEqual(0, self.policy.active)
+
+            async with adbf.transaction() as t:
+                await t.session.execute(self.query("y"))
+
+        asyncio.run(run())
+        asyncio.run(clavis.dispose_all_async())
+
+        self.assertEqual(["y"], self.values())
+        self.assertEqual(0, self.policy.active)
+
+    def test_async_timeout(self):
+        policy = admission.AdmissionPolicy(1, max_queue=1, timeout=0.01)
+        policy.acquire()
+
+        async def run():
+            await policy.acquire_async(admission.BATCH)
+
+        with self.assertRaises(errors.AdmissionTimeoutError):
+            asyncio.run(run())
+
+        self.assertEqual(0, policy.queue_depth)
+        policy.release()
+        self.assertEqual(0, policy.active)
+
+    def test_unknown_priority(self):
+        with self.assertRaises(ValueError):
+            self.policy.acquire("urgent")
+
+    def setUp(self):
+        super().setUp()
+        self.db = self.setup_db("test", Base.metadata)
+        self.policy = admission.AdmissionPolicy(max_concurrent=1)
+        self.dbf = clavis.TransactionFactory(self.db.url, admission=self.policy)
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def run_threads(target, values):
+        threads = [threading.Thread(target=target, args=(_v,)) for _v in values]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    @staticmethod
+    def wait_for(predicate, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                raise AssertionError("timed out")
+            time.sleep(0.001)
+
+    @staticmethod
+    def query(value):
+        return sa.insert(TestTable).values({TestTable.value: value})
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute("test", query)]
@@ -0,0 +1,193 @@
+import asyncio
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import errors
+from clavis import propagation
+from clavis import states
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class AsyncTransactionTest(ClavisTestBase):
+    def test_commit_on_context_exit(self):
+        async def run():
+            async with self.dbf.transaction() as t:
+                await t.session.execute(
+                    sa.insert(TestTable).values({TestTable.value: "x"})
+                )
+
+        self.run_async(run())
+        self.assertEqual(["x"], self.values())
+
+    def test_explicit_commit(self):
+        async def run():
+            async with self.dbf.transaction() as t:
+                await t.session.execute(
+                    sa.insert(TestTable).values({TestTable.value: "x"})
+                )
+                await t.commit()
+                raise AssertionError("never happens")
+
+        self.run_async(run())
+        self.assertEqual(["x"], self.values())
+
+    def test_explicit_rollback(self):
+        async def run():
+            async with self.dbf.transaction() as t:
+                await t.session.execute(
+                    sa.insert(TestTable).values({TestTable.value: "x"})
+                )
+                await t.session.rollback()
+                raise AssertionError("never happens")
+
+        self.run_async(run())
+        self.assertEqual([], self.values())
+
+    def test_states_origin(self):
+        async def run():
+            async with self.dbf.transaction() as t:
+                try:
+                    await t.session.commit()
+                except states.Committed as exc:
+                    self.assertIs(t, exc.origin)
+                    raise
+
+        self.run_async(run())
+
+    def test_exception(self):
+        async def run():
+            async with self.dbf.transaction() as t:
+                await t.session.execute(
+                    sa.insert(TestTable).values({TestTable.value: "x"})
+                )
+                t.postpone(sa.insert(TestTable).values({TestTable.value: "y"}))
+                raise ZeroDivisionError
+
+        with self.assertRaises(ZeroDivisionError):
+            self.run_async(run())
+
+        self.assertEqual(["y"], self.values())
+
+    def test_postponed(self):
+        async def run():
+            async with self.dbf.transaction() as t:
+                await t.session.execute(
+                    sa.insert(TestTable).values({TestTable.value: "x"})
+                )
+                t.postpone(
+                    sa.insert(TestTable).values({TestTable.value: "y"}),
+                    sa.insert(TestTable).values({TestTable.value: "z"}),
+                )
+            return t
+
+        t = self.run_async(run())
+        self.assertEqual(["x", "y", "z"], self.values())
+        self.assertEqual(1, t.postponed_stats.saved)
+
+    def test_concurrent(self):
+        async def one(i):
+            async with self.dbf.transaction() as t:
+                await t.session.execute(
+                    sa.insert(TestTable).values({TestTable.value: str(i)})
+                )
+
+        async def run():
+            await asyncio.gather(*(one(i) for i in range(50)))
+
+        self.run_async(run())
+        self.assertEqual(50, len(self.values()))
+
+    def test_current(self):
+        async def task():
+            async with self.dbf.transaction() as t:
+                self.assertIs(t, clavis.AsyncTransaction.current())
+                await asyncio.sleep(0)
+                self.assertIs(t, clavis.AsyncTransaction.current())
+                self.assertIsNone(clavis.Transaction.current())
+
+        async def run():
+            await asyncio.gather(task(), task())
+            self.assertIsNone(clavis.AsyncTransaction.current())
+
+        self.run_async(run())
+
+    def test_required(self):
+        async def save(value):
+            async with self.dbf.transaction(propagation=propagation.REQUIRED) as t:
+                await t.session.execute(self.insert(value))
+                t.postpone(self.insert(value + " postponed"))
+                return t
+
+        async def run():
+            async with self.dbf.transaction() as t:
+                inner = await save("inner")
+                self.assertIsInstance(inner, clavis.aio.AsyncJoinedTransaction)
+                self.assertIs(t, inner.outer)
+
+            with self.assertRaises(errors.RollbackOnlyError):
+                async with self.dbf.transaction() as t:
+                    await t.session.execute(self.insert("rolled back"))
+                    async with self.dbf.transaction(
+                        propagation=propagation.REQUIRED
+                    ) as inner:
+                        await inner.session.rollback()
+
+                    self.assertTrue(t.rollback_only)
+
+            async with self.dbf.transaction() as t:
+                async with self.dbf.transaction(
+                    propagation=propagation.REQUIRED
+                ) as inner:
+                    await t.session.execute(self.insert("committed"))
+                    await inner.session.commit()
+
+                await t.session.execute(self.insert("after commit"))
+
+        self.run_async(run())
+        self.assertEqual(
+            ["inner", "inner postponed", "committed", "after commit"], self.values()
+        )
+
+    def test_unsupported_propagation(self):
+        with self.assertRaises(ValueError):
+            self.dbf.transaction(propagation=propagation.NESTED)
+
+        with self.assertRaises(ValueError):
+            clavis.AsyncTransactionFactory(propagation=propagation.NESTED)
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.engine = db.engine
+        self.dbf = clavis.AsyncTransactionFactory(
+            database_url=db.url.replace("sqlite://", "sqlite+aiosqlite://", 1),
+            pool_size=5,
+        )
+
+    def tearDown(self):
+        self.run_async(clavis.dispose_all_async())
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def run_async(coro):
+        return asyncio.run(coro)
+
+    @staticmethod
+    def insert(value):
+        return sa.insert(TestTable).values({TestTable.value: value})
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute("test", query)]
@@ -0,0 +1,114 @@
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import batching
+from clavis import session
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class OtherTable(Base):
+    __tablename__ = "other_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+
+
+class BatchModeTest(ClavisTestBase):
+    def test_objects(self):
+        with self.dbf.transaction(batch_objects=100) as t:
+            for i in range(1050):
+                t.session.add(TestTable(value=str(i)))
+                self.assertLessEqual(len(t.session.identity_map), 100)
+
+        self.assertEqual(1050, self.count())
+        self.assertEqual(
+            {"objects": 1050, "flushes": 10, "peak_identity_map": 100},
+            t.batch_stats.as_dict(),
+        )
+
+    def test_bytes(self):
+        with self.dbf.transaction(batch_bytes=50_000) as t:
+            t.session.add_all(TestTable(value="x" * 10_000) for _ in range(20))
+
+        self.assertEqual(20, self.count())
+        self.assertEqual(4, t.batch_stats.flushes)
+        self.assertEqual(5, t.batch_stats.peak_identity_map)
+
+    def test_rollback(self):
+        with self.assertRaises(ZeroDivisionError):
+            with self.dbf.transaction(batch_objects=10) as t:
+                for i in range(25):
+                    t.session.add(TestTable(value=str(i)))
+                raise ZeroDivisionError
+
+        self.assertEqual(2, t.batch_stats.flushes)
+        self.assertEqual(0, self.count())
+
+        with self.dbf.transaction(batch_objects=10) as t:
+            t.session.add_all([TestTable(value=str(_i)) for _i in range(25)])
+            t.rollback()
+
+        self.assertEqual(0, self.count())
+
+    def test_queried_objects_are_expunged(self):
+        with self.dbf.transaction() as t:
+            t.session.add_all([TestTable(value=str(_i)) for _i in range(10)])
+
+        dbf = clavis.TransactionFactory(self.db.url, expire=session.EXPIRE_NONE)
+        with dbf.transaction(batch_objects=5) as t:
+            for obj in t.session.execute(sa.select(TestTable)).scalars().all():
+                t.session.add(TestTable(value=obj.value + "!"))
+
+            self.assertEqual(0, len(t.session.identity_map))
+
+        self.assertEqual(20, self.count())
+        self.assertEqual(2, t.batch_stats.flushes)
+        self.assertEqual(15, t.batch_stats.peak_identity_map)
+
+    def test_read_cache_is_cleared(self):
+        with self.dbf.transaction() as t:
+            t.session.add(TestTable(value="x"))
+
+        with self.dbf.transaction(cache_size=10, batch_objects=2) as t:
+            query = sa.select(TestTable)
+            self.assertEqual(["x"], [_o.value for _o in t.session.scalars(query)])
+
+            t.session.add_all([OtherTable(), OtherTable()])
+
+            self.assertEqual(["x"], [_o.value for _o in t.session.scalars(query)])
+
+        self.assertEqual(0, t.cache_stats.hits)
+
+    def test_disabled_by_default(self):
+        with self.dbf.transaction() as t:
+            t.session.add(TestTable(value="x"))
+
+        self.assertIsNone(t.batch_stats)
+
+    def test_limits(self):
+        with self.assertRaises(ValueError):
+            batching.Batcher()
+
+        with self.assertRaises(ValueError):
+            batching.Batcher(max_objects=0)
+
+    def setUp(self):
+        super().setUp()
+        self.db = self.setup_db("test", Base.metadata)
+        self.dbf = clavis.TransactionFactory(self.db.url)
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    def count(self):
+        return self.execute("test", sa.select([sa.func.count(TestTable.id)]))[0][0]
@@ -0,0 +1,47 @@
+from unittest import TestCase
+
+from benchmarks import imports
+from benchmarks import transactions
+
+
+class BenchmarksTest(TestCase):
+    def test_transactions(self):
+        data = transactions.run(iterations=2, repeat=1, postponed=(3,))
+
+        names = [_r["name"] for _r in data["results"]]
+        self.assertEqual(
+            [
+                "empty",
+                "single_insert",
+                "explicit_commit",
+                "in_place",
+                "postponed_3",
+                "orm_expire_all",
+                "orm_expire_none",
+                "orm_expire_dirty-only",
+                "orm_expire_explicit",
+            ],
+            names,
+        )
+
+        for result in data["results"]:
+            self.assertGreater(result["clavis_per_second"], 0)
+            self.assertGreater(result["baseline_per_second"], 0)
+            self.assertGreater(result["overhead_ratio"], 0)
+
+        self.assertIn("sqlalchemy", data["meta"])
+
+    def test_only(self):
+        data = transactions.run(iterations=1, repeat=1, only=["empty"])
+        self.assertEqual(["empty"], [_r["name"] for _r in data["results"]])
+
+    def test_imports(self):
+        data = imports.run(repeat=1)
+
+        names = [_r["name"] for _r in data["results"]]
+        self.assertEqual(["import", "transaction", "configure"], names)
+
+        heavy = {_r["name"]: _r["heavy_modules"] for _r in data["results"]}
+        self.assertEqual([], heavy["import"])
+        self.assertEqual(["sqlalchemy"], heavy["transaction"])
+        self.assertEqual(["dynaconf"], heavy["configure"])
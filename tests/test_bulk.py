@@ -0,0 +1,137 @@
+import tracemalloc
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import bulk
+from clavis import errors
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class BulkInsertTest(ClavisTestBase):
+    def test_generator_in_chunks(self):
+        consumed = []
+
+        def rows():
+            for i in range(25):
+                consumed.append(i)
+                yield {"value": str(i)}
+
+        with self.dbf.transaction() as t:
+            stats = t.bulk_insert(TestTable, rows(), chunk_size=10)
+
+            self.assertEqual((25, 3, bulk.EXECUTEMANY), stats[:2] + stats[3:])
+            self.assertGreater(stats.rows_per_second, 0)
+
+        self.assertEqual([str(_i) for _i in range(25)], self.values())
+
+    def test_values(self):
+        with self.dbf.transaction() as t:
+            stats = t.bulk_insert(
+                TestTable.__table__,
+                ({"value": str(_i)} for _i in range(5)),
+                chunk_size=2,
+                method=bulk.VALUES,
+            )
+
+        self.assertEqual((5, 3), (stats.rows, stats.chunks))
+        self.assertEqual(["0", "1", "2", "3", "4"], self.values())
+
+    def test_rollback_semantics(self):
+        with self.dbf.transaction() as t:
+            t.bulk_insert(TestTable, [{"value": "x"}])
+            t.rollback()
+
+        def broken():
+            yield {"value": "y"}
+            raise ZeroDivisionError
+
+        with self.assertRaises(ZeroDivisionError):
+            with self.dbf.transaction() as t:
+                t.bulk_insert(TestTable, broken(), chunk_size=1)
+
+        self.assertEqual([], self.values())
+
+        with self.dbf.transaction() as t:
+            t.bulk_insert(TestTable, [{"value": "z"}])
+            t.commit()
+
+        self.assertEqual(["z"], self.values())
+
+    def test_nested(self):
+        with self.dbf.transaction() as t:
+            t.bulk_insert(TestTable, [{"value": "outer"}])
+
+            with t.nested() as n:
+                n.bulk_insert(TestTable, [{"value": "inner"}])
+                n.rollback()
+
+        self.assertEqual(["outer"], self.values())
+
+    def test_orm_objects_are_flushed_first(self):
+        with self.dbf.transaction() as t:
+            t.session.add(TestTable(value="orm"))
+            t.bulk_insert(TestTable, [{"value": "bulk"}])
+
+        self.assertEqual(["orm", "bulk"], self.values())
+
+    def test_flat_memory(self):
+        def rows(n):
+            return ({"value": "x" * 100} for _ in range(n))
+
+        def peak(n):
+            tracemalloc.start()
+            try:
+                with self.dbf.transaction() as t:
+                    t.bulk_insert(TestTable, rows(n), chunk_size=500)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        small = peak(2_000)
+        large = peak(20_000)
+
+        self.assertLess(large, small * 2)
+
+    def test_errors(self):
+        with self.assertRaises(errors.ReadOnlyError):
+            with self.dbf.transaction(read_only=True) as t:
+                t.bulk_insert(TestTable, [{"value": "x"}])
+
+        with self.assertRaises(ValueError):
+            with self.dbf.transaction() as t:
+                t.bulk_insert(TestTable, [{"value": "x"}], method=bulk.COPY)
+
+        with self.assertRaises(errors.ClavisError):
+            self.dbf.transaction().bulk_insert(TestTable, [])
+
+        self.assertEqual([], self.values())
+
+    def test_copy_text(self):
+        self.assertEqual("\\N", bulk._copy_text(None))
+        self.assertEqual("a\\tb\\nc\\\\", bulk._copy_text("a\tb\nc\\"))
+        self.assertEqual("t", bulk._copy_text(True))
+        self.assertEqual("\\\\x0102", bulk._copy_text(b"\x01\x02"))
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.dbf = clavis.TransactionFactory(db.url)
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute("test", query)]
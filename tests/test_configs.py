@@ -44,6 +44,21 @@ class ConfigTest(ClavisTestBase):
                 item = rows[0]
                 self.assertEqual(item.value, name, f'config failed for "{name}"')
 
+    def test_config_snapshot(self):
+        import clavis
+        from clavis import conf
+
+        config = conf.config()
+        self.assertIs(config, conf.config())
+        self.assertEqual(self.db_urls["env"], config.database_url)
+
+        with self.assertRaises(AttributeError):
+            config.database_url = self.db_urls["tf"]
+
+        clavis.configure(self.db_urls["conf"])
+        self.assertIsNot(config, conf.config())
+        self.assertEqual(self.db_urls["conf"], conf.config().database_url)
+
     def setUp(self):
         super().setUp()
 
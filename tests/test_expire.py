@@ -0,0 +1,79 @@
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import session
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class ExpireTest(ClavisTestBase):
+    def run_case(self, expire, mark=False):
+        tf = clavis.TransactionFactory(self.db_url, expire=expire)
+
+        with tf.transaction() as t:
+            self.assertEqual(expire, t.session.expire_policy)
+
+            objects = t.session.query(TestTable).order_by(TestTable.id).all()
+            touched, untouched = objects[0], objects[1]
+
+            touched.value = "changed"
+            if mark:
+                t.session.mark_expired(untouched)
+            t.session.flush()
+
+            return sa.inspect(touched).expired, sa.inspect(untouched).expired
+
+    def test_all(self):
+        self.assertEqual((True, True), self.run_case(session.EXPIRE_ALL))
+
+    def test_none(self):
+        self.assertEqual((False, False), self.run_case(session.EXPIRE_NONE))
+        self.assertEqual((False, False), self.run_case(session.EXPIRE_NONE, True))
+
+    def test_dirty_only(self):
+        self.assertEqual((True, False), self.run_case(session.EXPIRE_DIRTY_ONLY))
+
+    def test_explicit(self):
+        self.assertEqual((False, False), self.run_case(session.EXPIRE_EXPLICIT))
+        self.assertEqual((False, True), self.run_case(session.EXPIRE_EXPLICIT, True))
+
+    def test_default(self):
+        with clavis.Transaction(self.db_url) as t:
+            self.assertEqual(session.EXPIRE_ALL, t.session.expire_policy)
+
+    def test_new_objects(self):
+        tf = clavis.TransactionFactory(self.db_url, expire=session.EXPIRE_DIRTY_ONLY)
+
+        with tf.transaction() as t:
+            old = t.session.query(TestTable).first()
+            new = TestTable(value="new")
+            t.session.add(new)
+            t.session.flush()
+
+            self.assertTrue(sa.inspect(new).expired)
+            self.assertFalse(sa.inspect(old).expired)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            clavis.Transaction(self.db_url, expire="xxx")
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.db_url = db.url
+
+        with clavis.Transaction(self.db_url) as t:
+            t.session.add_all([TestTable(value="1"), TestTable(value="2")])
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
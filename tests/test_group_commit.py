@@ -0,0 +1,193 @@
+import threading
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import errors
+from clavis import group
+from clavis import postponed
+from clavis import propagation
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text, unique=True)
+
+
+class GroupCommitTest(ClavisTestBase):
+    def test_concurrent_transactions(self):
+        self.run_concurrently([str(_i) for _i in range(50)])
+
+        self.assertEqual(sorted(str(_i) for _i in range(50)), sorted(self.values()))
+
+        stats = self.committer.stats.as_dict()
+        self.assertEqual(50, stats["transactions"])
+        self.assertLess(stats["commits"], 50)
+        self.assertEqual(0, stats["failed"])
+
+    def test_failures_are_split(self):
+        self.committer = group.GroupCommitter(max_batch=3, max_wait=1)
+        self.dbf.group_commit = self.committer
+
+        errors = self.run_concurrently(["a", "b", "a"])
+
+        self.assertEqual(["a", "b"], sorted(self.values()))
+        self.assertEqual(1, len(errors))
+        self.assertIsInstance(errors[0], sa.exc.IntegrityError)
+        self.assertEqual(
+            {"batches": 1, "transactions": 3, "commits": 4, "splits": 1, "failed": 1},
+            self.committer.stats.as_dict(),
+        )
+
+    def test_commit_and_rollback(self):
+        with self.dbf.transaction() as t:
+            t.session.execute(self.query("committed"))
+            t.commit()
+
+        with self.dbf.transaction() as t:
+            t.execute(self.query("rolled back"))
+            t.rollback()
+
+        with self.dbf.transaction() as t:
+            t.session.execute(self.query("session committed"))
+            t.session.commit()
+
+        with self.dbf.transaction() as t:
+            t.session.execute(self.query("session rolled back"))
+            t.session.rollback()
+
+        with self.assertRaises(ZeroDivisionError):
+            with self.dbf.transaction() as t:
+                t.execute(self.query("failed"))
+                raise ZeroDivisionError
+
+        self.assertEqual(["committed", "session committed"], self.values())
+
+    def test_params(self):
+        with self.dbf.transaction() as t:
+            t.session.execute(sa.insert(TestTable), [{"value": "1"}, {"value": "2"}])
+            t.session.execute(sa.insert(TestTable), {"value": "3"})
+
+        self.assertEqual(["1", "2", "3"], self.values())
+
+        update = (
+            sa.update(TestTable)
+            .where(TestTable.value == sa.bindparam("old"))
+            .values(value=sa.bindparam("new"))
+        )
+        with self.dbf.transaction() as t:
+            t.session.execute(
+                update, [{"old": "1", "new": "a"}, {"old": "2", "new": "b"}]
+            )
+
+        self.assertEqual(["a", "b", "3"], self.values())
+
+    def test_reads_are_not_grouped(self):
+        with self.dbf.transaction() as t:
+            with self.assertRaises(ValueError):
+                t.session.execute(sa.select([TestTable.value]))
+
+        with self.dbf.transaction(read_only=True) as t:
+            self.assertIsInstance(t, clavis.Transaction)
+
+    def test_postponed(self):
+        with self.dbf.transaction() as t:
+            t.postpone(self.query("postponed"))
+            t.execute(self.query("x"))
+
+        self.assertEqual(
+            postponed.PostponedStats(statements=1, round_trips=1),
+            t.postponed_stats,
+        )
+
+        with self.dbf.transaction() as t:
+            t.postpone(self.query("after rollback"))
+            t.execute(self.query("rolled back"))
+            t.rollback()
+
+        self.assertEqual(["x", "postponed", "after rollback"], self.values())
+
+    def test_current(self):
+        with self.dbf.transaction() as t:
+            self.assertIs(t, clavis.Transaction.current())
+            self.assertIs(t, t.current())
+
+        self.assertIsNone(clavis.Transaction.current())
+
+    def test_required(self):
+        with self.dbf.transaction() as t:
+            t.execute(self.query("outer"))
+
+            with self.dbf.transaction(propagation=propagation.REQUIRED) as inner:
+                self.assertIsInstance(inner, clavis.transaction.JoinedTransaction)
+                inner.session.execute(self.query("inner"))
+                inner.postpone(self.query("postponed"))
+                inner.commit()
+
+            with self.assertRaises(errors.ClavisError):
+                self.dbf.transaction(propagation=propagation.NESTED)
+
+        self.assertEqual(["outer", "inner", "postponed"], self.values())
+
+        with self.assertRaises(errors.RollbackOnlyError):
+            with self.dbf.transaction() as t:
+                t.execute(self.query("rolled back"))
+
+                with self.dbf.transaction(propagation=propagation.REQUIRED) as inner:
+                    inner.rollback()
+
+                self.assertTrue(t.rollback_only)
+
+        self.assertEqual(["outer", "inner", "postponed"], self.values())
+
+    def test_shutdown(self):
+        self.committer.shutdown()
+
+        with self.assertRaises(RuntimeError):
+            with self.dbf.transaction() as t:
+                t.execute(self.query("x"))
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.committer = group.GroupCommitter(max_batch=20, max_wait=0.05)
+        self.dbf = clavis.TransactionFactory(db.url, group_commit=self.committer)
+
+    def tearDown(self):
+        self.committer.shutdown()
+        self.cleanup()
+        super().tearDown()
+
+    def run_concurrently(self, values):
+        errors = []
+        barrier = threading.Barrier(len(values))
+
+        def work(value):
+            barrier.wait()
+            try:
+                with self.dbf.transaction() as t:
+                    t.session.execute(self.query(value))
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=work, args=(_v,)) for _v in values]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return errors
+
+    @staticmethod
+    def query(value):
+        return sa.insert(TestTable).values({TestTable.value: value})
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute("test", query)]
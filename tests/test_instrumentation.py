@@ -0,0 +1,159 @@
+import logging
+import types
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import instrumentation
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class InstrumentationTest(ClavisTestBase):
+    def test_committed(self):
+        with self.dbf.transaction() as t:
+            t.session.execute(self.query("one"))
+            t.session.execute(self.query("two"))
+            t.postpone(self.query("three"))
+
+        self.assertEqual(1, len(self.records))
+        record = self.records[0]
+
+        self.assertEqual(instrumentation.COMMITTED, record.outcome)
+        self.assertEqual(3, record.statements)
+        self.assertEqual(3, record.rows)
+        self.assertIn("sqlite", record.database)
+
+        for phase in instrumentation.PHASES:
+            self.assertGreater(getattr(record, f"{phase}_time"), 0, phase)
+
+        self.assertGreaterEqual(
+            record.total_time,
+            sum(getattr(record, f"{_p}_time") for _p in instrumentation.PHASES),
+        )
+
+    def test_rows_of_writes_only(self):
+        recorder = instrumentation.Recorder(())
+        cursor = types.SimpleNamespace(rowcount=5)
+
+        for kind in ("isinsert", "isupdate", "isdelete", None):
+            context = types.SimpleNamespace(
+                isinsert=False, isupdate=False, isdelete=False
+            )
+            if kind:
+                setattr(context, kind, True)
+            recorder.on_execute(None, cursor, "", (), context, False)
+
+        self.assertEqual(4, recorder.record.statements)
+        self.assertEqual(15, recorder.record.rows)
+
+    def test_rolled_back(self):
+        with self.dbf.transaction() as t:
+            t.session.execute(self.query("one"))
+            t.rollback()
+
+        record = self.records[0]
+        self.assertEqual(instrumentation.ROLLED_BACK, record.outcome)
+        self.assertEqual(1, record.statements)
+        self.assertEqual(0, record.flush_time)
+        self.assertEqual(0, record.postponed_time)
+
+    def test_exception(self):
+        with self.assertRaises(ZeroDivisionError):
+            with self.dbf.transaction():
+                raise ZeroDivisionError
+
+        self.assertEqual(instrumentation.ERROR, self.records[0].outcome)
+
+    def test_no_sinks(self):
+        tf = clavis.TransactionFactory(self.db_url)
+        with tf.transaction() as t:
+            t.session.execute(self.query("one"))
+
+        self.assertEqual([], self.records)
+
+    def test_logging_sink(self):
+        tf = clavis.TransactionFactory(
+            self.db_url, sinks=[instrumentation.LoggingSink()]
+        )
+
+        with self.assertLogs("clavis.transactions", logging.INFO) as logs:
+            with tf.transaction() as t:
+                t.session.execute(self.query("one"))
+
+        self.assertEqual(1, len(logs.records))
+        self.assertIn("transaction committed", logs.output[0])
+        self.assertEqual(
+            1, logs.records[0].clavis_transaction["statements"], logs.output
+        )
+
+    def test_metrics_sink(self):
+        registry = instrumentation.MetricsRegistry()
+        tf = clavis.TransactionFactory(
+            self.db_url, sinks=[instrumentation.MetricsSink(registry)]
+        )
+
+        for value in ("one", "two"):
+            with tf.transaction() as t:
+                t.session.execute(self.query(value))
+
+        with tf.transaction() as t:
+            t.rollback()
+
+        transactions = registry.counter("clavis_transactions_total")
+        self.assertEqual(2, transactions.value(outcome=instrumentation.COMMITTED))
+        self.assertEqual(1, transactions.value(outcome=instrumentation.ROLLED_BACK))
+
+        durations = registry.histogram("clavis_transaction_duration_seconds")
+        self.assertEqual(3, durations.count(phase="total"))
+        self.assertGreater(durations.sum(phase="total"), 0)
+
+        text = registry.render()
+        self.assertIn("# TYPE clavis_transactions_total counter", text)
+        self.assertIn('clavis_transactions_total{outcome="committed"} 2', text)
+        self.assertIn(
+            'clavis_transaction_duration_seconds_count{phase="total"} 3', text
+        )
+
+    def test_failing_sink(self):
+        def sink(record):
+            raise ZeroDivisionError
+
+        tf = clavis.TransactionFactory(self.db_url, sinks=[sink])
+
+        with self.assertLogs("clavis.instrumentation", logging.ERROR):
+            with tf.transaction() as t:
+                t.session.execute(self.query("one"))
+
+        self.assertEqual(["one"], self.values())
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.db_url = db.url
+        self.records = []
+        self.dbf = clavis.TransactionFactory(
+            database_url=db.url,
+            sinks=[instrumentation.CallbackSink(self.records.append)],
+        )
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def query(value):
+        return sa.insert(TestTable).values({TestTable.value: value})
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute("test", query)]
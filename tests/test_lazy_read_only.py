@@ -0,0 +1,184 @@
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import errors
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class LazyTest(ClavisTestBase):
+    def test_no_connection_without_session(self):
+        with self.dbf.transaction(lazy=True) as t:
+            self.assertFalse(t.connected)
+            self.assertIsNotNone(t.engine)
+
+        self.assertEqual([], self.checkouts)
+
+    def test_connect_on_first_use(self):
+        with self.dbf.transaction(lazy=True) as t:
+            self.assertFalse(t.connected)
+            t.session.execute(self.query("x"))
+            self.assertTrue(t.connected)
+
+        self.assertEqual(1, len(self.checkouts))
+        self.assertEqual(["x"], self.values())
+
+    def test_rollback_without_connection(self):
+        with self.dbf.transaction(lazy=True) as t:
+            t.rollback()
+
+        with self.assertRaises(ZeroDivisionError):
+            with self.dbf.transaction(lazy=True):
+                raise ZeroDivisionError
+
+        self.assertEqual([], self.checkouts)
+
+    def test_postponed_without_connection(self):
+        with self.dbf.transaction(lazy=True) as t:
+            t.postpone(self.query("postponed"))
+
+        self.assertEqual(["postponed"], self.values())
+
+    def test_session_after_exit(self):
+        with self.dbf.transaction(lazy=True) as t:
+            pass
+
+        self.assertIsNone(t.session)
+        self.assertEqual([], self.checkouts)
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.dbf = clavis.TransactionFactory(engine=db.engine)
+        self.checkouts = []
+
+        sa.event.listen(
+            db.engine.pool, "checkout", lambda *_a: self.checkouts.append(_a)
+        )
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def query(value):
+        return sa.insert(TestTable).values({TestTable.value: value})
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute("test", query)]
+
+
+class ReadOnlyTest(ClavisTestBase):
+    def test_reads(self):
+        with self.dbf.transaction(read_only=True) as t:
+            self.assertTrue(t.read_only)
+            rows = t.session.query(TestTable).all()
+            self.assertEqual(["1"], [_r.value for _r in rows])
+
+    def test_core_write_is_rejected(self):
+        with self.assertRaises(errors.ReadOnlyError):
+            with self.dbf.transaction(read_only=True) as t:
+                t.session.execute(self.query("x"))
+
+        with self.assertRaises(errors.ReadOnlyError):
+            with self.dbf.transaction(read_only=True) as t:
+                t.session.execute(sa.text("delete from test_table"))
+
+        self.assertEqual(["1"], self.values())
+
+    def test_orm_write_is_rejected(self):
+        with self.assertRaises(errors.ReadOnlyError):
+            with self.dbf.transaction(read_only=True) as t:
+                t.session.add(TestTable(value="x"))
+
+        with self.assertRaises(errors.ReadOnlyError):
+            with self.dbf.transaction(read_only=True) as t:
+                t.session.add_all([TestTable(value="x")])
+
+        with self.assertRaises(errors.ReadOnlyError):
+            with self.dbf.transaction(read_only=True) as t:
+                t.session.delete(t.session.query(TestTable).first())
+
+        with self.assertRaises(errors.ReadOnlyError):
+            with self.dbf.transaction(read_only=True) as t:
+                t.session.query(TestTable).first().value = "changed"
+
+        self.assertEqual("error", t.outcome)
+
+        with self.assertRaises(errors.ReadOnlyError):
+            with self.dbf.transaction(read_only=True) as t:
+                t.session.query(TestTable).first().value = "changed"
+                t.session.query(TestTable).all()
+
+        self.assertEqual(["1"], self.values())
+
+    def test_database_level(self):
+        with self.assertRaises(sa.exc.OperationalError):
+            with self.dbf.transaction(read_only=True) as t:
+                t.session.execute(
+                    sa.text(
+                        "with x as (select 1) insert into test_table (value) select 'x'"
+                    )
+                )
+
+    def test_no_flush_and_rollback(self):
+        statements = []
+
+        with self.dbf.transaction(read_only=True) as t:
+            sa.event.listen(
+                t.session.connection(),
+                "rollback",
+                lambda *_a: statements.append("rollback"),
+            )
+            sa.event.listen(
+                t.session.connection(),
+                "commit",
+                lambda *_a: statements.append("commit"),
+            )
+
+        self.assertEqual(["rollback"], statements)
+
+    def test_connection_is_restored(self):
+        with self.dbf.transaction(read_only=True) as t:
+            t.session.query(TestTable).all()
+
+        with self.dbf.transaction() as t:
+            t.session.execute(self.query("x"))
+
+        self.assertEqual(["1", "x"], self.values())
+
+    def test_postponed_writes(self):
+        with self.dbf.transaction(read_only=True) as t:
+            t.postpone(self.query("postponed"))
+
+        self.assertEqual(["1", "postponed"], self.values())
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.dbf = clavis.TransactionFactory(db.url, pool_size=1, max_overflow=0)
+
+        with self.dbf.transaction() as t:
+            t.session.execute(self.query("1"))
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def query(value):
+        return sa.insert(TestTable).values({TestTable.value: value})
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute("test", query)]
@@ -0,0 +1,178 @@
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import errors
+from clavis import states
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class NestedTest(ClavisTestBase):
+    def test_inner_commit_and_rollback(self):
+        with self.dbf.transaction() as t:
+            self.insert(t, "outer")
+
+            with t.nested() as inner:
+                self.insert(inner, "committed")
+                inner.commit()
+                raise AssertionError("never happens")
+
+            with t.nested() as inner:
+                self.insert(inner, "rolled back")
+                inner.rollback()
+                raise AssertionError("never happens")
+
+            with t.nested() as inner:
+                self.insert(inner, "implicit")
+
+            self.insert(t, "after")
+
+        self.assertEqual(["outer", "committed", "implicit", "after"], self.values())
+
+    def test_session_calls_are_scoped(self):
+        with self.dbf.transaction() as t:
+            with t.session.begin_nested() as inner:
+                self.assertIs(inner, t.session.txn)
+                self.insert(inner, "committed")
+
+                try:
+                    t.session.commit()
+                except states.Committed as exc:
+                    self.assertIs(inner, exc.origin)
+                    raise
+
+            with t.session.begin_nested() as inner:
+                self.insert(inner, "rolled back")
+                t.session.rollback()
+
+            self.assertIs(t, t.session.txn)
+            self.insert(t, "after")
+
+        self.assertEqual(["committed", "after"], self.values())
+
+    def test_inner_exception(self):
+        with self.dbf.transaction() as t:
+            self.insert(t, "outer")
+
+            with self.assertRaises(ZeroDivisionError):
+                with t.nested() as inner:
+                    self.insert(inner, "failed")
+                    raise ZeroDivisionError
+
+            self.insert(t, "retried")
+
+        self.assertEqual(["outer", "retried"], self.values())
+
+    def test_outer_states_propagate(self):
+        with self.dbf.transaction() as t:
+            self.insert(t, "outer")
+
+            with t.nested() as inner:
+                self.insert(inner, "inner")
+                t.commit()
+
+            raise AssertionError("never happens")
+
+        self.assertEqual(["outer", "inner"], self.values())
+
+        with self.dbf.transaction() as t:
+            self.insert(t, "outer 2")
+
+            with t.nested() as inner:
+                self.insert(inner, "inner 2")
+                t.rollback()
+
+            raise AssertionError("never happens")
+
+        self.assertEqual(["outer", "inner"], self.values())
+
+    def test_deep_nesting(self):
+        with self.dbf.transaction() as t:
+            with t.nested() as level_1:
+                self.insert(level_1, "1")
+
+                with level_1.nested() as level_2:
+                    self.insert(level_2, "2")
+                    level_2.rollback()
+
+                with level_1.nested() as level_2:
+                    self.insert(level_2, "3")
+
+            with t.nested() as level_1:
+                with level_1.nested() as level_2:
+                    self.insert(level_2, "4")
+
+                level_1.rollback()
+
+        self.assertEqual(["1", "3"], self.values())
+
+    def test_postponed(self):
+        with self.dbf.transaction() as t:
+            t.postpone(self.query("outer"))
+
+            with t.nested() as inner:
+                inner.postpone(self.query("kept"))
+
+            with t.nested() as inner:
+                inner.postpone(self.query("discarded"))
+                inner.rollback()
+
+            with self.assertRaises(ZeroDivisionError):
+                with t.nested() as inner:
+                    inner.postpone(self.query("failed"))
+                    raise ZeroDivisionError
+
+        self.assertEqual(["outer", "kept"], self.values())
+
+    def test_orm_state(self):
+        with self.dbf.transaction() as t:
+            with t.nested() as inner:
+                obj = TestTable(value="orm")
+                inner.session.add(obj)
+                inner.session.flush()
+                inner.rollback()
+
+            self.assertNotIn(obj, t.session)
+
+        self.assertEqual([], self.values())
+
+    def test_reentrance(self):
+        with self.dbf.transaction() as t:
+            inner = t.nested()
+            with inner:
+                with self.assertRaises(errors.AlreadyEnteredError):
+                    with inner:
+                        pass
+
+        with self.assertRaises(errors.ClavisError):
+            with self.dbf.transaction().nested():
+                pass
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.dbf = clavis.TransactionFactory(database_url=db.url)
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def query(value):
+        return sa.insert(TestTable).values({TestTable.value: value})
+
+    def insert(self, txn, value):
+        txn.session.execute(self.query(value))
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute("test", query)]
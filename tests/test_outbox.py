@@ -0,0 +1,229 @@
+import datetime
+import sqlite3
+import threading
+from unittest import mock
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import outbox
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text, unique=True)
+    created = sa.Column(sa.DateTime)
+    kind = sa.Column(sa.Text, default="default")
+
+
+class OutboxTest(ClavisTestBase):
+    def test_postponed_go_to_outbox(self):
+        with self.dbf.transaction() as t:
+            t.session.execute(self.query("body"))
+            t.postpone(self.query("p1"), self.query("p2"))
+
+        self.assertEqual(["body"], self.values())
+        self.assertEqual(2, self.pending())
+        self.assertEqual((2, 1), tuple(t.postponed_stats))
+
+        self.assertEqual(2, self.drainer.drain_once())
+        self.assertEqual(0, self.drainer.drain_once())
+
+        self.assertEqual(["body", "p1", "p2"], self.values())
+        self.assertEqual(0, self.pending())
+        self.assertEqual(
+            {"batches": 1, "applied": 2, "failed": 0, "round_trips": 2},
+            self.drainer.stats.as_dict(),
+        )
+
+    def test_rolled_back(self):
+        with self.dbf.transaction() as t:
+            t.session.execute(self.query("body"))
+            t.postpone(self.query("postponed"))
+            t.rollback()
+
+        self.assertEqual([], self.values())
+        self.assertEqual(1, self.pending())
+
+        self.drainer.drain()
+        self.assertEqual(["postponed"], self.values())
+
+    def test_types_and_defaults(self):
+        created = datetime.datetime(2020, 1, 2, 3, 4, 5)
+
+        with self.dbf.transaction() as t:
+            t.postpone(
+                sa.insert(TestTable).values(value="x", created=created),
+                sa.update(TestTable)
+                .where(TestTable.value.in_(["x", "y"]))
+                .values(kind="updated"),
+            )
+
+        self.drainer.drain()
+
+        with self.dbf.transaction() as t:
+            row = t.session.query(TestTable).one()
+            self.assertEqual(
+                ("x", created, "updated"), (row.value, row.created, row.kind)
+            )
+
+        self.assertRaises(
+            TypeError,
+            outbox.serialize,
+            sa.insert(TestTable).values(value=object()),
+            sa.create_engine("sqlite://").dialect,
+        )
+
+    def test_idempotency_keys(self):
+        def postpone_once():
+            with self.dbf.transaction() as t:
+                t.postpone(
+                    self.query("once").execution_options(idempotency_key="key-1")
+                )
+
+        postpone_once()
+        postpone_once()
+        self.assertEqual(1, self.pending())
+
+        self.drainer.drain()
+        postpone_once()
+        self.assertEqual(0, self.pending())
+        self.assertEqual(["once"], self.values())
+
+        with self.db.engine.begin() as conn:
+            self.assertEqual(1, self.outbox.purge(conn, older_than=-1))
+
+        postpone_once()
+        self.assertEqual(1, self.pending())
+
+    def test_failures(self):
+        with self.dbf.transaction() as t:
+            t.postpone(self.query("a"), self.query("a"), self.query("b"))
+
+        drainer = outbox.Drainer(self.outbox, engine=self.db.engine, max_attempts=2)
+
+        with self.assertLogs("clavis.outbox"):
+            self.assertEqual(3, drainer.drain_once())
+
+        self.assertEqual(["a", "b"], self.values())
+        self.assertEqual((2, 1), (drainer.stats.applied, drainer.stats.failed))
+
+        with self.assertLogs("clavis.outbox"):
+            drainer.drain()
+        self.assertEqual(0, self.pending(max_attempts=2))
+
+        table = self.outbox.table
+        rows = self.execute("test", sa.select([table.c.attempts, table.c.last_error]))
+        self.assertEqual([1, 1, 2], sorted(_r.attempts for _r in rows))
+        self.assertEqual(
+            1, sum("IntegrityError" in (_r.last_error or "") for _r in rows)
+        )
+
+    def test_parallel_workers(self):
+        for start in range(0, 200, 50):
+            with self.dbf.transaction() as t:
+                t.postpone(*(self.query(str(_i)) for _i in range(start, start + 50)))
+
+        drainer = outbox.Drainer(
+            self.outbox, engine=self.db.engine, batch_size=7, workers=4
+        )
+        stats = drainer.drain()
+
+        self.assertEqual(200, stats.applied)
+        self.assertEqual(0, stats.failed)
+        self.assertEqual(sorted(str(_i) for _i in range(200)), sorted(self.values()))
+
+    def test_retry_backs_off(self):
+        locked = sa.exc.OperationalError(
+            "", {}, sqlite3.OperationalError("database is locked")
+        )
+        results = [locked, locked, 0]
+
+        def drain_once():
+            result = results.pop(0) if results else 0
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        drainer = outbox.Drainer(
+            self.outbox, engine=self.db.engine, workers=2, poll_interval=0.5
+        )
+        drainer.drain_once = drain_once
+
+        with mock.patch("clavis.outbox.time.sleep") as sleep:
+            drainer.drain()
+
+        self.assertEqual(2, sleep.call_count)
+        self.assertTrue(all(0 < _c.args[0] <= 0.5 for _c in sleep.call_args_list))
+
+    def test_background(self):
+        drainer = outbox.Drainer(self.outbox, engine=self.db.engine, poll_interval=0.01)
+        drainer.start()
+
+        try:
+            with self.dbf.transaction() as t:
+                t.postpone(self.query("background"))
+
+            for _ in range(500):
+                if self.values():
+                    break
+                threading.Event().wait(0.01)
+        finally:
+            drainer.stop()
+
+        self.assertEqual(["background"], self.values())
+
+    def test_read_only(self):
+        with self.dbf.transaction(read_only=True) as t:
+            t.session.execute(sa.select([TestTable.value])).all()
+            t.postpone(self.query("read only"))
+
+        self.assertEqual([], self.values())
+        self.assertEqual(1, self.pending())
+        self.assertEqual((1, 1), tuple(t.postponed_stats))
+
+        self.drainer.drain()
+        self.assertEqual(["read only"], self.values())
+
+    def test_lazy(self):
+        with self.dbf.transaction(lazy=True) as t:
+            t.postpone(self.query("lazy"))
+
+        self.assertEqual([], self.values())
+        self.assertEqual(1, self.pending())
+
+        with self.dbf.transaction(lazy=True) as t:
+            t.postpone(self.query("rolled back"))
+            t.rollback()
+
+        self.assertEqual(2, self.pending())
+
+    def setUp(self):
+        super().setUp()
+        self.db = self.setup_db("test", Base.metadata)
+        self.outbox = outbox.Outbox()
+        self.outbox.create(self.db.engine)
+        self.dbf = clavis.TransactionFactory(self.db.url, outbox=self.outbox)
+        self.drainer = outbox.Drainer(self.outbox, engine=self.db.engine)
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def query(value):
+        return sa.insert(TestTable).values({TestTable.value: value})
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute("test", query)]
+
+    def pending(self, **kwargs):
+        with self.db.engine.connect() as conn:
+            return self.outbox.pending(conn, **kwargs)
@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+import pickle
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import engines
+from clavis import instrumentation
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+def insert_partition(txn, partition):
+    for value in partition:
+        txn.session.add(TestTable(value=value))
+
+    if "rollback" in partition:
+        txn.rollback()
+
+    if "fail" in partition:
+        raise ZeroDivisionError(partition)
+
+    return len(partition)
+
+
+def engine_state(txn, _partition):
+    return os.getpid(), id(txn.engine.pool), txn.engine.url.database
+
+
+class ParallelTest(ClavisTestBase):
+    def test_map(self):
+        partitions = [["a", "b"], ["c"], ["d", "e", "f"], []]
+        results = self.dbf.map(insert_partition, partitions, processes=2, retries=3)
+
+        self.assertEqual([0, 1, 2, 3], [_r.index for _r in results])
+        self.assertEqual([2, 1, 3, 0], [_r.result for _r in results])
+        self.assertTrue(all(_r.ok for _r in results))
+        self.assertTrue(all(_r.seconds > 0 for _r in results))
+        self.assertNotIn(os.getpid(), {_r.pid for _r in results})
+        self.assertEqual(list("abcdef"), sorted(self.values()))
+
+    def test_outcomes(self):
+        partitions = [["a"], ["b", "fail"], ["c", "rollback"]]
+        results = self.dbf.map(insert_partition, partitions, processes=2)
+
+        self.assertEqual(
+            [
+                instrumentation.COMMITTED,
+                instrumentation.ERROR,
+                instrumentation.ROLLED_BACK,
+            ],
+            [_r.outcome for _r in results],
+        )
+        self.assertEqual("ZeroDivisionError: ['b', 'fail']", results[1].error)
+        self.assertIsNone(results[1].result)
+        self.assertEqual(["a"], self.values())
+
+    def test_engines_are_replaced_after_fork(self):
+        with self.dbf.transaction() as t:
+            t.session.add(TestTable(value="parent"))
+            parent_pool = id(t.engine.pool)
+
+        results = self.dbf.map(
+            engine_state,
+            [None] * 2,
+            processes=2,
+            mp_context=multiprocessing.get_context("fork"),
+        )
+
+        for result in results:
+            pid, pool, database = result.result
+            self.assertNotEqual(os.getpid(), pid)
+            self.assertNotEqual(parent_pool, pool)
+            self.assertEqual(self.db.path, database)
+
+        with self.dbf.transaction() as t:
+            self.assertEqual(parent_pool, id(t.engine.pool))
+            t.session.add(TestTable(value="parent again"))
+
+        self.assertEqual(["parent", "parent again"], self.values())
+
+    def test_pickled_configuration(self):
+        engine = engines.get_engine(self.db.url)
+        dbf = clavis.TransactionFactory(
+            engine=engine,
+            pool_size=3,
+            postponed_executor=clavis.PostponedExecutor(max_workers=1),
+            cache_size=16,
+        )
+        restored = pickle.loads(pickle.dumps(dbf))
+
+        self.assertIsNone(restored.engine)
+        self.assertIsNone(restored.postponed_executor)
+        self.assertEqual(self.db.url, restored.database_url)
+        self.assertEqual(3, restored.pool.pool_size)
+        self.assertEqual(16, restored.cache_size)
+
+        dbf.postponed_executor.shutdown()
+
+    def setUp(self):
+        super().setUp()
+        self.db = self.setup_db("test", Base.metadata)
+        self.dbf = clavis.TransactionFactory(self.db.url)
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute("test", query)]
@@ -0,0 +1,103 @@
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import QueuePool
+
+import clavis
+from clavis import engines
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class PoolTest(ClavisTestBase):
+    def test_engine_is_shared(self):
+        with clavis.Transaction(self.db_url) as txn:
+            engine = txn.engine
+            txn.session.execute(sa.insert(TestTable).values({TestTable.value: "1"}))
+
+        self.assertIsInstance(engine.pool, QueuePool)
+
+        with clavis.Transaction(self.db_url) as txn:
+            self.assertIs(engine, txn.engine)
+
+        tf = clavis.TransactionFactory(self.db_url)
+        with tf.transaction() as txn:
+            self.assertIs(engine, txn.engine)
+
+        clavis.configure(self.db_url)
+        with clavis.Transaction() as txn:
+            self.assertIs(engine, txn.engine)
+
+            rows = txn.session.execute(sa.select([TestTable.value])).fetchall()
+            self.assertEqual([("1",)], rows)
+
+    def test_engine_key(self):
+        with clavis.Transaction(self.db_url) as txn:
+            engine = txn.engine
+
+        with clavis.Transaction(self.db_url, echo=True) as txn:
+            self.assertIsNot(engine, txn.engine)
+
+        tf = clavis.TransactionFactory(self.db_url, pool_size=2)
+        with tf.transaction() as txn:
+            self.assertIsNot(engine, txn.engine)
+            self.assertEqual(2, txn.engine.pool.size())
+
+    def test_pool_options(self):
+        tf = clavis.TransactionFactory(
+            self.db_url,
+            pool_size=3,
+            max_overflow=1,
+            pool_recycle=60,
+            pool_pre_ping=True,
+        )
+        with tf.transaction() as txn:
+            pool = txn.engine.pool
+            self.assertEqual(3, pool.size())
+            self.assertEqual(1, pool._max_overflow)
+            self.assertEqual(60, pool._recycle)
+            self.assertTrue(pool._pre_ping)
+
+    def test_options_from_strings(self):
+        pool = engines.PoolOptions.build(
+            pool_size="4", max_overflow="0", pool_pre_ping="false"
+        )
+        self.assertEqual(
+            engines.PoolOptions(pool_size=4, max_overflow=0, pool_pre_ping=False),
+            pool,
+        )
+
+    def test_connections_are_reused(self):
+        tf = clavis.TransactionFactory(self.db_url, pool_size=1, max_overflow=0)
+
+        for _ in range(5):
+            with tf.transaction() as txn:
+                txn.session.execute(sa.select([1]))
+
+        self.assertEqual(1, txn.engine.pool.checkedin())
+        self.assertEqual(0, txn.engine.pool.checkedout())
+
+    def test_dispose_all(self):
+        with clavis.Transaction(self.db_url) as txn:
+            engine = txn.engine
+
+        self.assertGreaterEqual(clavis.dispose_all(), 1)
+
+        with clavis.Transaction(self.db_url) as txn:
+            self.assertIsNot(engine, txn.engine)
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.db_url = db.url
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
@@ -0,0 +1,155 @@
+import itertools
+from contextlib import closing
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import postponed
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+counter = itertools.count(1)
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class OtherTable(Base):
+    __tablename__ = "other_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class DefaultsTable(Base):
+    __tablename__ = "defaults_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+    created = sa.Column(sa.Integer, default=lambda: next(counter))
+    updated = sa.Column(sa.Integer, onupdate=lambda: next(counter))
+
+
+class PostponedBatchTest(ClavisTestBase):
+    def test_inserts_are_batched(self):
+        with self.dbf.transaction() as t:
+            for i in range(100):
+                t.postpone(sa.insert(TestTable).values({TestTable.value: str(i)}))
+
+        self.assertEqual(
+            postponed.PostponedStats(statements=100, round_trips=1),
+            t.postponed_stats,
+        )
+        self.assertEqual(99, t.postponed_stats.saved)
+
+        values = self.values(TestTable)
+        self.assertEqual([str(i) for i in range(100)], values)
+
+    def test_order_is_kept(self):
+        with self.dbf.transaction() as t:
+            t.postpone(
+                sa.insert(TestTable).values({TestTable.value: "a"}),
+                sa.insert(TestTable).values({TestTable.value: "b"}),
+                sa.update(TestTable)
+                .where(TestTable.value == "a")
+                .values({TestTable.value: "c"}),
+                sa.update(TestTable)
+                .where(TestTable.value == "c")
+                .values({TestTable.value: "d"}),
+                sa.insert(OtherTable).values({OtherTable.value: "x"}),
+                sa.insert(TestTable).values({TestTable.value: "e"}),
+                sa.delete(TestTable).where(TestTable.value == "b"),
+            )
+
+        self.assertEqual(
+            postponed.PostponedStats(statements=7, round_trips=5), t.postponed_stats
+        )
+        self.assertEqual(["d", "e"], self.values(TestTable))
+        self.assertEqual(["x"], self.values(OtherTable))
+
+    def test_not_batched(self):
+        with self.dbf.transaction() as t:
+            t.postpone(
+                sa.insert(TestTable).values({TestTable.value: "a"}),
+                sa.insert(TestTable).values({TestTable.id: 10, TestTable.value: "b"}),
+                sa.delete(TestTable).where(TestTable.value.in_(["a"])),
+                sa.delete(TestTable).where(TestTable.value.in_(["x"])),
+            )
+
+        self.assertEqual(
+            postponed.PostponedStats(statements=4, round_trips=4), t.postponed_stats
+        )
+        self.assertEqual(["b"], self.values(TestTable))
+
+    def test_python_side_defaults(self):
+        with self.dbf.transaction() as t:
+            for value in ("a", "b"):
+                t.postpone(
+                    sa.insert(DefaultsTable).values({DefaultsTable.value: value})
+                )
+
+        with self.dbf.transaction() as t:
+            for value in ("a", "b"):
+                t.postpone(
+                    sa.update(DefaultsTable)
+                    .where(DefaultsTable.value == value)
+                    .values({DefaultsTable.value: value * 2})
+                )
+
+        self.assertEqual(1, t.postponed_stats.round_trips)
+
+        rows = self.created(DefaultsTable.updated)
+
+        self.assertEqual(["aa", "bb"], [_r[0] for _r in rows])
+        self.assertTrue(all(_r[1] is not None and _r[2] is not None for _r in rows))
+        self.assertEqual(4, len({_v for _r in rows for _v in _r[1:]}))
+
+    def test_explicit_and_default_values(self):
+        explicit = sa.insert(DefaultsTable).values(value="explicit", created=0)
+        default = sa.insert(DefaultsTable).values(value="default")
+
+        for queries in ((explicit, default), (default, explicit)):
+            with self.dbf.transaction() as t:
+                t.postpone(*queries)
+
+            self.assertEqual(2, t.postponed_stats.round_trips)
+
+            created = dict(self.created())
+            self.assertEqual(0, created["explicit"])
+            self.assertNotIn(created["default"], (None, 0))
+
+            with self.engine.begin() as conn:
+                conn.execute(sa.delete(DefaultsTable))
+
+    def test_no_postponed(self):
+        with self.dbf.transaction() as t:
+            pass
+
+        self.assertIsNone(t.postponed_stats)
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.engine = db.engine
+        self.dbf = clavis.TransactionFactory(database_url=db.url)
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    def values(self, table):
+        query = sa.select([table.value]).order_by(table.id)
+        with closing(self.engine.connect()) as conn:
+            return [_r.value for _r in conn.execute(query)]
+
+    def created(self, *columns):
+        query = sa.select(
+            [DefaultsTable.value, DefaultsTable.created, *columns]
+        ).order_by(DefaultsTable.id)
+        with closing(self.engine.connect()) as conn:
+            return [tuple(_r) for _r in conn.execute(query)]
@@ -0,0 +1,172 @@
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import postponed
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class Counter(Base):
+    __tablename__ = "counter"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    name = sa.Column(sa.Text)
+    hits = sa.Column(sa.Integer, default=0)
+    seen = sa.Column(sa.Text)
+
+
+class Log(Base):
+    __tablename__ = "log"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class PostponedCoalesceTest(ClavisTestBase):
+    def test_duplicates(self):
+        queries = [self.seen(1, "x"), self.seen(1, "x"), self.seen(2, "x")]
+        queries.append(self.seen(1, "x"))
+
+        self.assertEqual(
+            [queries[0], queries[2]], postponed.coalesce(queries, self.dialect)
+        )
+
+    def test_overwritten_values(self):
+        queries = [self.seen(1, "x"), self.seen(1, "y"), self.seen(1, "x")]
+
+        self.assertEqual(1, len(postponed.coalesce(queries, self.dialect)))
+        self.assertResult(queries, [("a", 0, "x"), ("b", 0, None)])
+
+    def test_increments_are_kept(self):
+        queries = [self.hit(1), self.hit(1), self.hit(1)]
+        coalesced = postponed.coalesce(queries, self.dialect)
+
+        self.assertEqual(queries, coalesced)
+        self.assertResult(queries, [("a", 3, None), ("b", 0, None)])
+
+    def test_inserts_are_kept(self):
+        insert = sa.insert(Log).values({Log.value: "x"})
+
+        self.assertEqual(3, len(postponed.coalesce([insert] * 3, self.dialect)))
+
+    def test_updates_are_merged(self):
+        queries = [self.hit(1), self.seen(1, "x"), self.seen(1, "y"), self.seen(2, "z")]
+        coalesced = postponed.coalesce(queries, self.dialect)
+
+        self.assertEqual(2, len(coalesced))
+        self.assertIn("hits", str(coalesced[0]))
+        self.assertIn("seen", str(coalesced[0]))
+        self.assertResult(queries, [("a", 1, "y"), ("b", 0, "z")])
+
+    def test_dependent_updates_are_not_merged(self):
+        queries = [
+            self.seen(1, "x"),
+            self.update(1, {Counter.name: Counter.seen}),
+            self.update(1, {Counter.hits: 5}).where(Counter.seen == "x"),
+        ]
+
+        self.assertEqual(3, len(postponed.coalesce(queries, self.dialect)))
+        self.assertResult(queries, [("x", 5, "x"), ("b", 0, None)])
+
+    def test_where_changed_by_update(self):
+        queries = [
+            sa.update(Counter).where(Counter.name == "a").values({Counter.name: "c"}),
+            sa.update(Counter).where(Counter.name == "a").values({Counter.hits: 9}),
+        ]
+
+        self.assertEqual(2, len(postponed.coalesce(queries, self.dialect)))
+        self.assertResult(queries, [("c", 0, None), ("b", 0, None)])
+
+    def test_superseded_by_delete(self):
+        delete = sa.delete(Counter).where(Counter.id == 1)
+        queries = [self.hit(1), self.seen(1, "x"), self.hit(2), delete]
+        coalesced = postponed.coalesce(queries, self.dialect)
+
+        self.assertEqual([queries[2], delete], coalesced)
+        self.assertResult(queries, [("b", 1, None)])
+
+    def test_delete_after_dependent_write(self):
+        delete = sa.delete(Counter).where(Counter.id == 1)
+        copy = sa.insert(Log).from_select(
+            [Log.value], sa.select([Counter.seen]).where(Counter.id == 1)
+        )
+        queries = [self.seen(1, "x"), copy, delete]
+
+        self.assertEqual(queries, postponed.coalesce(queries, self.dialect))
+        self.assertResult(queries, [("b", 0, None)])
+        self.assertEqual(["x"], self.logs())
+
+    def test_transaction(self):
+        dbf = clavis.TransactionFactory(self.db.url, postponed_coalesce=True)
+
+        with dbf.transaction() as t:
+            for _ in range(10):
+                t.postpone(self.seen(1, "x"))
+                t.postpone(self.hit(2))
+
+        self.assertEqual(9, t.postponed_coalesced)
+        self.assertEqual(11, t.postponed_stats.statements)
+        self.assertEqual([("a", 0, "x"), ("b", 10, None)], self.rows())
+
+    def test_disabled_by_default(self):
+        dbf = clavis.TransactionFactory(self.db.url)
+
+        with dbf.transaction() as t:
+            for _ in range(3):
+                t.postpone(self.seen(1, "x"))
+
+        self.assertEqual(0, t.postponed_coalesced)
+        self.assertEqual(3, t.postponed_stats.statements)
+
+    def setUp(self):
+        super().setUp()
+        self.db = self.setup_db("test", Base.metadata)
+        self.dialect = self.db.engine.dialect
+        self.reset()
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    def reset(self):
+        with self.db.engine.begin() as conn:
+            conn.execute(sa.delete(Counter))
+            conn.execute(sa.delete(Log))
+            conn.execute(
+                sa.insert(Counter),
+                [{"id": 1, "name": "a", "hits": 0}, {"id": 2, "name": "b", "hits": 0}],
+            )
+
+    def assertResult(self, queries, expected):
+        """
+        Checks that the original and coalesced queries give the same rows.
+        """
+        for run in (queries, postponed.coalesce(queries, self.dialect)):
+            self.reset()
+            with self.db.engine.begin() as conn:
+                for query in run:
+                    conn.execute(query)
+
+            self.assertEqual(expected, self.rows())
+
+    @staticmethod
+    def update(counter_id, values):
+        return sa.update(Counter).where(Counter.id == counter_id).values(values)
+
+    def hit(self, counter_id):
+        return self.update(counter_id, {Counter.hits: Counter.hits + 1})
+
+    def seen(self, counter_id, value):
+        return self.update(counter_id, {"seen": value})
+
+    def rows(self):
+        query = sa.select([Counter.name, Counter.hits, Counter.seen]).order_by(
+            Counter.id
+        )
+        return [tuple(_r) for _r in self.execute("test", query)]
+
+    def logs(self):
+        query = sa.select([Log.value]).order_by(Log.id)
+        return [_r.value for _r in self.execute("test", query)]
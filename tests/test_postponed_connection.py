@@ -0,0 +1,77 @@
+from contextlib import closing
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import postponed
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class PostponedConnectionTest(ClavisTestBase):
+    def test_same_connection(self):
+        tf = clavis.TransactionFactory(engine=self.engine)
+
+        with tf.transaction() as t:
+            self.assertIs(self.engine, t.engine)
+            t.session.execute(sa.insert(TestTable).values({TestTable.value: "one"}))
+            t.postpone(sa.insert(TestTable).values({TestTable.value: "two"}))
+
+        self.assertEqual(1, len(self.checkouts))
+        self.assertEqual(["one", "two"], self.values())
+
+    def test_same_connection_on_rollback(self):
+        tf = clavis.TransactionFactory(engine=self.engine)
+
+        with tf.transaction() as t:
+            t.session.execute(sa.insert(TestTable).values({TestTable.value: "one"}))
+            t.postpone(sa.insert(TestTable).values({TestTable.value: "two"}))
+            t.rollback()
+
+        self.assertEqual(1, len(self.checkouts))
+        self.assertEqual(["two"], self.values())
+
+    def test_separate_connection(self):
+        tf = clavis.TransactionFactory(
+            engine=self.engine,
+            postponed_connection=postponed.SEPARATE_CONNECTION,
+        )
+
+        with tf.transaction() as t:
+            t.session.execute(sa.insert(TestTable).values({TestTable.value: "one"}))
+            t.postpone(sa.insert(TestTable).values({TestTable.value: "two"}))
+
+        self.assertEqual(2, len(self.checkouts))
+        self.assertEqual(["one", "two"], self.values())
+
+    def test_unsupported_mode(self):
+        with self.assertRaises(ValueError):
+            clavis.Transaction(engine=self.engine, postponed_connection="xxx")
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.engine = db.engine
+        self.checkouts = []
+
+        sa.event.listen(
+            self.engine.pool, "checkout", lambda *_a: self.checkouts.append(_a)
+        )
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        with closing(self.engine.connect()) as conn:
+            return [_r.value for _r in conn.execute(query)]
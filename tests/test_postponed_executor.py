@@ -0,0 +1,103 @@
+import threading
+from contextlib import closing
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import errors
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+missing_table = sa.Table("missing_table", sa.MetaData(), sa.Column("value", sa.Text))
+
+
+class PostponedExecutorTest(ClavisTestBase):
+    def test_exit_does_not_wait(self):
+        with self.dbf.transaction() as t:
+            t.session.execute(sa.insert(TestTable).values({TestTable.value: "one"}))
+            t.postpone(sa.insert(TestTable).values({TestTable.value: "two"}))
+
+        self.assertEqual(["one"], self.values())
+        self.assertEqual(1, self.executor.pending)
+        self.assertFalse(self.executor.drain(timeout=0.05))
+
+        self.gate.set()
+        self.assertTrue(self.executor.drain(timeout=5))
+
+        self.assertEqual(["one", "two"], self.values())
+        self.assertEqual(0, self.executor.pending)
+        self.assertEqual(1, t.postponed_stats.statements)
+
+    def test_backpressure(self):
+        with self.dbf.transaction() as t:
+            t.postpone(sa.insert(TestTable).values({TestTable.value: "one"}))
+
+        with self.assertRaises(errors.ExecutorFullError):
+            with self.dbf.transaction() as t:
+                t.postpone(sa.insert(TestTable).values({TestTable.value: "two"}))
+
+        self.gate.set()
+        self.executor.flush()
+
+        self.assertEqual(["one"], self.values())
+
+    def test_error_callback(self):
+        self.gate.set()
+
+        with self.dbf.transaction() as t:
+            t.postpone(sa.insert(missing_table).values(value="x"))
+
+        self.executor.flush()
+
+        self.assertEqual(1, len(self.failures))
+        exc, queries = self.failures[0]
+        self.assertIsInstance(exc, sa.exc.OperationalError)
+        self.assertEqual(1, len(queries))
+        self.assertEqual(1, self.executor.failed)
+        self.assertIsNotNone(t.postponed_future.exception())
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.engine = db.engine
+        self.gate = threading.Event()
+        self.failures = []
+        self.executor = clavis.PostponedExecutor(
+            max_pending=1,
+            block=False,
+            on_error=lambda *_a: self.failures.append(_a),
+        )
+        self.dbf = clavis.TransactionFactory(
+            database_url=db.url, postponed_executor=self.executor
+        )
+
+        def wait_for_gate(conn, *_args):
+            if threading.current_thread() is not threading.main_thread():
+                self.gate.wait(5)
+
+        sa.event.listen(
+            clavis.engines.get_engine(db.url, pool=self.dbf.pool),
+            "before_execute",
+            wait_for_gate,
+        )
+
+    def tearDown(self):
+        self.gate.set()
+        self.executor.shutdown()
+        self.cleanup()
+        super().tearDown()
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        with closing(self.engine.connect()) as conn:
+            return [_r.value for _r in conn.execute(query)]
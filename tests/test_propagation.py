@@ -0,0 +1,225 @@
+import asyncio
+import threading
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import errors
+from clavis import propagation
+from clavis.transaction import JoinedTransaction
+from clavis.transaction import NestedTransaction
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class PropagationTest(ClavisTestBase):
+    def test_current(self):
+        self.assertIsNone(clavis.Transaction.current())
+
+        with self.dbf.transaction() as t:
+            self.assertIs(t, clavis.Transaction.current())
+
+            with t.nested() as n:
+                self.assertIs(n, clavis.Transaction.current())
+
+            self.assertIs(t, clavis.Transaction.current())
+
+            with self.assertRaises(ZeroDivisionError):
+                with clavis.Transaction(self.db_url) as other:
+                    self.assertIs(other, clavis.Transaction.current())
+                    raise ZeroDivisionError
+
+            self.assertIs(t, clavis.Transaction.current())
+
+        self.assertIsNone(clavis.Transaction.current())
+
+    def test_required_joins(self):
+        tf = clavis.TransactionFactory(self.db_url, propagation=propagation.REQUIRED)
+
+        with tf.transaction() as outer:
+            self.insert("outer")
+
+            with tf.transaction() as inner:
+                self.assertIsInstance(inner, JoinedTransaction)
+                self.assertIs(outer.session, inner.session)
+                self.insert("inner")
+                inner.postpone(self.query("postponed"))
+                inner.commit()
+
+            self.assertEqual(1, len(self.checkouts))
+            self.assertEqual(1, len(outer._postponed))
+
+        self.assertEqual(["outer", "inner", "postponed"], self.values())
+        self.assertEqual(1, len(self.checkouts))
+
+    def test_required_without_outer(self):
+        tf = clavis.TransactionFactory(self.db_url, propagation=propagation.REQUIRED)
+
+        with tf.transaction() as t:
+            self.assertIsInstance(t, clavis.Transaction)
+            self.insert("x")
+
+        self.assertEqual(["x"], self.values())
+
+    def test_required_rollback_marks_outer(self):
+        with self.assertRaises(errors.RollbackOnlyError):
+            with self.dbf.transaction() as outer:
+                self.insert("outer")
+
+                with self.dbf.transaction(propagation=propagation.REQUIRED) as inner:
+                    self.insert("inner")
+                    inner.rollback()
+
+                self.assertTrue(outer.rollback_only)
+
+        with self.assertRaises(errors.RollbackOnlyError):
+            with self.dbf.transaction() as outer:
+                try:
+                    with self.dbf.transaction(propagation=propagation.REQUIRED):
+                        raise ZeroDivisionError
+                except ZeroDivisionError:
+                    pass
+
+                self.insert("swallowed")
+
+        self.assertEqual([], self.values())
+        self.assertEqual("rolled_back", outer.outcome)
+
+    def test_required_session_states(self):
+        with self.dbf.transaction() as outer:
+            with self.dbf.transaction(propagation=propagation.REQUIRED) as inner:
+                self.insert("committed")
+                inner.session.commit()
+
+            self.assertIs(outer, outer.session.txn)
+            self.insert("after commit")
+
+        self.assertEqual(["committed", "after commit"], self.values())
+
+        with self.assertRaises(errors.RollbackOnlyError):
+            with self.dbf.transaction() as outer:
+                with self.dbf.transaction(propagation=propagation.REQUIRED) as inner:
+                    self.insert("rolled back")
+                    inner.session.rollback()
+
+                self.assertTrue(outer.rollback_only)
+                self.insert("after rollback")
+
+        self.assertEqual(["committed", "after commit"], self.values())
+
+    def test_nested_rollback_only(self):
+        with self.dbf.transaction() as outer:
+            self.insert("outer")
+
+            with self.assertRaises(errors.RollbackOnlyError):
+                with outer.nested():
+                    self.insert("nested")
+                    with self.dbf.transaction(propagation=propagation.REQUIRED) as j:
+                        j.rollback()
+
+        self.assertEqual(["outer"], self.values())
+
+    def test_outer_commit_passes_through(self):
+        with self.dbf.transaction() as outer:
+            with self.dbf.transaction(propagation=propagation.REQUIRED):
+                self.insert("x")
+                outer.commit()
+
+            self.fail("outer commit must finish the outer block")
+
+        self.assertEqual(["x"], self.values())
+
+    def test_nested(self):
+        with self.dbf.transaction() as outer:
+            self.insert("outer")
+
+            with self.dbf.transaction(propagation=propagation.NESTED) as inner:
+                self.assertIsInstance(inner, NestedTransaction)
+                self.assertIs(outer, inner.parent)
+                self.insert("inner")
+                inner.rollback()
+
+            with self.dbf.transaction(propagation=propagation.REQUIRED) as joined:
+                with self.dbf.transaction(propagation=propagation.NESTED) as inner:
+                    self.assertIs(joined, inner.parent)
+                    self.insert("nested in joined")
+
+        self.assertEqual(["outer", "nested in joined"], self.values())
+        self.assertEqual(1, len(self.checkouts))
+
+    def test_requires_new(self):
+        with self.dbf.transaction() as outer:
+            with self.dbf.transaction() as inner:
+                self.assertIsInstance(inner, clavis.Transaction)
+                self.assertIsNot(outer.session, inner.session)
+
+        self.assertEqual(2, len(self.checkouts))
+
+    def test_threads_and_tasks(self):
+        seen = []
+
+        with self.dbf.transaction():
+            thread = threading.Thread(
+                target=lambda: seen.append(clavis.Transaction.current())
+            )
+            thread.start()
+            thread.join()
+
+            async def task():
+                await asyncio.sleep(0)
+                return clavis.Transaction.current()
+
+            async def main():
+                with clavis.Transaction(self.db_url) as t:
+                    other = asyncio.create_task(task())
+                    await asyncio.sleep(0)
+                return t, await other
+
+            own, seen_by_task = asyncio.run(main())
+
+        self.assertEqual([None], seen)
+        self.assertIs(own, seen_by_task)
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            clavis.TransactionFactory(self.db_url, propagation="mandatory")
+
+        with self.assertRaises(ValueError):
+            self.dbf.transaction(propagation="mandatory")
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.db_url = db.url
+        self.dbf = clavis.TransactionFactory(db.url)
+        self.checkouts = []
+
+        sa.event.listen(
+            clavis.engines.get_engine(db.url, None, clavis.conf.pool_options()).pool,
+            "checkout",
+            lambda *_a: self.checkouts.append(_a),
+        )
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def query(value):
+        return sa.insert(TestTable).values({TestTable.value: value})
+
+    def insert(self, value):
+        clavis.Transaction.current().session.execute(self.query(value))
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute("test", query)]
@@ -0,0 +1,198 @@
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import cache
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+links = sa.Table(
+    "links",
+    Base.metadata,
+    sa.Column("test_id", sa.ForeignKey("test_table.id"), primary_key=True),
+    sa.Column("other_id", sa.ForeignKey("other_table.id"), primary_key=True),
+)
+
+
+class OtherTable(Base):
+    __tablename__ = "other_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    tests = sa.orm.relationship(TestTable, secondary=links)
+
+
+class ReadCacheTest(ClavisTestBase):
+    def test_repeated_reads(self):
+        with self.dbf.transaction() as t:
+            executed = self.count_statements(t)
+
+            for _ in range(3):
+                self.assertEqual(["a", "b"], self.read(t))
+                self.assertEqual(["b"], self.read(t, TestTable.value == "b"))
+
+            self.assertEqual(2, len(executed))
+
+        self.assertEqual(4, t.cache_stats.hits)
+        self.assertEqual(2, t.cache_stats.misses)
+
+    def test_executed_writes_invalidate(self):
+        with self.dbf.transaction() as t:
+            self.read(t)
+            t.session.execute(sa.select([OtherTable.id])).all()
+
+            t.session.execute(sa.insert(TestTable).values({TestTable.value: "c"}))
+            self.assertEqual(["a", "b", "c"], self.read(t))
+
+            t.session.execute(sa.update(TestTable).values({TestTable.value: "x"}))
+            self.assertEqual(["x", "x", "x"], self.read(t))
+
+            t.session.execute(sa.delete(TestTable))
+            self.assertEqual([], self.read(t))
+
+            t.session.execute(sa.select([OtherTable.id])).all()
+
+        self.assertEqual(1, t.cache_stats.hits)
+        self.assertEqual(3, t.cache_stats.invalidations)
+
+    def test_flushed_writes_invalidate(self):
+        with self.dbf.transaction() as t:
+            self.assertEqual(["a", "b"], self.read(t))
+
+            t.session.add(TestTable(value="c"))
+            self.assertEqual(["a", "b", "c"], self.read(t))
+
+            obj = t.session.execute(
+                sa.select(TestTable).where(TestTable.value == "a")
+            ).scalar_one()
+            obj.value = "z"
+            t.session.flush()
+            self.assertEqual(["z", "b", "c"], self.read(t))
+
+    def test_association_tables_invalidate(self):
+        count = sa.select([sa.func.count()]).select_from(links)
+
+        with self.dbf.transaction() as t:
+            other = OtherTable()
+            t.session.add(other)
+            t.session.flush()
+            self.assertEqual(0, t.session.execute(count).scalar())
+
+            test = t.session.execute(sa.select(TestTable)).scalars().first()
+            other.tests.append(test)
+            t.session.flush()
+            self.assertEqual(1, t.session.execute(count).scalar())
+
+    def test_connection_writes_invalidate(self):
+        with self.dbf.transaction() as t:
+            self.read(t)
+            t.session.connection().execute(sa.delete(TestTable))
+            self.assertEqual([], self.read(t))
+
+            t.session.connection().exec_driver_sql(
+                "INSERT INTO test_table VALUES (9, 'z')"
+            )
+            self.assertEqual(["z"], self.read(t))
+
+        self.assertEqual(0, t.cache_stats.hits)
+
+    def test_textual_statements_clear(self):
+        with self.dbf.transaction() as t:
+            self.read(t)
+            t.session.execute(sa.text("UPDATE test_table SET value = 'y'"))
+            self.assertEqual(["y", "y"], self.read(t))
+
+        self.assertEqual(0, t.cache_stats.hits)
+
+    def test_lru(self):
+        with self.dbf.transaction(cache_size=2) as t:
+            self.read(t, TestTable.value == "a")
+            self.read(t, TestTable.value == "b")
+            self.read(t, TestTable.value == "a")
+            self.read(t, TestTable.value == "c")
+            self.read(t, TestTable.value == "a")
+            self.read(t, TestTable.value == "b")
+
+            self.assertEqual(2, len(t.session.cache))
+
+        self.assertEqual(
+            {"hits": 2, "misses": 4, "evictions": 2, "invalidations": 0},
+            t.cache_stats.as_dict(),
+        )
+
+    def test_discarded_on_exit(self):
+        with self.dbf.transaction() as t:
+            self.read(t)
+
+        with self.dbf.transaction() as t2:
+            t2.session.execute(sa.delete(TestTable).where(TestTable.value == "a"))
+
+        self.assertEqual(0, len(t._cache))
+
+        with self.dbf.transaction() as t:
+            self.assertEqual(["b"], self.read(t))
+
+    def test_savepoint_rollback(self):
+        with self.dbf.transaction() as t:
+            self.read(t)
+
+            with t.nested() as n:
+                n.session.execute(sa.delete(TestTable))
+                self.assertEqual([], self.read(t))
+                n.rollback()
+
+            self.assertEqual(["a", "b"], self.read(t))
+
+    def test_uncached(self):
+        with self.dbf.transaction() as t:
+            for _ in range(2):
+                t.session.execute(sa.select([TestTable.id]).with_for_update()).all()
+                list(t.stream(sa.select([TestTable.id])))
+
+        self.assertEqual(0, t.cache_stats.hits + t.cache_stats.misses)
+
+        with self.dbf.transaction(cache_size=0) as t:
+            self.read(t)
+            self.assertIsNone(t.cache_stats)
+
+    def test_tables_of(self):
+        query = sa.select([OtherTable.id]).where(
+            OtherTable.id.in_(sa.select([TestTable.id]))
+        )
+
+        self.assertEqual({"test_table", "other_table"}, cache.tables_of(query))
+        self.assertEqual({"test_table"}, cache.tables_of(sa.delete(TestTable)))
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        with db.engine.begin() as conn:
+            conn.execute(sa.insert(TestTable), [{"value": "a"}, {"value": "b"}])
+        self.dbf = clavis.TransactionFactory(db.url, cache_size=16)
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def count_statements(t):
+        executed = []
+        sa.event.listen(
+            t.session.connection(),
+            "before_cursor_execute",
+            lambda *_args: executed.append(_args[2]),
+        )
+        return executed
+
+    @staticmethod
+    def read(t, *where):
+        query = sa.select([TestTable.value]).where(*where).order_by(TestTable.id)
+        return t.session.execute(query).scalars().all()
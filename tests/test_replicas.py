@@ -0,0 +1,166 @@
+import shutil
+import threading
+from pathlib import Path
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import replicas
+from clavis.conf import global_vars as gv
+from clavis.conf import settings
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class ReplicasTest(ClavisTestBase):
+    def test_round_robin(self):
+        tf = clavis.TransactionFactory(self.primary, replica_urls=self.replicas)
+
+        self.assertEqual(["r1", "r2", "r1", "r2"], [self.read(tf) for _ in range(4)])
+        self.assertEqual([2, 2], [_r.transactions for _r in tf.replicas.replicas])
+        self.assertEqual([0, 0], [_r.outstanding for _r in tf.replicas.replicas])
+
+    def test_writes_go_to_primary(self):
+        tf = clavis.TransactionFactory(self.primary, replica_urls=self.replicas)
+
+        with tf.transaction() as t:
+            self.assertIsNone(t.replica)
+            self.assertEqual("primary", self.value(t))
+
+        with tf.transaction(read_only=True) as t:
+            self.assertIsNotNone(t.replica)
+            t.postpone(sa.insert(TestTable).values({TestTable.value: "postponed"}))
+
+        self.assertEqual(["primary", "postponed"], self.values("primary"))
+        self.assertEqual(["r1"], self.values("r1"))
+
+    def test_least_outstanding(self):
+        tf = clavis.TransactionFactory(
+            self.primary,
+            replica_urls=self.replicas,
+            balancing=replicas.LEAST_OUTSTANDING,
+        )
+
+        with tf.transaction(read_only=True) as t1:
+            with tf.transaction(read_only=True) as t2:
+                second = t2.replica
+                self.assertIsNot(t1.replica, second)
+
+                with tf.transaction(read_only=True) as t3:
+                    self.assertIs(t1.replica, t3.replica)
+                    self.assertEqual(
+                        [2, 1], [_r.outstanding for _r in tf.replicas.replicas]
+                    )
+
+            with tf.transaction(read_only=True) as t4:
+                self.assertIs(second, t4.replica)
+
+    def test_ejection_and_reinstatement(self):
+        now = [0.0]
+        broken = Path("./test_db_broken").resolve()
+        urls = (f"sqlite:///{broken.as_posix()}/db.sqlite", self.replicas[0])
+
+        tf = clavis.TransactionFactory(self.primary)
+        tf.replicas = replicas.ReplicaSet(urls, eject_for=10, clock=lambda: now[0])
+        bad, good = tf.replicas.replicas
+
+        self.assertEqual(["r1", "r1", "r1"], [self.read(tf) for _ in range(3)])
+        self.assertTrue(bad.ejected)
+        self.assertEqual((1, 1), (bad.transactions, bad.ejections))
+        self.assertEqual([0, 0], [_r.outstanding for _r in tf.replicas.replicas])
+
+        now[0] = 20
+        self.assertEqual("r1", self.read(tf))
+        self.join_probes()
+        self.assertTrue(bad.ejected)
+        self.assertEqual((good,), tf.replicas.check())
+
+        try:
+            broken.mkdir()
+            sa.create_engine(urls[0]).dispose()
+            Base.metadata.create_all(bad.engine)
+
+            now[0] = 40
+            self.assertEqual("r1", self.read(tf))
+            self.join_probes()
+            self.assertFalse(bad.ejected)
+            self.assertEqual((bad, good), tf.replicas.check())
+        finally:
+            bad.engine.dispose()
+            shutil.rmtree(broken, ignore_errors=True)
+
+    def test_all_replicas_ejected(self):
+        tf = clavis.TransactionFactory(self.primary, replica_urls=self.replicas)
+        for replica in tf.replicas.replicas:
+            tf.replicas.failed(replica)
+
+        self.assertEqual((), tf.replicas.healthy)
+        self.assertEqual("primary", self.read(tf))
+
+    def test_configure(self):
+        clavis.configure(self.primary, replica_urls=self.replicas[1:])
+
+        with clavis.Transaction(read_only=True) as t:
+            self.assertEqual("r2", self.value(t))
+
+        tf = clavis.TransactionFactory()
+        self.assertEqual("r2", self.read(tf))
+
+        tf = clavis.TransactionFactory(self.primary)
+        self.assertIsNone(tf.replicas)
+        self.assertEqual("primary", self.read(tf))
+
+    def test_parse_urls(self):
+        self.assertEqual((), replicas.parse_urls(None))
+        self.assertEqual(("a", "b"), replicas.parse_urls(" a, b ,"))
+        self.assertEqual(("a",), replicas.parse_urls(["a"]))
+
+        with self.assertRaises(ValueError):
+            replicas.ReplicaSet(self.replicas, balancing="random")
+
+    def setUp(self):
+        super().setUp()
+        self.primary = self.setup_db("primary", Base.metadata).url
+        self.replicas = (
+            self.setup_db("r1", Base.metadata).url,
+            self.setup_db("r2", Base.metadata).url,
+        )
+
+        for name in ("primary", "r1", "r2"):
+            with self._databases[name].engine.begin() as conn:
+                conn.execute(sa.insert(TestTable).values({TestTable.value: name}))
+
+    def tearDown(self):
+        settings.set(gv.VAR_DATABASE_REPLICA_URLS, None)
+        clavis.conf.invalidate()
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def join_probes():
+        for thread in threading.enumerate():
+            if thread.name == "clavis-replica-probe":
+                thread.join()
+
+    @classmethod
+    def read(cls, tf):
+        with tf.transaction(read_only=True) as t:
+            return cls.value(t)
+
+    @staticmethod
+    def value(t):
+        query = sa.select([TestTable.value]).order_by(TestTable.id).limit(1)
+        return t.session.execute(query).scalar()
+
+    def values(self, name):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute(name, query)]
@@ -0,0 +1,157 @@
+import sqlite3
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import retry
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class _PgError(Exception):
+    pgcode = "40001"
+
+
+class _MySqlError(Exception):
+    pass
+
+
+def _error(orig):
+    return sa.exc.OperationalError("statement", {}, orig)
+
+
+class RetryTest(ClavisTestBase):
+    def test_retry_until_success(self):
+        attempts = []
+
+        def body(txn):
+            attempts.append(txn)
+            txn.session.execute(self.query(f"attempt {len(attempts)}"))
+            txn.postpone(self.query(f"postponed {len(attempts)}"))
+
+            if len(attempts) < 3:
+                raise _error(sqlite3.OperationalError("database is locked"))
+
+            return len(attempts)
+
+        result = self.dbf.run(body, retries=5, backoff=0.001)
+
+        self.assertEqual(3, result)
+        self.assertEqual(3, len({id(_t) for _t in attempts}))
+        self.assertEqual(["attempt 3", "postponed 3"], self.values())
+
+        stats = self.dbf.retry_stats.as_dict()
+        self.assertEqual(1, stats["calls"])
+        self.assertEqual(3, stats["attempts"])
+        self.assertEqual(2, stats["retries"])
+        self.assertEqual(0, stats["exhausted"])
+        self.assertGreater(stats["retry_time"], 0)
+
+    def test_retries_exhausted(self):
+        def body(txn):
+            txn.postpone(self.query("postponed"))
+            raise _error(sqlite3.OperationalError("database is locked"))
+
+        with self.assertRaises(sa.exc.OperationalError):
+            self.dbf.run(body, retries=2, backoff=0.001)
+
+        self.assertEqual(["postponed"], self.values())
+
+        stats = self.dbf.retry_stats.as_dict()
+        self.assertEqual(3, stats["attempts"])
+        self.assertEqual(1, stats["exhausted"])
+
+    def test_not_retryable(self):
+        attempts = []
+
+        def body(txn):
+            attempts.append(txn)
+            raise ZeroDivisionError
+
+        with self.assertRaises(ZeroDivisionError):
+            self.dbf.run(body, backoff=0.001)
+
+        self.assertEqual(1, len(attempts))
+
+    def test_decorator(self):
+        attempts = []
+
+        @self.dbf.retrying(backoff=0.001)
+        def insert(txn, value):
+            attempts.append(txn)
+            txn.session.execute(self.query(value))
+
+            if len(attempts) < 2:
+                raise _error(sqlite3.OperationalError("database is locked"))
+
+        insert("x")
+
+        self.assertEqual(2, len(attempts))
+        self.assertEqual(["x"], self.values())
+
+    def test_joined_is_not_retried(self):
+        attempts = []
+
+        def body(txn):
+            attempts.append(txn)
+            raise _error(sqlite3.OperationalError("database is locked"))
+
+        with self.assertRaises(sa.exc.OperationalError):
+            with self.dbf.transaction() as outer:
+                outer.postpone(self.query("postponed"))
+                joined = clavis.TransactionFactory(
+                    self.dbf.database_url, propagation="required"
+                )
+                joined.run(body, retries=3, backoff=0.001)
+
+        self.assertEqual(1, len(attempts))
+        self.assertEqual(["postponed"], self.values())
+
+    def test_classification(self):
+        pg = _error(_PgError())
+        mysql = _error(_MySqlError(1213, "Deadlock found"))
+        sqlite = _error(sqlite3.OperationalError("database is locked"))
+        other = _error(sqlite3.OperationalError("no such table"))
+
+        self.assertTrue(retry.is_retryable(pg, "postgresql"))
+        self.assertTrue(retry.is_retryable(mysql, "mysql"))
+        self.assertTrue(retry.is_retryable(sqlite, "sqlite"))
+        self.assertTrue(retry.is_retryable(pg))
+
+        self.assertFalse(retry.is_retryable(pg, "mysql"))
+        self.assertFalse(retry.is_retryable(other, "sqlite"))
+        self.assertFalse(retry.is_retryable(ZeroDivisionError(), "sqlite"))
+
+    def test_delay(self):
+        for attempt in range(10):
+            value = retry.delay(attempt, 0.1, 1.0)
+            self.assertLessEqual(value, 1.0)
+            self.assertGreaterEqual(value, min(1.0, 0.1 * 2**attempt) / 2)
+
+        self.assertEqual(0.4, retry.delay(2, 0.1, 1.0, jitter=False))
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.dbf = clavis.TransactionFactory(database_url=db.url)
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def query(value):
+        return sa.insert(TestTable).values({TestTable.value: value})
+
+    def values(self):
+        query = sa.select([TestTable.value]).order_by(TestTable.id)
+        return [_r.value for _r in self.execute("test", query)]
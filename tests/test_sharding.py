@@ -0,0 +1,159 @@
+import collections
+import threading
+from unittest import TestCase
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import engines
+from clavis import errors
+from clavis import propagation
+from clavis import sharding
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    tenant = sa.Column(sa.Integer)
+    value = sa.Column(sa.Text)
+
+
+class LookupTest(TestCase):
+    def test_distribution(self):
+        ring = sharding.HashRing(["a", "b", "c"])
+        counts = collections.Counter(ring(_k) for _k in range(3000))
+
+        self.assertEqual({"a", "b", "c"}, set(counts))
+        self.assertTrue(all(_c > 500 for _c in counts.values()), counts)
+
+    def test_consistency(self):
+        before = sharding.HashRing(["a", "b", "c"])
+        after = sharding.HashRing(["a", "b", "c", "d"])
+        moved = [_k for _k in range(3000) if before(_k) != after(_k)]
+
+        self.assertTrue(all(after(_k) == "d" for _k in moved))
+        self.assertLess(len(moved), 1500)
+
+    def test_ranges(self):
+        lookup = sharding.RangeLookup([(1000, "b"), (0, "a")])
+
+        self.assertEqual(["a", "a", "b"], [lookup(_k) for _k in (0, 999, 1000)])
+        with self.assertRaises(KeyError):
+            lookup(-1)
+
+
+class ShardedTransactionFactoryTest(ClavisTestBase):
+    def test_routing(self):
+        for tenant in range(1, 7):
+            with self.dbf.transaction(shard_key=tenant) as t:
+                t.session.execute(self.insert(tenant, "x"))
+
+        self.assertEqual([1, 2, 3], self.tenants("a"))
+        self.assertEqual([4, 5, 6], self.tenants("b"))
+        self.assertEqual("b", self.dbf.shard_for(4))
+
+    def test_engine_per_shard(self):
+        with self.dbf.transaction(shard_key=1) as t1:
+            pass
+        with self.dbf.transaction(shard_key=2) as t2:
+            pass
+        with self.dbf.transaction(shard_key=4) as t4:
+            pass
+
+        self.assertIs(t1.engine, t2.engine)
+        self.assertIsNot(t1.engine, t4.engine)
+        self.assertIs(engines.get_engine(self.dbs["b"].url), t4.engine)
+
+    def test_postponed_queries(self):
+        with self.dbf.transaction(shard_key=5) as t:
+            t.postpone(self.insert(5, "postponed"))
+            t.session.execute(self.insert(5, "x"))
+
+        self.assertEqual([], self.tenants("a"))
+        self.assertEqual([5, 5], self.tenants("b"))
+
+    def test_gather(self):
+        for tenant in (1, 2, 4):
+            with self.dbf.transaction(shard_key=tenant) as t:
+                t.session.execute(self.insert(tenant, str(tenant)))
+
+        threads = set()
+
+        def read(txn):
+            threads.add(threading.get_ident())
+            self.assertTrue(txn.read_only)
+            query = sa.select([TestTable.value]).order_by(TestTable.id)
+            return txn.session.execute(query).scalars().all()
+
+        self.assertEqual({"a": ["1", "2"], "b": ["4"]}, self.dbf.gather(read))
+        self.assertEqual(["1", "2", "4"], self.dbf.gather(read, sharding.concat))
+        self.assertEqual(["4"], self.dbf.gather(read, sharding.concat, shards=["b"]))
+        self.assertNotIn(threading.get_ident(), threads)
+
+        self.assertEqual({}, self.dbf.gather(read, shards=[]))
+        self.assertEqual([], self.dbf.gather(read, sharding.concat, shards=[]))
+
+    def test_exported(self):
+        self.assertIn("ShardedTransactionFactory", clavis.__all__)
+        self.assertIs(
+            sharding.ShardedTransactionFactory, clavis.ShardedTransactionFactory
+        )
+
+    def test_key_function(self):
+        dbf = sharding.ShardedTransactionFactory(
+            {_n: _db.url for _n, _db in self.dbs.items()},
+            key=lambda _tenant: _tenant["id"],
+            lookup=self.dbf.lookup,
+        )
+
+        self.assertEqual("b", dbf.shard_for({"id": 6}))
+
+    def test_hash_ring_by_default(self):
+        dbf = sharding.ShardedTransactionFactory(
+            {_n: _db.url for _n, _db in self.dbs.items()}, pool_size=2
+        )
+
+        self.assertEqual({"a", "b"}, {dbf.shard_for(_k) for _k in range(100)})
+        self.assertEqual(2, dbf.factories["a"].pool.pool_size)
+
+    def test_cross_shard_propagation(self):
+        with self.dbf.transaction(shard_key=1):
+            with self.dbf.transaction(
+                shard_key=2, propagation=propagation.REQUIRED
+            ) as inner:
+                self.assertIsInstance(inner, clavis.transaction.JoinedTransaction)
+
+            with self.assertRaises(errors.ClavisError):
+                self.dbf.transaction(shard_key=4, propagation=propagation.REQUIRED)
+
+            with self.dbf.transaction(shard_key=4) as other:
+                other.session.execute(self.insert(4, "x"))
+
+        self.assertEqual([4], self.tenants("b"))
+
+    def setUp(self):
+        super().setUp()
+        self.dbs = {_n: self.setup_db(_n, Base.metadata) for _n in ("a", "b")}
+        self.dbf = clavis.ShardedTransactionFactory(
+            {"a": self.dbs["a"].url, "b": self.dbs["b"].url},
+            lookup=sharding.RangeLookup([(0, "a"), (4, "b")]),
+        )
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def insert(tenant, value):
+        return sa.insert(TestTable).values(
+            {TestTable.tenant: tenant, TestTable.value: value}
+        )
+
+    def tenants(self, shard):
+        query = sa.select([TestTable.tenant]).order_by(TestTable.id)
+        return [_r.tenant for _r in self.execute(shard, query)]
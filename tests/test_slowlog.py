@@ -0,0 +1,88 @@
+import logging
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import slowlog
+from clavis.conf import global_vars as gv
+from clavis.conf import settings
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class SlowQueryLogTest(ClavisTestBase):
+    def test_slow_statements(self):
+        clavis.configure(self.db_url, slow_query_ms=0)
+
+        with self.assertLogs("clavis.slow", logging.INFO) as logs:
+            with clavis.Transaction() as t:
+                t.session.execute(self.query("x" * 1000))
+
+        self.assertEqual(1, len(logs.records))
+
+        record = logs.records[0]
+        self.assertEqual(logging.WARNING, record.levelno)
+        self.assertIs(t, record.clavis_transaction)
+        self.assertIn("INSERT INTO test_table", record.clavis_statement)
+        self.assertGreaterEqual(record.clavis_duration_ms, 0)
+
+        message = record.getMessage()
+        self.assertIn(f"{__file__}:", message)
+        self.assertIn("in test_slow_statements", message)
+        self.assertIn("x" * 100 + "...", message)
+        self.assertNotIn("x" * 300, message)
+
+    def test_sampling(self):
+        clavis.configure(self.db_url, slow_query_ms=10000, slow_query_sample_rate=1)
+
+        with self.assertLogs("clavis.slow", logging.INFO) as logs:
+            with clavis.Transaction() as t:
+                t.session.execute(self.query("x"))
+
+        self.assertEqual(1, len(logs.records))
+        self.assertEqual(logging.INFO, logs.records[0].levelno)
+        self.assertIn("sampled statement", logs.output[0])
+
+    def test_fast_statements(self):
+        clavis.configure(self.db_url, slow_query_ms=10000)
+
+        with self.assertNoLogs("clavis.slow", logging.INFO):
+            with clavis.Transaction() as t:
+                t.session.execute(self.query("x"))
+
+    def test_disabled(self):
+        clavis.configure(self.db_url)
+
+        self.assertIsNone(clavis.conf.slow_query_log())
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            slowlog.SlowQueryLog(-1)
+
+        with self.assertRaises(ValueError):
+            slowlog.SlowQueryLog(1, sample_rate=2)
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.db_url = db.url
+
+    def tearDown(self):
+        settings.set(gv.VAR_DATABASE_SLOW_QUERY_MS, None)
+        settings.set(gv.VAR_DATABASE_SLOW_QUERY_SAMPLE_RATE, None)
+        clavis.conf.invalidate()
+        self.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def query(value):
+        return sa.insert(TestTable).values({TestTable.value: value})
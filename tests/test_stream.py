@@ -0,0 +1,119 @@
+import importlib.util
+import unittest
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import clavis
+from clavis import streaming
+from tests.base import ClavisTestBase
+
+Base = declarative_base()
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+
+class TestTable(Base):
+    __tablename__ = "test_table"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    value = sa.Column(sa.Text)
+
+
+class StreamTest(ClavisTestBase):
+    def test_rows(self):
+        with self.dbf.transaction() as t:
+            stream = t.stream(self.query, chunk_size=3)
+            self.assertEqual(["id", "value"], stream.keys())
+            self.assertEqual([str(_i) for _i in range(10)], [_r.value for _r in stream])
+            self.assertTrue(stream.closed)
+
+        self.assertEqual([True], self.stream_results)
+
+    def test_orm_entities(self):
+        with self.dbf.transaction() as t:
+            rows = list(t.stream(sa.select(TestTable).order_by(TestTable.id), 4))
+            self.assertEqual("9", rows[-1][0].value)
+
+    def test_columns(self):
+        with self.dbf.transaction() as t:
+            batches = list(t.stream(self.query, 4, output=streaming.COLUMNS))
+
+        self.assertEqual([4, 4, 2], [len(_b["value"]) for _b in batches])
+        self.assertEqual(["8", "9"], batches[-1]["value"])
+        self.assertEqual([9, 10], batches[-1]["id"])
+
+    @unittest.skipUnless(HAS_NUMPY, "numpy is not installed")
+    def test_numpy(self):
+        with self.dbf.transaction() as t:
+            batches = list(t.stream(self.query, 4, output=streaming.NUMPY))
+
+        self.assertEqual([4, 4, 2], [len(_b) for _b in batches])
+        self.assertEqual(("id", "value"), batches[0].dtype.names)
+        self.assertEqual(10, batches[-1]["id"][-1])
+
+    @unittest.skipIf(HAS_NUMPY, "numpy is installed")
+    def test_numpy_missing(self):
+        with self.dbf.transaction() as t:
+            with self.assertRaises(ImportError):
+                t.stream(self.query, output=streaming.NUMPY)
+
+        self.assertEqual([], self.stream_results)
+
+    def test_closed_on_exit(self):
+        streams = []
+
+        with self.dbf.transaction() as t:
+            streams.append(t.stream(self.query, 2))
+            next(streams[-1])
+            t.commit()
+
+        with self.dbf.transaction() as t:
+            with t.nested():
+                streams.append(t.stream(self.query, 2))
+                next(streams[-1])
+            t.rollback()
+
+        with self.assertRaises(ZeroDivisionError):
+            with self.dbf.transaction() as t:
+                streams.append(t.stream(self.query, 2, output=streaming.COLUMNS))
+                next(streams[-1])
+                raise ZeroDivisionError
+
+        for stream in streams:
+            self.assertTrue(stream.closed)
+            self.assertEqual([], list(stream))
+
+    def test_validation(self):
+        with self.dbf.transaction() as t:
+            with self.assertRaises(ValueError):
+                t.stream(self.query, output="frames")
+
+            with self.assertRaises(ValueError):
+                t.stream(self.query, chunk_size=0)
+
+    def setUp(self):
+        super().setUp()
+        db = self.setup_db("test", Base.metadata)
+        self.dbf = clavis.TransactionFactory(db.url)
+        self.query = sa.select([TestTable.id, TestTable.value]).order_by(TestTable.id)
+
+        with self.dbf.transaction() as t:
+            t.bulk_insert(TestTable, ({"value": str(_i)} for _i in range(10)))
+
+        self.stream_results = []
+        sa.event.listen(
+            clavis.engines.get_engine(db.url, None, clavis.conf.pool_options()),
+            "before_cursor_execute",
+            self.on_execute,
+        )
+
+    def tearDown(self):
+        self.cleanup()
+        super().tearDown()
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT"):
+            self.stream_results.append(
+                context.execution_options.get("stream_results", False)
+            )